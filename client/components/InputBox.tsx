@@ -4,18 +4,37 @@ import { useState } from 'react';
 import axios from 'axios';
 import { Send, Loader2 } from 'lucide-react';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+async function waitForJob(jobId: number) {
+    while (true) {
+        const { data } = await axios.get(`http://localhost:8000/api/ingest/jobs/${jobId}`);
+        if (data.status === 'succeeded') return data;
+        if (data.status === 'failed') throw new Error(data.error || 'Ingest failed');
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+}
+
 export default function InputBox({ onIngest }: { onIngest: () => void }) {
     const [text, setText] = useState('');
     const [loading, setLoading] = useState(false);
+    const [notice, setNotice] = useState<string | null>(null);
 
     const handleSubmit = async (e: React.FormEvent) => {
         e.preventDefault();
         if (!text.trim()) return;
 
         setLoading(true);
+        setNotice(null);
         try {
-            await axios.post('http://localhost:8000/api/ingest/', { text });
+            const { data } = await axios.post('http://localhost:8000/api/ingest/', { text });
             setText('');
+            // Ingest runs as a background job; refresh the graph once it finishes
+            const job = await waitForJob(data.job_id);
+            if (job.result?.incomplete) {
+                // Part of the input was not extracted (a chunk failed or the chunk cap was reached)
+                setNotice(`部分内容未能提取：${job.result.incomplete}`);
+            }
             onIngest(); // Refresh graph
         } catch (error) {
             console.error("Failed to ingest", error);
@@ -26,6 +45,11 @@ export default function InputBox({ onIngest }: { onIngest: () => void }) {
 
     return (
         <div className="fixed bottom-8 left-1/2 transform -translate-x-1/2 w-full max-w-2xl px-4 z-50">
+            {notice && (
+                <div className="mb-2 rounded-md bg-yellow-900/80 px-4 py-2 text-sm text-yellow-100">
+                    {notice}
+                </div>
+            )}
             <form onSubmit={handleSubmit} className="relative group">
                 <div className="absolute -inset-0.5 bg-gradient-to-r from-pink-600 to-purple-600 rounded-lg blur opacity-75 group-hover:opacity-100 transition duration-1000 group-hover:duration-200 animate-tilt"></div>
                 <div className="relative flex items-center bg-gray-900 rounded-lg p-2 leading-none">
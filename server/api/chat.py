@@ -7,6 +7,8 @@ from ..database.models import KnowledgeNode
 from ..core.ai_processor import ai_processor
 from ..core.settings import settings
 from ..core.vector_store import vector_store
+from ..core.index_sync import node_index_sync
+from ..core.context_packer import ContextBlock, pack_context
 import json
 
 router = APIRouter()
@@ -26,13 +28,20 @@ def get_nodes_by_ids(session: Session, node_ids: list) -> list:
 async def generate_sse_response(query: str, session: Session):
     """Generate SSE stream for chat response."""
     
-    # 1. Get ALL nodes from the knowledge base
-    all_nodes_stmt = select(KnowledgeNode).order_by(KnowledgeNode.created_at.desc())
-    all_nodes = session.exec(all_nodes_stmt).all()
-    
-    print(f"[Chat] Query: '{query}', Total nodes in DB: {len(all_nodes)}, Mode: {settings.retrieval_mode}")
+    # 1. Bring the indexes up to date with rows changed since the last request
+    use_rag = settings.retrieval_mode == "rag"
+    try:
+        await node_index_sync.sync(session, with_vectors=use_rag)
+    except Exception as e:
+        print(f"[Chat/RAG] Index sync failed: {e}, falling back to basic mode")
+        settings.retrieval_mode = "basic"  # Temporary fallback
+        use_rag = False
+        await node_index_sync.sync(session, with_vectors=False)
+
+    total_nodes = len(vector_store.text_index)
+    print(f"[Chat] Query: '{query}', Indexed nodes: {total_nodes}, Mode: {settings.retrieval_mode}")
     
-    if not all_nodes:
+    if not total_nodes:
         yield f"event: sources\ndata: []\n\n"
         async for chunk in ai_processor.answer_question_stream(query, "知识库中暂无任何记录。"):
             yield f"data: {json.dumps({'content': chunk})}\n\n"
@@ -42,63 +51,45 @@ async def generate_sse_response(query: str, session: Session):
     relevant_nodes = []
     
     # 2. Choose retrieval method based on settings
-    if settings.retrieval_mode == "rag":
-        # RAG Mode: Use vector similarity search
+    if use_rag:
+        # RAG Mode: vector similarity fused with BM25 keyword ranking
         try:
-            # Build/update index if needed
-            nodes_for_index = [{"id": n.id, "label": n.label, "content": n.content} for n in all_nodes]
-            vector_store.build_index(nodes_for_index)
-            
-            # Search
-            results = vector_store.search(query, top_k=15)
+            results = await vector_store.hybrid_search_async(query, top_k=15)
             if results:
                 node_ids = [node_id for node_id, score in results]
                 relevant_nodes = get_nodes_by_ids(session, node_ids)
-                print(f"[Chat/RAG] Found {len(relevant_nodes)} nodes via vector search")
+                print(f"[Chat/RAG] Found {len(relevant_nodes)} nodes via hybrid search")
         except Exception as e:
             print(f"[Chat/RAG] Vector search failed: {e}, falling back to basic mode")
             settings.retrieval_mode = "basic"  # Temporary fallback
     
     if settings.retrieval_mode == "basic" or not relevant_nodes:
-        # Basic Mode: Keyword-based scoring
-        keywords = [k.strip().lower() for k in query.split() if len(k.strip()) > 1]
-        
-        if keywords:
-            scored_nodes = []
-            for node in all_nodes:
-                score = 0
-                label_lower = node.label.lower()
-                content_lower = node.content.lower() if node.content else ""
-                
-                for kw in keywords:
-                    if kw in label_lower:
-                        score += 3
-                    if kw in content_lower:
-                        score += 1
-                
-                if score > 0:
-                    scored_nodes.append((node, score))
-            
-            scored_nodes.sort(key=lambda x: x[1], reverse=True)
-            relevant_nodes = [n for n, s in scored_nodes[:15]]
+        # Basic Mode: BM25 keyword search (CJK-aware), no embedding model needed
+        results = vector_store.keyword_search(query, top_k=15)
+        if results:
+            relevant_nodes = get_nodes_by_ids(session, [node_id for node_id, score in results])
         
         if not relevant_nodes:
-            relevant_nodes = all_nodes[:20]
+            relevant_nodes = session.exec(
+                select(KnowledgeNode).order_by(KnowledgeNode.created_at.desc()).limit(20)
+            ).all()
         
         print(f"[Chat/Basic] Using {len(relevant_nodes)} nodes")
     
-    # 3. Format context
-    context_str = "\n\n---\n\n".join([
-        f"【{n.label}】(类型: {n.type})\n{n.content}" 
+    # 3. Pack the best nodes into the token budget (retrieval order is best-first)
+    packed = pack_context([
+        ContextBlock(n.id, f"【{n.label}】(类型: {n.type})", n.content)
         for n in relevant_nodes
     ])
-    
-    if len(context_str) > 12000:
-        context_str = context_str[:12000] + "\n\n[...内容过长，已截断...]"
+    context_str = packed.text
+    print(f"[Chat] Context: {packed.tokens}/{packed.budget} tokens, {len(packed.included)} nodes "
+          f"({len(packed.truncated)} trimmed, {len(packed.dropped)} dropped)")
 
-    # Send sources
-    sources = [{"id": n.id, "label": n.label} for n in relevant_nodes]
+    # Send sources (only nodes that made it into the context)
+    included = set(packed.included)
+    sources = [{"id": n.id, "label": n.label} for n in relevant_nodes if n.id in included]
     yield f"event: sources\ndata: {json.dumps(sources)}\n\n"
+    yield f"event: context\ndata: {json.dumps(packed.report())}\n\n"
     
     # Stream the answer
     async for chunk in ai_processor.answer_question_stream(query, context_str):
@@ -93,3 +93,19 @@ async def update_config(config: ConfigUpdate, session: Session = Depends(get_ses
     )
     
     return {"message": "Configuration updated and saved to DB"}
+
+@router.delete("/llm-cache")
+async def clear_llm_cache():
+    """Drop all cached summarize / extract responses."""
+    from ..core.ai_processor import ai_processor
+    stats = ai_processor.cache_stats()
+    ai_processor.clear_cache()
+    return {"message": f"Cleared {stats.get('entries', 0)} cached responses"}
+
+@router.delete("/http-cache")
+async def clear_http_cache():
+    """Drop all cached fetched pages."""
+    from ..core.crawler import page_cache
+    stats = page_cache.stats()
+    page_cache.clear()
+    return {"message": f"Cleared {stats.get('entries', 0)} cached pages"}
@@ -3,15 +3,23 @@ Extension API - Endpoints for browser extension
 """
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from sqlmodel import Session, select, col, or_
+from sqlmodel import Session, col, or_
 from typing import Optional, List
 from ..database.database import get_session
 from ..database.models import KnowledgeNode, KnowledgeEdge
 from ..core.vector_store import vector_store
+from ..core.index_sync import node_index_sync
+from ..core.label_index import label_index
+from ..core.text_index import reciprocal_rank_fusion
+from ..core.node_revisions import add_contributions, record_revisions
+from .chat import get_nodes_by_ids
 from ..core.settings import settings
 
 router = APIRouter()
 
+# Minimum BM25 score for a keyword hit to count as "related" to a page
+RELATED_MIN_BM25 = 1.0
+
 # ============ Request Models ============
 
 class QuickSaveRequest(BaseModel):
@@ -42,7 +50,10 @@ class RelatedNode(BaseModel):
     label: str
     type: str
     content_preview: str
+    # Cosine similarity to the page (0 for keyword-only hits); BM25 relative to the best hit without RAG
     score: float = 0.0
+    # Rank fusion of vector and keyword hits relative to the best hit (RAG mode only)
+    rrf_score: Optional[float] = None
 
 class FindRelatedResponse(BaseModel):
     related_nodes: List[RelatedNode]
@@ -54,22 +65,20 @@ class FindRelatedResponse(BaseModel):
 async def quick_save(request: QuickSaveRequest, session: Session = Depends(get_session)):
     """
     Quick save a URL to the knowledge base.
-    Reuses existing ingest logic.
+    Queues an ingest job; poll /api/ingest/jobs/{job_id} for the outcome.
     """
-    from ..api.ingest import ingest_info, IngestRequest
+    from ..core.ingest_queue import ingest_queue
     
-    # Call existing ingest endpoint
-    ingest_request = IngestRequest(
-        text=request.url,
-        html_content=request.html_content,
-        is_manual_selection=request.is_manual_selection
-    )
-    result = await ingest_info(ingest_request, session)
+    job = ingest_queue.submit(session, {
+        "text": request.url,
+        "html_content": request.html_content,
+        "is_manual_selection": request.is_manual_selection,
+    })
     
     return {
         "success": True,
-        "message": f"已保存: {request.title or request.url}",
-        "result": result
+        "message": f"已加入保存队列: {request.title or request.url}",
+        "job_id": job.id
     }
 
 @router.post("/create-node")
@@ -85,15 +94,15 @@ async def create_node_from_text(request: CreateNodeRequest, session: Session = D
         if len(request.text) > 30:
             label += "..."
     
-    # Check if node with same label exists
-    existing = session.exec(
-        select(KnowledgeNode).where(KnowledgeNode.label == label)
-    ).first()
-    
+    # Check if a node with the same (normalized) label exists
+    existing_id = await label_index.resolve_async(session, label)
+    existing = session.get(KnowledgeNode, existing_id) if existing_id is not None else None
+    if existing_id is not None and existing is None:
+        label_index.forget(existing_id)
+
     if existing:
-        # Append to existing node
-        timestamp = __import__('datetime').datetime.utcnow().strftime("%Y-%m-%d")
-        existing.content = f"{existing.content}\n\n--- [摘录 {timestamp}] ---\n{request.text}"
+        # Record the clip as a revision of the existing node
+        add_contributions(session, [(existing, request.text)], kind="clip", source=request.source_url)
         if request.source_url:
             current_source = existing.source or ""
             if request.source_url not in current_source:
@@ -103,7 +112,7 @@ async def create_node_from_text(request: CreateNodeRequest, session: Session = D
         session.refresh(existing)
         return {
             "success": True,
-            "message": f"已追加到现有节点: {label}",
+            "message": f"已追加到现有节点: {existing.label}",
             "node": existing.model_dump(),
             "is_new": False
         }
@@ -120,14 +129,12 @@ async def create_node_from_text(request: CreateNodeRequest, session: Session = D
         source=source_info
     )
     session.add(new_node)
+    session.flush()
+    record_revisions(session, [{"node_id": new_node.id, "kind": "create", "content": request.text, "source": source_info}])
     session.commit()
     session.refresh(new_node)
-    
-    # Add to vector store
-    try:
-        vector_store.add_node(new_node.id, new_node.label, new_node.content)
-    except Exception as e:
-        print(f"[Extension] Failed to add to vector store: {e}")
+    label_index.register(new_node.id, new_node.label)
+    # The index refresher embeds the new node in the background
     
     return {
         "success": True,
@@ -142,10 +149,16 @@ async def find_related(request: FindRelatedRequest, session: Session = Depends(g
     Find knowledge nodes related to the current page.
     Uses both keyword matching and vector similarity.
     """
-    # Get all nodes
-    all_nodes = session.exec(select(KnowledgeNode)).all()
+    # Bring the indexes up to date with rows changed since the last request
+    use_rag = settings.retrieval_mode == "rag"
+    try:
+        await node_index_sync.sync(session, with_vectors=use_rag)
+    except Exception as e:
+        print(f"[Extension/RAG] Index sync failed: {e}")
+        use_rag = False
+        await node_index_sync.sync(session, with_vectors=False)
     
-    if not all_nodes:
+    if not len(vector_store.text_index):
         return FindRelatedResponse(related_nodes=[], has_related=False)
     
     # Build query from title and keywords
@@ -158,57 +171,38 @@ async def find_related(request: FindRelatedRequest, session: Session = Depends(g
     query = " ".join(query_parts)
     
     related_nodes = []
+    results = []
+    cosine = None
     
-    # Try RAG mode first
-    if settings.retrieval_mode == "rag":
+    # Try RAG mode first: vector hits above the similarity threshold fused with BM25 hits
+    if use_rag:
         try:
-            nodes_for_index = [{"id": n.id, "label": n.label, "content": n.content} for n in all_nodes]
-            vector_store.build_index(nodes_for_index)
-            
-            results = vector_store.search(query, top_k=5)
-            if results:
-                id_to_node = {n.id: n for n in all_nodes}
-                for node_id, score in results:
-                    if node_id in id_to_node and score > 0.3:  # Threshold
-                        node = id_to_node[node_id]
-                        related_nodes.append(RelatedNode(
-                            id=node.id,
-                            label=node.label,
-                            type=node.type,
-                            content_preview=node.content[:100] + "..." if len(node.content) > 100 else node.content,
-                            score=score
-                        ))
+            candidates = await vector_store.search_async(query, top_k=10)
+            cosine = dict(candidates)
+            results = reciprocal_rank_fusion(
+                [hit for hit in candidates if hit[1] > 0.3],
+                vector_store.keyword_search(query, top_k=10, min_score=RELATED_MIN_BM25),
+                k=settings.rrf_k,
+            )[:5]
         except Exception as e:
             print(f"[Extension/RAG] Vector search failed: {e}")
     
-    # Fallback to keyword matching
-    if not related_nodes:
-        keywords = [k.strip().lower() for k in query.split() if len(k.strip()) > 1]
-        
-        scored_nodes = []
-        for node in all_nodes:
-            score = 0
-            label_lower = node.label.lower()
-            content_lower = node.content.lower() if node.content else ""
-            
-            for kw in keywords:
-                if kw in label_lower:
-                    score += 3
-                if kw in content_lower:
-                    score += 1
-            
-            if score > 2:  # Threshold
-                scored_nodes.append((node, score))
-        
-        scored_nodes.sort(key=lambda x: x[1], reverse=True)
-        
-        for node, score in scored_nodes[:5]:
+    # Fallback to keyword (BM25) matching
+    if not results:
+        cosine = None
+        results = vector_store.keyword_search(query, top_k=5, min_score=RELATED_MIN_BM25)
+    
+    if results:
+        best = results[0][1]
+        scores = dict(results)
+        for node in get_nodes_by_ids(session, [node_id for node_id, _ in results]):
             related_nodes.append(RelatedNode(
                 id=node.id,
                 label=node.label,
                 type=node.type,
                 content_preview=node.content[:100] + "..." if len(node.content) > 100 else node.content,
-                score=score / 10.0  # Normalize
+                score=cosine.get(node.id, 0.0) if cosine is not None else scores[node.id] / best,
+                rrf_score=scores[node.id] / best if cosine is not None else None,
             ))
     
     return FindRelatedResponse(
@@ -1,19 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import Session, select, delete
 from pydantic import BaseModel
 from typing import Optional
 from ..database.database import get_session
-from ..database.models import KnowledgeNode, KnowledgeEdge
+from ..database.models import KnowledgeNode, KnowledgeEdge, NodeRevision
+from ..core.node_revisions import record_revisions
 
 router = APIRouter()
 
 @router.get("/")
 async def get_graph(session: Session = Depends(get_session)):
-    nodes = session.exec(select(KnowledgeNode)).all()
+    # Only the fields the graph views use (not embedding / summary)
+    columns = ("id", "label", "type", "content", "source", "created_at", "last_reviewed_at")
+    nodes = session.exec(select(*(getattr(KnowledgeNode, name) for name in columns))).all()
     edges = session.exec(select(KnowledgeEdge)).all()
     
     return {
-        "nodes": [node.model_dump() for node in nodes],
+        "nodes": [dict(zip(columns, row)) for row in nodes],
         "edges": [{"id": e.id, "source_id": e.source_id, "target_id": e.target_id, "relation_type": e.relation_type} for e in edges]
     }
 
@@ -48,6 +51,8 @@ async def create_node(node_data: NodeCreate, session: Session = Depends(get_sess
         source=node_data.source or "手动创建"
     )
     session.add(new_node)
+    session.flush()
+    record_revisions(session, [{"node_id": new_node.id, "kind": "create", "content": new_node.content, "source": new_node.source}])
     session.commit()
     session.refresh(new_node)
     return new_node
@@ -58,6 +63,9 @@ async def update_node(node_id: int, node_data: NodeUpdate, session: Session = De
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     
+    if node_data.content != node.content:
+        # The edited text becomes the node's new base revision
+        record_revisions(session, [{"node_id": node_id, "kind": "edit", "content": node_data.content, "source": "手动编辑"}])
     node.label = node_data.label
     node.content = node_data.content
     node.type = node_data.type
@@ -66,6 +74,20 @@ async def update_node(node_id: int, node_data: NodeUpdate, session: Session = De
     session.refresh(node)
     return node
 
+@router.get("/nodes/{node_id}/revisions")
+async def get_node_revisions(node_id: int, limit: int = 50, offset: int = 0, session: Session = Depends(get_session)):
+    """Content history of a node, newest first."""
+    if not session.get(KnowledgeNode, node_id):
+        raise HTTPException(status_code=404, detail="Node not found")
+    revisions = session.exec(
+        select(NodeRevision)
+        .where(NodeRevision.node_id == node_id)
+        .order_by(NodeRevision.id.desc())
+        .offset(offset)
+        .limit(limit)
+    ).all()
+    return {"node_id": node_id, "revisions": revisions}
+
 @router.delete("/nodes/{node_id}")
 async def delete_node(node_id: int, session: Session = Depends(get_session)):
     node = session.get(KnowledgeNode, node_id)
@@ -77,6 +99,7 @@ async def delete_node(node_id: int, session: Session = Depends(get_session)):
     edges = session.exec(statement).all()
     for edge in edges:
         session.delete(edge)
+    session.execute(delete(NodeRevision).where(NodeRevision.node_id == node_id))
         
     session.delete(node)
     session.commit()
@@ -137,6 +160,8 @@ async def clear_all_nodes(session: Session = Depends(get_session)):
     for edge in edges:
         session.delete(edge)
     
+    session.execute(delete(NodeRevision))
+
     # Delete all nodes
     nodes = session.exec(select(KnowledgeNode)).all()
     for node in nodes:
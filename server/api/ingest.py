@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlmodel import Session, select
-from ..database.database import get_session
-from ..database.models import KnowledgeNode, KnowledgeEdge, RawInput
-from ..core.ai_processor import ai_processor
-from typing import Optional
-from ..core.crawler import is_url, fetch_url_content, process_html_content
-import re
-from datetime import datetime
+from ..database.database import get_session, engine
+from ..database.models import IngestJob
+from ..core.ingest_queue import ingest_queue, job_to_dict, TERMINAL_STATUSES
+from ..core.ingest_batch import BatchIngest
+from ..core.settings import settings
+from typing import List, Optional
+import json
 
 router = APIRouter()
 
@@ -15,123 +16,92 @@ class IngestRequest(BaseModel):
     text: str
     html_content: Optional[str] = None
     is_manual_selection: bool = False
+    use_cache: bool = True  # False re-runs the LLM steps even for content seen before
 
-@router.post("/")
+@router.post("/", status_code=202)
 async def ingest_info(request: IngestRequest, session: Session = Depends(get_session)):
-    text = request.text
-    
-    # 0. Check if URL and fetch content
-    input_text = text
-    fetched_content = None
-    title = None
-    input_type = "text"
-    
-    if is_url(text):
-        print(f"Detected URL: {text}")
-        input_type = "url"
-        
-        if request.html_content:
-            # Use provided HTML content
-            print(f"Using provided HTML content (Manual Selection: {request.is_manual_selection})")
-            raw_fetched = process_html_content(
-                request.html_content, 
-                text, 
-                extract_main_content=not request.is_manual_selection
-            )
-        else:
-            # Fetch content from URL
-            raw_fetched = await fetch_url_content(text)
-            
-        # Extract title from fetched content
-        title_match = re.search(r"Title: (.+?)\n", raw_fetched)
-        title = title_match.group(1) if title_match else text[:50]
-        
-        # Use AI to summarize/clean the content for Knowledge Base
-        fetched_content = await ai_processor.summarize_content(raw_fetched, text)
-        
-        input_text = f"URL: {text}\n\n{raw_fetched}"
-    
-    # 0.1 Save to RawInput (Knowledge Base) - now with summarized content
-    raw_input = RawInput(
-        input_type=input_type,
-        original_input=text,
-        fetched_content=fetched_content,
-        title=title
+    """Queue an ingest job and return its ID immediately; crawl and extraction run in the background."""
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Empty input")
+    job = ingest_queue.submit(session, request.model_dump())
+    return {"message": "Queued", "job_id": job.id, "status": job.status}
+
+class BatchIngestRequest(BaseModel):
+    items: List[str]  # URLs or text notes
+    concurrency: Optional[int] = None  # Items in flight; defaults to settings.ingest_batch_concurrency
+    use_cache: bool = True
+
+async def generate_batch_ndjson(batch: BatchIngest):
+    async for event in batch.run():
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+@router.post("/batch")
+async def ingest_batch(request: BatchIngestRequest):
+    """
+    Import many items at once. Streams NDJSON: one line per item as it is
+    saved or fails, then a final {"type": "report"} line with throughput.
+    """
+    items = [item.strip() for item in request.items if item and item.strip()]
+    if not items:
+        raise HTTPException(status_code=400, detail="No items")
+    if len(items) > settings.ingest_batch_max_items:
+        raise HTTPException(status_code=400, detail=f"At most {settings.ingest_batch_max_items} items per batch")
+    batch = BatchIngest(
+        items,
+        concurrency=request.concurrency or settings.ingest_batch_concurrency,
+        commit_size=settings.ingest_batch_commit_size,
+        use_cache=request.use_cache,
     )
-    session.add(raw_input)
-    session.commit()
-    
-    # 0.5 Fetch existing labels for context
-    # Get the most recently modified nodes to function as "short-term memory" or "active context"
-    statement = select(KnowledgeNode.label).order_by(KnowledgeNode.last_reviewed_at.desc()).limit(50)
-    existing_labels = session.exec(statement).all()
+    return StreamingResponse(
+        generate_batch_ndjson(batch),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 20, session: Session = Depends(get_session)):
+    """Most recent ingest jobs, optionally filtered by status."""
+    statement = select(IngestJob).order_by(IngestJob.id.desc()).limit(limit)
+    if status:
+        statement = statement.where(IngestJob.status == status)
+    return [job_to_dict(job) for job in session.exec(statement).all()]
 
-    # 1. AI processing
-    nodes_data, edges_data = await ai_processor.extract_knowledge(input_text, existing_labels=list(existing_labels))
-    
-    # 2. Save Nodes
-    node_map = {} # label -> db_id
-    
-    # Determine the source string
-    source_info = "User Input"
-    if is_url(text):
-        source_info = text
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
 
-    for node_data in nodes_data:
-        # Check if exists
-        statement = select(KnowledgeNode).where(KnowledgeNode.label == node_data["label"])
-        existing_node = session.exec(statement).first()
-        
-        if existing_node:
-            node_map[node_data["label"]] = existing_node.id
-            # Update content to prioritize new input, but strictly APPEND to preserve history
-            new_content = node_data.get("content", "").strip()
-            # Simple check to avoid exact duplicates
-            if new_content and new_content not in existing_node.content:
-                timestamp = datetime.utcnow().strftime("%Y-%m-%d")
-                existing_node.content = f"{existing_node.content}\n\n--- [Updated {timestamp}] ---\n{new_content}"
-            
-            existing_node.type = node_data.get("type", existing_node.type)
-            
-            # Update source info (append if new)
-            if source_info and source_info != "User Input": 
-                 current_source = existing_node.source or ""
-                 if source_info not in current_source:
-                     if current_source:
-                         existing_node.source = f"{current_source}; {source_info}"
-                     else:
-                         existing_node.source = source_info
-            
-            existing_node.last_reviewed_at = datetime.utcnow()
-            
-            session.add(existing_node)
-            session.commit()
-            session.refresh(existing_node)
-        else:
-            new_node = KnowledgeNode(
-                label=node_data["label"],
-                type=node_data.get("type", "Concept"),
-                content=node_data.get("content", ""),
-                source=source_info
-            )
-            session.add(new_node)
-            session.commit()
-            session.refresh(new_node)
-            node_map[node_data["label"]] = new_node.id
-            
-    # 3. Save Edges
-    for edge in edges_data:
-        source_id = node_map.get(edge["source_label"])
-        target_id = node_map.get(edge["target_label"])
-        
-        if source_id and target_id:
-            new_edge = KnowledgeEdge(
-                source_id=source_id,
-                target_id=target_id,
-                relation_type=edge["relation_type"]
-            )
-            session.add(new_edge)
-    
-    session.commit()
+async def generate_job_events(job_id: int):
+    """Emit the job's state whenever it changes, until it succeeds or fails."""
+    last = None
+    while True:
+        with Session(engine) as session:
+            job = session.get(IngestJob, job_id)
+            state = job_to_dict(job) if job else None
+        if state is None:
+            yield f"event: error\ndata: {json.dumps({'detail': 'Job not found'})}\n\n"
+            return
+        if state != last:
+            yield f"event: status\ndata: {json.dumps(state, ensure_ascii=False)}\n\n"
+            last = state
+        if state["status"] in TERMINAL_STATUSES:
+            yield "event: done\ndata: {}\n\n"
+            return
+        if not await ingest_queue.wait_for_change(timeout=15.0):
+            # Keep proxies from closing an idle stream
+            yield ": keep-alive\n\n"
 
-    return {"message": "Ingested", "nodes_created": len(nodes_data), "edges_created": len(edges_data)}
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: int):
+    """Server-Sent Events stream of a job's status and progress."""
+    return StreamingResponse(
+        generate_job_events(job_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
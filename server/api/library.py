@@ -7,6 +7,9 @@ from ..database.models import RawInput
 from ..core.ai_processor import ai_processor
 from ..core.settings import settings
 from ..core.vector_store import vector_store
+from ..core.passages import group_passage_hits, excerpt
+from ..core.index_sync import PassageIndexSync
+from ..core.context_packer import ContextBlock, pack_context
 import json
 
 router = APIRouter()
@@ -52,94 +55,112 @@ async def search_raw_inputs(q: str, limit: int = 20, session: Session = Depends(
 class LibraryChatRequest(BaseModel):
     message: str
 
+# Passage hits fetched per query, and at most this many passages per item reach the prompt
+LIBRARY_PASSAGE_CANDIDATES = 30
+LIBRARY_PASSAGES_PER_ITEM = 3
+
 # Library uses its own vector store for RawInput items
 _library_vector_store = None
 
-def get_library_vector_store():
+def get_library_vector_store(create: bool = True):
+    """The library store is created lazily; pass create=False to only return an existing one."""
     global _library_vector_store
-    if _library_vector_store is None:
+    if _library_vector_store is None and create:
         from ..core.vector_store import VectorStore
-        _library_vector_store = VectorStore(cache_dir=".vector_cache_library")
+        _library_vector_store = VectorStore(cache_dir=".vector_cache_library", index_mode=settings.library_index_mode)
     return _library_vector_store
 
+_library_index_sync = None
+
+def get_library_index_sync():
+    """Change-tracked sync between the RawInput table and the library store (one document per passage)."""
+    global _library_index_sync
+    if _library_index_sync is None:
+        from ..core.index_sync import raw_input_to_doc
+        _library_index_sync = PassageIndexSync(
+            get_library_vector_store(), RawInput, raw_input_to_doc,
+            size=settings.library_passage_chars, overlap=settings.library_passage_overlap,
+        )
+    return _library_index_sync
+
+def get_raw_inputs_by_ids(session: Session, item_ids: list) -> list:
+    """Fetch raw inputs by IDs, preserving order."""
+    if not item_ids:
+        return []
+    items = session.exec(select(RawInput).where(RawInput.id.in_(item_ids))).all()
+    id_to_item = {item.id: item for item in items}
+    return [id_to_item[iid] for iid in item_ids if iid in id_to_item]
+
 async def generate_library_sse_response(query: str, session: Session):
     """Generate SSE stream for library chat response."""
     
-    # Get ALL raw inputs
-    all_items_stmt = select(RawInput).order_by(RawInput.created_at.desc())
-    all_items = session.exec(all_items_stmt).all()
-    
-    print(f"[Library Chat] Query: '{query}', Total items: {len(all_items)}, Mode: {settings.retrieval_mode}")
+    lib_store = get_library_vector_store()
+    index_sync = get_library_index_sync()
+
+    # Bring the indexes up to date with rows changed since the last request
+    use_rag = settings.retrieval_mode == "rag"
+    try:
+        await index_sync.sync(session, with_vectors=use_rag)
+    except Exception as e:
+        print(f"[Library/RAG] Index sync failed: {e}, falling back to basic")
+        use_rag = False
+        await index_sync.sync(session, with_vectors=False)
+
+    total_passages = len(lib_store.text_index)
+    print(f"[Library Chat] Query: '{query}', Indexed passages: {total_passages}, Mode: {settings.retrieval_mode}")
     
-    if not all_items:
+    if not total_passages:
         yield f"event: sources\ndata: []\n\n"
         async for chunk in ai_processor.answer_question_stream(query, "知识库中暂无任何记录。"):
             yield f"data: {json.dumps({'content': chunk})}\n\n"
         yield "event: done\ndata: {}\n\n"
         return
     
-    relevant_items = []
+    # Passages are ranked individually, then grouped back into their items
+    hits = []
     
-    if settings.retrieval_mode == "rag":
+    if use_rag:
         try:
-            lib_store = get_library_vector_store()
-            # Build index for library items
-            items_for_index = [
-                {"id": item.id, "label": item.title or "无标题", "content": item.fetched_content or item.original_input}
-                for item in all_items
-            ]
-            lib_store.build_index(items_for_index)
-            
-            # Search
-            results = lib_store.search(query, top_k=10)
-            if results:
-                item_ids = [item_id for item_id, score in results]
-                id_to_item = {item.id: item for item in all_items}
-                relevant_items = [id_to_item[iid] for iid in item_ids if iid in id_to_item]
-                print(f"[Library/RAG] Found {len(relevant_items)} items via vector search")
+            results = await lib_store.hybrid_search_async(query, top_k=LIBRARY_PASSAGE_CANDIDATES)
+            hits = group_passage_hits(results, max_items=10, max_passages=LIBRARY_PASSAGES_PER_ITEM)
+            print(f"[Library/RAG] {len(results)} passages from {len(hits)} items via hybrid search")
         except Exception as e:
             print(f"[Library/RAG] Vector search failed: {e}, falling back to basic")
     
-    if not relevant_items:
-        # Basic Mode fallback
-        keywords = [k.strip().lower() for k in query.split() if len(k.strip()) > 1]
-        
-        if keywords:
-            scored_items = []
-            for item in all_items:
-                score = 0
-                title_lower = (item.title or "").lower()
-                content_lower = (item.fetched_content or item.original_input or "").lower()
-                
-                for kw in keywords:
-                    if kw in title_lower:
-                        score += 3
-                    if kw in content_lower:
-                        score += 1
-                
-                if score > 0:
-                    scored_items.append((item, score))
-            
-            scored_items.sort(key=lambda x: x[1], reverse=True)
-            relevant_items = [item for item, s in scored_items[:10]]
-        
-        if not relevant_items:
-            relevant_items = all_items[:15]
-        
-        print(f"[Library/Basic] Using {len(relevant_items)} items")
+    if not hits:
+        # Basic Mode fallback: BM25 keyword search
+        results = lib_store.keyword_search(query, top_k=LIBRARY_PASSAGE_CANDIDATES)
+        hits = group_passage_hits(results, max_items=10, max_passages=LIBRARY_PASSAGES_PER_ITEM)
     
-    # Build context
-    context_str = "\n\n---\n\n".join([
-        f"【标题: {item.title or '无标题'}】\n类型: {item.input_type}\n内容:\n{item.fetched_content or item.original_input}"
-        for item in relevant_items
-    ])
+    if hits:
+        relevant_items = get_raw_inputs_by_ids(session, [item_id for item_id, _, _ in hits])
+        passages_of = {item_id: numbers for item_id, _, numbers in hits}
+        sections = [
+            (item, excerpt(item.fetched_content or item.original_input, passages_of[item.id],
+                           settings.library_passage_chars, settings.library_passage_overlap))
+            for item in relevant_items
+        ]
+    else:
+        relevant_items = session.exec(
+            select(RawInput).order_by(RawInput.created_at.desc()).limit(15)
+        ).all()
+        sections = [(item, item.fetched_content or item.original_input) for item in relevant_items]
+        print(f"[Library/Basic] Using {len(relevant_items)} recent items")
     
-    if len(context_str) > 12000:
-        context_str = context_str[:12000] + "\n\n[...内容过长，已截断...]"
+    # Pack the matching spans into the token budget (best item first)
+    packed = pack_context([
+        ContextBlock(item.id, f"【标题: {item.title or '无标题'}】\n类型: {item.input_type}\n内容:", text)
+        for item, text in sections
+    ])
+    context_str = packed.text
+    print(f"[Library Chat] Context: {packed.tokens}/{packed.budget} tokens, {len(packed.included)} items "
+          f"({len(packed.truncated)} trimmed, {len(packed.dropped)} dropped)")
 
-    # Send sources
-    sources = [{"id": item.id, "title": item.title or item.original_input[:30]} for item in relevant_items]
+    # Send sources (only items that made it into the context)
+    included = set(packed.included)
+    sources = [{"id": item.id, "title": item.title or item.original_input[:30]} for item in relevant_items if item.id in included]
     yield f"event: sources\ndata: {json.dumps(sources)}\n\n"
+    yield f"event: context\ndata: {json.dumps(packed.report())}\n\n"
     
     # Stream the answer
     async for chunk in ai_processor.answer_question_stream(query, context_str):
@@ -171,6 +192,7 @@ async def clear_all_raw_inputs(session: Session = Depends(get_session)):
     try:
         lib_store = get_library_vector_store()
         lib_store.clear()
+        get_library_index_sync().reset()
     except:
         pass
     return {"message": f"Cleared {len(items)} items"}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select, col
 from ..database.database import get_session
 from ..database.models import KnowledgeNode
@@ -21,3 +21,44 @@ async def search_nodes(q: str, limit: int = 10, session: Session = Depends(get_s
     
     results = session.exec(statement).all()
     return results
+
+def _get_store(store: str):
+    from ..core.vector_store import vector_store
+    from .library import get_library_vector_store
+    if store == "nodes":
+        return vector_store
+    if store == "library":
+        return get_library_vector_store()
+    raise HTTPException(status_code=400, detail="store must be 'nodes' or 'library'")
+
+@router.get("/index")
+async def index_stats():
+    """Show which index engine each vector store is using."""
+    return {store: _get_store(store).index_stats() for store in ("nodes", "library")}
+
+@router.get("/index/recall")
+async def index_recall(store: str = "nodes", k: int = Query(10, ge=1, le=100),
+                       queries: int = Query(100, ge=1, le=1000)):
+    """Recall@k of a store's index against exact (flat) search, with per-query latency."""
+    return await _get_store(store).recall_report_async(k=k, num_queries=queries)
+
+@router.get("/metrics")
+async def retrieval_metrics():
+    """Query embedding scheduler metrics, per-store cache hit rates, label index, background indexing, crawler connection pool and LLM usage / response cache stats."""
+    from ..core.embedding_batcher import get_query_batcher
+    from ..core.ai_processor import ai_processor
+    from ..core.label_index import label_index
+    from ..core.index_refresher import index_refresher
+    from ..core.crawler import crawler_client, page_cache
+    return {
+        "query_batcher": get_query_batcher().metrics(),
+        "caches": {store: _get_store(store).cache_stats() for store in ("nodes", "library")},
+        "labels": label_index.stats(),
+        "index_refresher": index_refresher.stats(),
+        "crawler": {**crawler_client.stats(), "page_cache": page_cache.stats()},
+        "llm": {
+            "in_flight": ai_processor.llm_in_flight,
+            "usage": ai_processor.usage,
+            "cache": ai_processor.cache_stats(),
+        },
+    }
@@ -1,14 +1,149 @@
 from .settings import settings
+from .markdown_chunks import split_markdown
+from .disk_cache import DiskCache
+from .json_stream import JSONItemStream
+from .label_index import normalize_label
 import json
 import openai
 from openai import AsyncOpenAI
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 import traceback
 
+# Bump when a prompt changes meaning, so cached responses of the old prompt are not reused
+EXTRACT_PROMPT_VERSION = "extract-v1"
+SUMMARIZE_PROMPT_VERSION = "summarize-v1"
+
+
+class ExtractionFormatError(ValueError):
+    """The model's extraction output was not valid JSON."""
+    def __init__(self, content: str):
+        super().__init__("Unparseable extraction output")
+        self.content = content
+
+
+def _strip_code_fences(content: str) -> str:
+    """Clean content if it contains markdown code blocks."""
+    if "```" not in content:
+        return content
+    content = re.sub(r'^```json\s*', '', content, flags=re.MULTILINE)
+    content = re.sub(r'^```\s*', '', content, flags=re.MULTILINE)
+    content = re.sub(r'```$', '', content, flags=re.MULTILINE)
+    return content.strip()
+
+
+def _is_json_output(content: str) -> bool:
+    try:
+        json.loads(_strip_code_fences(content))
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def merge_extractions(results: List[Tuple[list, list]]) -> Tuple[list, list]:
+    """
+    Reduce per-chunk (nodes, edges) results: nodes are merged by normalized
+    label (first spelling and type win, distinct contents are joined), edges
+    are deduplicated and rewritten to the merged labels.
+    """
+    nodes: Dict[str, dict] = {}
+    for chunk_nodes, _ in results:
+        for node in chunk_nodes:
+            if not isinstance(node, dict) or not node.get("label"):
+                continue
+            key = normalize_label(node["label"])
+            content = (node.get("content") or "").strip()
+            if key not in nodes:
+                nodes[key] = dict(node, content=content)
+                continue
+            merged = nodes[key]
+            existing = merged.get("content") or ""
+            if content and content not in existing:
+                merged["content"] = content if existing in content else f"{existing}\n\n{content}"
+
+    edges = []
+    seen_edges = set()
+    for _, chunk_edges in results:
+        for edge in chunk_edges:
+            if not isinstance(edge, dict):
+                continue
+            source, target = normalize_label(edge.get("source_label")), normalize_label(edge.get("target_label"))
+            relation = (edge.get("relation_type") or "").strip()
+            if not source or not target or (source, target, relation) in seen_edges:
+                continue
+            seen_edges.add((source, target, relation))
+            edges.append(dict(
+                edge,
+                source_label=nodes[source]["label"] if source in nodes else edge["source_label"],
+                target_label=nodes[target]["label"] if target in nodes else edge["target_label"],
+            ))
+    return list(nodes.values()), edges
+
+
+class _ExtractionMerger:
+    """
+    Streaming counterpart of merge_extractions: a node whose label was seen
+    before is passed on under its first spelling, edges are rewritten to
+    known spellings and duplicates dropped.
+    """
+    def __init__(self):
+        self.labels: Dict[str, str] = {}
+        self.edges = set()
+
+    def add(self, kind: str, item: dict) -> Optional[dict]:
+        if kind == "node":
+            if not item.get("label"):
+                return None
+            key = normalize_label(item["label"])
+            if key in self.labels:
+                return dict(item, label=self.labels[key])
+            self.labels[key] = item["label"]
+            return item
+        source, target = normalize_label(item.get("source_label")), normalize_label(item.get("target_label"))
+        relation = (item.get("relation_type") or "").strip()
+        if not source or not target or (source, target, relation) in self.edges:
+            return None
+        self.edges.add((source, target, relation))
+        return dict(
+            item,
+            source_label=self.labels.get(source, item["source_label"]),
+            target_label=self.labels.get(target, item["target_label"]),
+        )
+
+
+# Per-task usage accumulator, see track_usage()
+_usage_tracker: ContextVar[Optional[dict]] = ContextVar("llm_usage_tracker", default=None)
+
+
+@contextmanager
+def track_usage():
+    """
+    Collect estimated LLM token usage of the calls made inside the block,
+    including tasks spawned from it (they inherit the context).
+    """
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    token = _usage_tracker.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage_tracker.reset(token)
+
+
 class AIProcessor:
     def __init__(self):
         self._init_client()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_size = 0
+        self._slots_loop = None
+        self._cache: Optional[DiskCache] = None
+        self.llm_in_flight = 0
+        # Process-wide estimated usage
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
 
     def _init_client(self):
         print(f"DEBUG: _init_client called. Using Key: {settings.openai_api_key[:3] if settings.openai_api_key else 'Placeholder'}...")
@@ -30,22 +165,193 @@ class AIProcessor:
             print(f"DEBUG: AIProcessor detected config change. Re-initializing client.")
             self._init_client()
 
-    async def extract_knowledge(self, text: str, existing_labels: list[str] = None):
+    def _llm_slots(self) -> asyncio.Semaphore:
+        """Global cap on concurrent background LLM calls (ingest, batch import)."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_size != settings.llm_max_concurrency or self._slots_loop is not loop:
+            # Rebuilt when the limit changes or on a new event loop (e.g. after a reload)
+            self._slots_size = settings.llm_max_concurrency
+            self._slots_loop = loop
+            self._slots = asyncio.Semaphore(max(1, self._slots_size))
+        return self._slots
+
+    def _get_cache(self) -> Optional[DiskCache]:
+        if not settings.llm_cache_enabled:
+            return None
+        if self._cache is None:
+            self._cache = DiskCache(settings.llm_cache_path, settings.llm_cache_max_mb * 1024 * 1024, name="LLMCache")
+        return self._cache
+
+    def cache_stats(self) -> dict:
+        cache = self._get_cache()
+        return cache.stats() if cache is not None else {"enabled": False}
+
+    def clear_cache(self):
+        cache = self._get_cache()
+        if cache is not None:
+            cache.clear()
+
+    @staticmethod
+    def _cache_key(prompt_version: str, cache_input: str, params: dict) -> str:
+        """Hash of everything that determines the response: model, endpoint, prompt version, input and sampling params."""
+        payload = json.dumps({
+            "model": settings.openai_model,
+            "base_url": settings.openai_base_url.rstrip('/'),
+            "prompt_version": prompt_version,
+            "input": cache_input,
+            "params": params,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def _stream_completion(self, messages: list, prompt_version: Optional[str] = None,
+                                 cache_input: Optional[str] = None, use_cache: bool = True,
+                                 validate: Optional[Callable[[str], bool]] = None, **params) -> str:
+        """
+        Run one streamed chat completion to the end and return its text.
+        Streaming avoids read timeouts on long outputs.
+        """
+        content = ""
+        async for delta in self._stream_deltas(messages, prompt_version, cache_input, use_cache, validate, **params):
+            content += delta
+        return content
+
+    async def _stream_deltas(self, messages: list, prompt_version: Optional[str] = None,
+                             cache_input: Optional[str] = None, use_cache: bool = True,
+                             validate: Optional[Callable[[str], bool]] = None, **params) -> AsyncGenerator[str, None]:
+        """
+        Run one streamed chat completion, yielding text as it arrives. Token
+        usage is estimated and added to the global counters and any active
+        tracker, also when the stream breaks off.
+
+        Calls with a prompt_version go through the on-disk response cache,
+        keyed on cache_input (default: the full messages); a hit is yielded
+        in one piece. use_cache=False skips the lookup but still stores the
+        fresh response. Only complete responses accepted by validate() are
+        stored.
+        """
+        cache = self._get_cache() if prompt_version else None
+        key = None
+        if cache is not None:
+            key = self._cache_key(prompt_version, cache_input if cache_input is not None else json.dumps(messages, ensure_ascii=False), params)
+            if use_cache:
+                cached = await cache.get_async(key)
+                if cached is not None:
+                    yield cached.decode('utf-8')
+                    return
+
+        content = ""
+        try:
+            async with self._llm_slots():
+                self.llm_in_flight += 1
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=settings.openai_model,
+                        messages=messages,
+                        stream=True,
+                        **params
+                    )
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            delta = chunk.choices[0].delta.content
+                            content += delta
+                            yield delta
+                finally:
+                    self.llm_in_flight -= 1
+        finally:
+            self._record_usage(messages, content)
+
+        if key is not None and content and (validate is None or validate(content)):
+            await cache.put_async(key, content.encode('utf-8'))
+
+    def _record_usage(self, messages: list, content: str):
+        from .context_packer import count_tokens
+        usage = {
+            "calls": 1,
+            "prompt_tokens": sum(count_tokens(m["content"]) for m in messages),
+            "completion_tokens": count_tokens(content),
+        }
+        for sink in (self.usage, _usage_tracker.get()):
+            if sink is not None:
+                for key_name, value in usage.items():
+                    sink[key_name] = sink.get(key_name, 0) + value
+
+    async def extract_knowledge(self, text: str, existing_labels: list[str] = None, use_cache: bool = True):
         """
         Extracts nodes and edges from text using an LLM.
-        Uses streaming internally to avoid timeout, but returns complete result.
+        Collects stream_knowledge() into complete lists; repeated labels are merged.
+        Responses are cached on disk; use_cache=False forces a fresh call.
+        """
+        nodes, edges = [], []
+        async for kind, item in self.stream_knowledge(text, existing_labels, use_cache):
+            if kind == "node":
+                nodes.append(item)
+            elif kind == "edge":
+                edges.append(item)
+        return merge_extractions([(nodes, edges)])
+
+    async def stream_knowledge(self, text: str, existing_labels: list[str] = None, use_cache: bool = True,
+                               raise_errors: bool = False) -> AsyncGenerator[Tuple[str, dict], None]:
+        """
+        Extract nodes and edges, yielding ("node", node) and ("edge", edge) as
+        soon as each object is complete in the model output. Long documents
+        are extracted chunk by chunk in parallel (map); a label seen before
+        is yielded again under its first spelling so the consumer can merge
+        it (reduce), and duplicate edges are dropped.
+
+        If the output is cut short or malformed, or the document has more
+        than settings.extract_max_chunks chunks, everything completed has
+        already been yielded and a final ("incomplete", info) event reports
+        what is missing. If nothing could be extracted at all, the
+        error placeholder nodes are yielded instead, or with raise_errors the
+        error is raised (so a queued job is retried).
         """
         self._check_and_reinit_client()
 
         # Fail fast if no valid key
         if not settings.openai_api_key or settings.openai_api_key == "sk-placeholder" or "placeholder" in self.client.api_key:
-             return [
-                 {"label": "配置缺失", "type": "System", "content": "请点击右上角设置图标，配置您的 OpenAI/Deepseek API Key 以启用 AI 分析功能。"}
-             ], []
+            yield "node", {"label": "配置缺失", "type": "System", "content": "请点击右上角设置图标，配置您的 OpenAI/Deepseek API Key 以启用 AI 分析功能。"}
+            return
 
         if not text.strip():
-            return [], []
+            return
 
+        system_prompt = self._extraction_prompt(existing_labels)
+        chunks = split_markdown(text, settings.extract_chunk_chars)
+        total_chunks = len(chunks)
+        if 0 < settings.extract_max_chunks < total_chunks:
+            chunks = chunks[:settings.extract_max_chunks]
+        skipped = total_chunks - len(chunks)
+        merger = _ExtractionMerger()
+        errors: List[BaseException] = []
+        produced = 0
+        async for kind, item in self._extract_chunks(chunks, system_prompt, use_cache, errors):
+            item = merger.add(kind, item)
+            if item is not None:
+                produced += 1
+                yield kind, item
+
+        if total_chunks > 1:
+            print(f"[AIProcessor] Chunked extraction: {len(chunks)} of {total_chunks} chunks, {len(errors)} failed")
+        if not errors and not skipped:
+            return
+        if errors and not produced:
+            if raise_errors:
+                raise errors[0]
+            nodes, edges = self._extraction_error_result(errors[0])
+            for node in nodes:
+                yield "node", node
+            for edge in edges:
+                yield "edge", edge
+            return
+        for error in errors:
+            print(f"[AIProcessor] Extraction incomplete, keeping {produced} objects: {error}")
+        reasons = [f"{type(errors[0]).__name__}: {errors[0]}"] if errors else []
+        if skipped:
+            reasons.append(f"only the first {len(chunks)} of {total_chunks} chunks were extracted (extract_max_chunks)")
+        yield "incomplete", {"error": "; ".join(reasons), "failed_chunks": len(errors), "skipped_chunks": skipped}
+
+    @staticmethod
+    def _extraction_prompt(existing_labels: Optional[list]) -> str:
         # Construct Context String
         context_instruction = ""
         if existing_labels:
@@ -112,68 +418,93 @@ class AIProcessor:
 """
 
 
-        try:
-            # Use streaming to avoid timeout
-            stream = await self.client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"},
-                stream=True
-            )
-            
-            content = ""
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
-            
-            # Clean content if it contains markdown code blocks
-            clean_content = content
-            if "```" in clean_content:
-                import re
-                clean_content = re.sub(r'^```json\s*', '', clean_content, flags=re.MULTILINE)
-                clean_content = re.sub(r'^```\s*', '', clean_content, flags=re.MULTILINE)
-                clean_content = re.sub(r'```$', '', clean_content, flags=re.MULTILINE)
-                clean_content = clean_content.strip()
+        return system_prompt
 
+    async def _extract_chunks(self, chunks: List[str], system_prompt: str, use_cache: bool,
+                              errors: List[BaseException]) -> AsyncGenerator[Tuple[str, dict], None]:
+        """
+        Stream all chunks in parallel (bounded), yielding objects in arrival order.
+        A chunk that fails is recorded in errors; what it produced before failing is kept.
+        """
+        limit = asyncio.Semaphore(max(1, settings.extract_chunk_concurrency))
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_chunk(chunk: str):
             try:
-                data = json.loads(clean_content)
-            except json.JSONDecodeError as e:
-                print(f"JSON Parse Error: {e}")
-                print(f"Raw Content that failed to parse: {content}")
-                # Attempt to repair or partial parse could go here, but for now just fail gracefully with info
-                return [
-                    {"label": "格式错误", "type": "Error", "content": f"AI返回格式异常，无法解析。原始返回: {content[:100]}..."}
-                ], []
-
-            nodes = data.get("nodes", [])
-            edges = data.get("edges", [])
-            
-            # Validate structure
-            if not isinstance(nodes, list):
-                print(f"Invalid nodes format: {type(nodes)}")
-                nodes = []
-            if not isinstance(edges, list):
-                 print(f"Invalid edges format: {type(edges)}")
-                 edges = []
-
-            return nodes, edges
-            
-        except openai.AuthenticationError as ae:
-            print(f"AI Auth Error: {ae}")
+                async with limit:
+                    async for event in self._extract_chunk(chunk, system_prompt, use_cache):
+                        await queue.put(event)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(run_chunk(chunk)) for chunk in chunks]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                else:
+                    yield event
+        finally:
+            # Consumer stopped early: stop the calls still streaming
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _extract_chunk(self, text: str, system_prompt: str,
+                             use_cache: bool = True) -> AsyncGenerator[Tuple[str, dict], None]:
+        """One streamed extraction call. Raises on API errors and on output that ends before the JSON closes."""
+        parser = JSONItemStream()
+        head = ""
+        # The cache key leaves out the existing-labels hint in the system prompt:
+        # it changes with every ingest, and re-ingesting the same text should hit.
+        async for delta in self._stream_deltas(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ],
+            prompt_version=EXTRACT_PROMPT_VERSION,
+            cache_input=text,
+            use_cache=use_cache,
+            validate=_is_json_output,
+            temperature=0.3,
+            response_format={"type": "json_object"},
+        ):
+            if len(head) < 200:
+                head += delta
+            for key, item in parser.feed(delta):
+                if key in ("nodes", "edges") and isinstance(item, dict):
+                    yield ("node" if key == "nodes" else "edge"), item
+
+        if parser.skipped:
+            print(f"[AIProcessor] Skipped {parser.skipped} malformed objects in extraction output")
+        if not parser.complete:
+            print(f"JSON Parse Error: output ended after {parser.items} complete objects")
+            print(f"Raw Content that failed to parse: {head}")
+            raise ExtractionFormatError(head)
+
+    @staticmethod
+    def _extraction_error_result(e: BaseException):
+        """Turn an extraction failure into the placeholder nodes shown in the graph."""
+        if isinstance(e, ExtractionFormatError):
+            # Attempt to repair or partial parse could go here, but for now just fail gracefully with info
             return [
-                {"label": "认证失败", "type": "Error", "content": "API Key 无效或过期。请检查设置。\n详细信息: " + str(ae)}
+                {"label": "格式错误", "type": "Error", "content": f"AI返回格式异常，无法解析。原始返回: {e.content[:100]}..."}
             ], []
-        except Exception as e:
-            print(f"AI Processing Error: {e}")
-            traceback.print_exc() # Print full stack trace
-            # Fallback for demo if no API key or error
+        if isinstance(e, openai.AuthenticationError):
+            print(f"AI Auth Error: {e}")
             return [
-                {"label": "处理失败", "type": "Error", "content": f"AI处理遇到问题: {str(e)}"}
-            ], [{"source_label": "错误", "target_label": "处理失败", "relation_type": "导致"}]
+                {"label": "认证失败", "type": "Error", "content": "API Key 无效或过期。请检查设置。\n详细信息: " + str(e)}
+            ], []
+        print(f"AI Processing Error: {e}")
+        traceback.print_exception(type(e), e, e.__traceback__) # Print full stack trace
+        # Fallback for demo if no API key or error
+        return [
+            {"label": "处理失败", "type": "Error", "content": f"AI处理遇到问题: {str(e)}"}
+        ], [{"source_label": "错误", "target_label": "处理失败", "relation_type": "导致"}]
 
     async def answer_question_stream(self, question: str, context: str) -> AsyncGenerator[str, None]:
         """
@@ -228,11 +559,14 @@ class AIProcessor:
             full_answer += chunk
         return full_answer
 
-    async def summarize_content(self, raw_content: str, url: str = None):
+    async def summarize_content(self, raw_content: str, url: str = None, use_cache: bool = True,
+                                raise_errors: bool = False):
         """
         Cleans and organizes web content for storage in Knowledge Base.
         Preserves original text but removes noise and improves formatting.
-        Uses streaming internally to avoid timeout.
+        Uses streaming internally to avoid timeout. A failed call falls back
+        to the raw text, or raises with raise_errors (chunks that did succeed
+        are in the response cache for the retry).
         """
         self._check_and_reinit_client()
         
@@ -258,29 +592,44 @@ class AIProcessor:
         注意：**不要概括**，**不要省略原文**，只是清理和格式化。
         """
 
-        try:
+        async def clean(chunk: str) -> str:
             # Use streaming to avoid timeout
-            stream = await self.client.chat.completions.create(
-                model=settings.openai_model,
-                messages=[
+            return await self._stream_completion(
+                [
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"请整理以下网页内容（保留原文，只清理格式）：\n\n{raw_content[:12000]}"}
+                    {"role": "user", "content": f"请整理以下网页内容（保留原文，只清理格式）：\n\n{chunk}"}
                 ],
+                prompt_version=SUMMARIZE_PROMPT_VERSION,
+                use_cache=use_cache,
                 temperature=0.2,
                 max_tokens=4000,
-                stream=True
             )
-            
-            # Collect all chunks
-            content = ""
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
-            
-            return content
-        except Exception as e:
-            print(f"AI Content Cleaning failed: {e}")
-            return raw_content[:8000]  # Fallback
 
+        chunks = split_markdown(raw_content, settings.summarize_chunk_chars)
+        if len(chunks) <= 1:
+            try:
+                return await clean(raw_content)
+            except Exception as e:
+                print(f"AI Content Cleaning failed: {e}")
+                if raise_errors:
+                    raise
+                return raw_content[:8000]  # Fallback
+
+        # Long pages: clean each chunk in parallel and keep them in document order
+        limit = asyncio.Semaphore(max(1, settings.extract_chunk_concurrency))
+
+        async def clean_one(chunk: str) -> str:
+            async with limit:
+                try:
+                    return await clean(chunk)
+                except Exception as e:
+                    print(f"AI Content Cleaning failed for a chunk: {e}")
+                    if raise_errors:
+                        raise
+                    return chunk  # Fallback: keep the raw text of this chunk
+
+        cleaned = await asyncio.gather(*(clean_one(chunk) for chunk in chunks))
+        print(f"[AIProcessor] Cleaned {len(chunks)} chunks")
+        return "\n\n".join(part.strip() for part in cleaned if part.strip())
 
 ai_processor = AIProcessor()
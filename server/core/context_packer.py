@@ -0,0 +1,178 @@
+"""
+Context Packer
+Fits retrieved nodes/passages into a token budget for the answer prompt.
+Blocks arrive best-first and are packed greedily; a block that does not fit
+is trimmed at a sentence boundary or skipped in favour of smaller ones.
+Repeated content (e.g. the "--- [Updated ...] ---" sections appended on
+ingest) is removed before counting.
+
+Tokens are counted with tiktoken when it is installed, otherwise estimated.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .settings import settings
+
+_UPDATE_MARKER_RE = re.compile(r"\n*--- \[Updated [^\]]*\] ---\n")
+_CJK_RE = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+_SENTENCE_END_RE = re.compile(r"[。！？!?.\n]")
+
+BLOCK_SEPARATOR = "\n\n---\n\n"
+TRUNCATION_NOTE = "\n[...]"
+# A trimmed block shorter than this is not worth including
+MIN_TRIMMED_TOKENS = 64
+# Share of the budget a single block may take when there are others
+MAX_BLOCK_SHARE = 0.5
+
+_encoders = {}
+
+
+def _get_encoder(model: str):
+    """tiktoken encoder for the model, or None when tiktoken is unavailable."""
+    if model in _encoders:
+        return _encoders[model]
+    encoder = None
+    try:
+        import tiktoken
+        try:
+            encoder = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Non-OpenAI models (e.g. DeepSeek) use BPE vocabularies of similar density
+            encoder = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Not installed, or the encoding could not be downloaded
+        encoder = None
+    _encoders[model] = encoder
+    return encoder
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    encoder = _get_encoder(model or settings.openai_model)
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    # Estimate: about one token per CJK character, four characters per token otherwise
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def dedupe_sections(content: str) -> str:
+    """
+    Drop "--- [Updated ...] ---" sections that repeat, or are contained in,
+    another section of the same content. The first occurrence is kept.
+    """
+    if "--- [Updated" not in content:
+        return content
+    markers = [m.group(0) for m in _UPDATE_MARKER_RE.finditer(content)]
+    sections = _UPDATE_MARKER_RE.split(content)
+    normalized = [_normalize(section) for section in sections]
+
+    kept = []
+    for i, section in enumerate(sections):
+        norm = normalized[i]
+        if not norm:
+            continue
+        duplicate = any(
+            j != i and norm in normalized[j] and (norm != normalized[j] or j < i)
+            for j in range(len(sections))
+        )
+        if not duplicate:
+            # Keep the marker that introduced this section
+            kept.append((markers[i - 1] if i > 0 else "") + section)
+    return "".join(kept).strip()
+
+
+@dataclass
+class ContextBlock:
+    key: int
+    header: str
+    body: str
+
+
+@dataclass
+class PackedContext:
+    text: str = ""
+    tokens: int = 0
+    budget: int = 0
+    included: List[int] = field(default_factory=list)
+    truncated: List[int] = field(default_factory=list)
+    dropped: List[int] = field(default_factory=list)
+
+    def report(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "included": len(self.included),
+            "truncated": len(self.truncated),
+            "dropped": len(self.dropped),
+        }
+
+
+def _trim_to_tokens(text: str, max_tokens: int, model: Optional[str]) -> str:
+    """Longest prefix within max_tokens, cut back to a sentence end when one is near."""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid], model) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = text[:lo]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(prefix)]
+    if ends and ends[-1] >= len(prefix) * 0.7:
+        prefix = prefix[:ends[-1]]
+    return prefix.rstrip()
+
+
+def pack_context(blocks: List[ContextBlock], budget: Optional[int] = None,
+                 model: Optional[str] = None) -> PackedContext:
+    """
+    Greedily pack best-first blocks into `budget` tokens; a block over its
+    share of the budget is trimmed.
+    Bodies are deduplicated first; a block whose body repeats an earlier one is dropped.
+    """
+    budget = budget or settings.context_token_budget
+    packed = PackedContext(budget=budget)
+    parts: List[str] = []
+    seen_bodies: List[str] = []
+    separator_tokens = count_tokens(BLOCK_SEPARATOR, model)
+    # One long block may not crowd out everything ranked below it
+    block_cap = budget if len(blocks) <= 1 else int(budget * MAX_BLOCK_SHARE)
+
+    for block in blocks:
+        body = dedupe_sections(block.body or "")
+        norm = _normalize(body)
+        if norm and any(norm in earlier for earlier in seen_bodies):
+            packed.dropped.append(block.key)
+            continue
+
+        overhead = separator_tokens if parts else 0
+        remaining = min(budget - packed.tokens - overhead, block_cap)
+        text = f"{block.header}\n{body}"
+        tokens = count_tokens(text, model)
+
+        if tokens > remaining:
+            header_tokens = count_tokens(f"{block.header}\n", model)
+            room = remaining - header_tokens - count_tokens(TRUNCATION_NOTE, model)
+            if room < MIN_TRIMMED_TOKENS:
+                # Skip it; a smaller block further down may still fit
+                packed.dropped.append(block.key)
+                continue
+            text = f"{block.header}\n{_trim_to_tokens(body, room, model)}{TRUNCATION_NOTE}"
+            tokens = count_tokens(text, model)
+            packed.truncated.append(block.key)
+
+        parts.append(text)
+        seen_bodies.append(norm)
+        packed.included.append(block.key)
+        packed.tokens += tokens + overhead
+
+    packed.text = BLOCK_SEPARATOR.join(parts)
+    return packed
+
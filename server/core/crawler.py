@@ -1,8 +1,25 @@
+import asyncio
 import httpx
-from bs4 import BeautifulSoup
+import io
+import json
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, unquote
+import html
 import re
+from dataclasses import dataclass
+from typing import Dict, Optional
 import html2text
+import lxml.html
 from readability import Document as ReadabilityDocument
+from readability.encoding import get_encoding
+from readability.htmls import build_doc, get_title
+from .disk_cache import DiskCache
+from .extraction_service import run_in_extraction_pool
+from .settings import settings
+from .site_extractors import site_extractors
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 # Configure html2text for better Markdown output
 def get_html2text_converter():
@@ -17,90 +34,551 @@ def get_html2text_converter():
     h.protect_links = True
     return h
 
-def process_html_content(html_content: str, url: str = "", extract_main_content: bool = True) -> str:
+# Dropped from the page body when Readability cannot find an article
+NOISE_TAGS = ("script", "style", "nav", "footer", "header", "aside",
+              "iframe", "noscript", "form", "button", "input", "svg")
+
+def process_html_content(html_content: str, url: str = "", extract_main_content: bool = True,
+                         max_chars: Optional[int] = None, site_specific: bool = True) -> str:
     """
     Processes raw HTML content and converts it to clean Markdown.
-    If extract_main_content is True, uses Readability to find the main article.
+    If extract_main_content is True, uses a site extractor for registered
+    sites (see site_extractors) and Readability for everything else.
     If False, converts the provided HTML directly (for manual selection).
+
+    The page is parsed once with lxml: the title is read from that tree and
+    Readability works on it directly, and its article HTML goes straight to
+    html2text. CPU-bound; async code should call process_html_content_async.
     """
     try:
         title = "No Title"
-        main_content = None
+        main_html = None
 
         if extract_main_content:
-            # Use Readability algorithm for universal content extraction
-            print("DEBUG: Using Readability algorithm for content extraction...")
             try:
-                readability_doc = ReadabilityDocument(html_content)
-                readability_html = readability_doc.summary()
-                title = readability_doc.title() or "No Title"
-                
-                # Parse the Readability output
-                main_content = BeautifulSoup(readability_html, "html.parser")
-                print(f"DEBUG: Readability extracted content successfully")
+                doc, _ = build_doc(html_content)
             except Exception as e:
-                print(f"DEBUG: Readability extraction failed: {e}, falling back to body")
-                soup = BeautifulSoup(html_content, "html.parser")
-                title = soup.title.string.strip() if soup.title else "No Title"
-                
-                # Remove noise tags
-                for tag in soup(["script", "style", "nav", "footer", "header", "aside", 
-                                "iframe", "noscript", "form", "button", "input", "svg"]):
-                    tag.decompose()
-                main_content = soup.body
+                print(f"DEBUG: Could not parse HTML: {e}")
+                doc = None
+            site = site_extractors.extract(doc, url) if doc is not None and site_specific else None
+            if site is not None:
+                name, site_title, main_html = site
+                title = site_title or get_title(doc)
+                print(f"DEBUG: Site extractor '{name}' matched, skipping Readability")
+            elif doc is not None:
+                # Use Readability algorithm for universal content extraction
+                print("DEBUG: Using Readability algorithm for content extraction...")
+                title = get_title(doc)
+                try:
+                    main_html = ReadabilityDocument(doc).summary()
+                    print(f"DEBUG: Readability extracted content successfully")
+                except Exception as e:
+                    print(f"DEBUG: Readability extraction failed: {e}, falling back to body")
+                    for tag in list(doc.iter(*NOISE_TAGS)):
+                        tag.drop_tree()
+                    body = doc.find("body")
+                    if body is not None:
+                        main_html = lxml.html.tostring(body, encoding="unicode")
         else:
-            # Manual selection - simply parse the provided fragment
+            # Manual selection - convert the provided fragment as is
             print("DEBUG: Skipping Readability (Manual Selection)...")
-            main_content = BeautifulSoup(html_content, "html.parser")
+            main_html = html_content
             # Try to find a title if full document, otherwise ignore
-            if main_content.title:
-                title = main_content.title.string.strip()
-        
-        if not main_content:
+            match = re.search(r"<title[^>]*>(.*?)</title>", html_content, re.IGNORECASE | re.DOTALL)
+            if match and match.group(1).strip():
+                title = html.unescape(match.group(1).strip())
+
+        if not main_html:
             return f"Title: {title}\n\nError: Could not extract content"
-        
+
         # Convert HTML to Markdown using html2text
         converter = get_html2text_converter()
         # Ensure base url is set for relative links if url is provided
         if url:
             converter.baseurl = url
-            
-        markdown_content = converter.handle(str(main_content))
-        
+
+        markdown_content = converter.handle(main_html)
+
         # Clean up excessive whitespace
         markdown_content = re.sub(r'\n{3,}', '\n\n', markdown_content)
         markdown_content = markdown_content.strip()
-        
+
         # Limit length
-        if len(markdown_content) > 20000:
-            markdown_content = markdown_content[:20000] + "\n\n[内容已截断...]"
-        
+        markdown_content = _limit_length(markdown_content, max_chars)
+
         print(f"DEBUG: Successfully processed {len(markdown_content)} chars.")
         return f"Title: {title}\n\n{markdown_content}"
-        
+
     except Exception as e:
         print(f"Failed to process HTML: {e}")
         return f"Error processing content: {str(e)}"
 
-async def fetch_url_content(url: str) -> str:
+async def process_html_content_async(html_content: str, url: str = "", extract_main_content: bool = True) -> str:
+    """process_html_content on the extraction process pool, off the event loop."""
+    return await run_in_extraction_pool(
+        process_html_content, html_content, url, extract_main_content, settings.crawl_max_chars
+    )
+
+# Content kinds the crawler extracts, by declared type; other types are sniffed from the first bytes
+HTML_TYPES = {"text/html", "application/xhtml+xml"}
+PDF_TYPES = {"application/pdf", "application/x-pdf"}
+TEXT_TYPES = {"text/plain", "text/markdown", "text/x-markdown"}
+
+def kind_from_content_type(content_type: str) -> Optional[str]:
+    """"html", "pdf" or "text" for a declared type; None when the first bytes have to decide."""
+    if content_type in HTML_TYPES:
+        return "html"
+    if content_type in PDF_TYPES:
+        return "pdf"
+    if content_type in TEXT_TYPES:
+        return "text"
+    return None
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    """Content kind from the first bytes of a body; None for binary or unknown content."""
+    start = head.lstrip()[:512].lower()
+    if start.startswith(b"%pdf-"):
+        return "pdf"
+    if start.startswith((b"<!doctype html", b"<html", b"<head", b"<body")) or b"<html" in start:
+        return "html"
+    if b"\x00" in head:
+        return None
+    try:
+        head[:4096].decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < min(len(head), 4096) - 3:  # not just a character cut at the chunk end
+            return None
+    return "text"
+
+def decode_body(body: bytes, charset: Optional[str]) -> str:
+    """Text of a possibly truncated body: declared charset, else UTF-8, else detected from the page start."""
+    if charset:
+        try:
+            return body.decode(charset, errors="replace")
+        except LookupError:
+            pass
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start >= len(body) - 3:  # only the last character was cut by the size cap
+            return body.decode("utf-8", errors="replace")
+    return body.decode(get_encoding(body[:65536]), errors="replace")
+
+@dataclass
+class FetchedPage:
+    response: httpx.Response  # closed; status and headers only
+    content_type: str
+    kind: Optional[str]  # "html" / "pdf" / "text"; None for unsupported content
+    body: bytes = b""
+    truncated: bool = False  # stopped at the size cap
+
+    @property
+    def text(self) -> str:
+        return decode_body(self.body, self.response.charset_encoding)
+
+class CrawlerClient:
     """
-    Fetches the URL and extracts main text content as clean Markdown.
+    One pooled httpx client for all fetches: connections are kept alive and
+    reused across pages and jobs (optionally over HTTP/2), concurrent
+    requests per host are capped at settings.crawl_per_host_concurrency and
+    request starts to the same host are spaced by
+    settings.crawl_politeness_delay_seconds.
+
+    The app lifespan starts and closes it; outside the app (scripts, tests)
+    the client is created on first use. Clients and host limits belong to
+    the event loop they were created on; start() on another loop closes the
+    old client before creating a new one.
     """
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = None
+        self._hosts: Dict[str, dict] = {}  # host -> {"slot": Semaphore, "next_at": loop time, "active": n}
+        self.http2 = False
+
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.in_flight = 0
+        self.politeness_wait_seconds = 0.0
+        self.http_versions: Dict[str, int] = {}
+        self.bytes_read = 0
+        self.truncated = 0  # bodies cut at the size cap
+        self.aborted = 0    # responses dropped as unsupported content
+
+    def start(self):
+        """Create the pooled client on the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is loop:
+            return
+        if self._client is not None:
+            self._discard_client()
+        self.http2 = settings.crawl_http2
+        if self.http2:
+            try:
+                import h2  # noqa: F401  httpx needs it for HTTP/2
+            except ImportError:
+                print("[Crawler] HTTP/2 requested but the h2 package is not installed (pip install httpx[http2]), using HTTP/1.1")
+                self.http2 = False
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            verify=settings.crawl_verify_ssl,
+            timeout=settings.crawl_timeout_seconds,
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=settings.crawl_max_connections,
+                max_keepalive_connections=settings.crawl_max_keepalive_connections,
+                keepalive_expiry=settings.crawl_keepalive_expiry_seconds,
+            ),
+        )
+        self._loop = loop
+        self._hosts = {}
+        print(f"[Crawler] Pooled client ready (HTTP/2: {self.http2}, "
+              f"{settings.crawl_max_connections} connections, {settings.crawl_per_host_concurrency} per host)")
+
+    def _discard_client(self):
+        """Release a client created on another event loop, closing its pool on that loop if it still runs."""
+        client, loop = self._client, self._loop
+        self._client = None
+        self._loop = None
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            print("[Crawler] Closing the pooled client of another event loop")
+        else:
+            # Its loop is gone: close what can be closed from this loop; sockets
+            # bound to the old loop are released when the client is collected
+            asyncio.get_running_loop().create_task(self._close_quietly(client))
+            print("[Crawler] Dropping the pooled client of a closed event loop")
+
+    @staticmethod
+    async def _close_quietly(client: httpx.AsyncClient):
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"[Crawler] Could not close the old pooled client cleanly: {e}")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+        self._hosts = {}
+
+    def _host(self, url: str) -> dict:
+        host = (urlsplit(url).hostname or "").lower()
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "slot": asyncio.Semaphore(max(1, settings.crawl_per_host_concurrency)),
+                "next_at": 0.0,
+                "active": 0,
+            }
+        return self._hosts[host]
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+
+    async def fetch(self, url: str, headers: Optional[dict] = None) -> "FetchedPage":
+        """
+        Streaming GET through the shared pool, within the host's concurrency
+        limit and politeness delay. Stops reading at the size cap for the
+        content kind and aborts content that is neither HTML, PDF nor text.
+        """
+        if self._client is None or self._loop is not asyncio.get_running_loop():
+            self.start()
+        host = self._host(url)
+        async with host["slot"]:
+            # Reserve the next start time for this host before waiting, so waiters queue up evenly
+            now = self._loop.time()
+            wait = host["next_at"] - now
+            host["next_at"] = max(now, host["next_at"]) + settings.crawl_politeness_delay_seconds
+            if wait > 0:
+                self.politeness_wait_seconds += wait
+                await asyncio.sleep(wait)
+
+            host["active"] += 1
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                async with self._client.stream("GET", url, headers=headers, extensions={"trace": self._trace}) as response:
+                    page = await self._read(response)
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                host["active"] -= 1
+                self.in_flight -= 1
+        self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+        return page
+
+    async def _read(self, response: httpx.Response) -> "FetchedPage":
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        page = FetchedPage(response=response, content_type=content_type, kind=kind_from_content_type(content_type))
+        if not response.is_success:
+            # Error pages and redirects without a target: only the status matters
+            return page
+        declared = response.headers.get("Content-Length", "")
+        if page.kind == "pdf" and declared.isdigit() and int(declared) > settings.crawl_max_pdf_bytes:
+            # Only whole PDFs can be extracted: do not download one that is over the cap
+            page.truncated = True
+            self.truncated += 1
+            return page
+
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            if page.kind is None:
+                page.kind = sniff_kind(chunk)
+                if page.kind is None:
+                    self.aborted += 1
+                    break
+            chunks.append(chunk)
+            size += len(chunk)
+            limit = settings.crawl_max_pdf_bytes if page.kind == "pdf" else settings.crawl_max_bytes
+            if size > limit:
+                page.truncated = True
+                self.truncated += 1
+                break
+        else:
+            if page.kind is None:  # empty body of an unknown type
+                self.aborted += 1
+        page.body = b"".join(chunks)[:settings.crawl_max_pdf_bytes if page.kind == "pdf" else settings.crawl_max_bytes]
+        self.bytes_read += size
+        return page
+
+    def stats(self) -> dict:
+        return {
+            "running": self._client is not None,
+            "http2": self.http2,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "new_connections": self.new_connections,
+            # Requests served on an already open connection
+            "connection_reuse": round(1 - self.new_connections / self.requests, 3) if self.requests else 0.0,
+            "http_versions": dict(self.http_versions),
+            "bytes_read": self.bytes_read,
+            "truncated": self.truncated,
+            "aborted": self.aborted,
+            "politeness_wait_seconds": round(self.politeness_wait_seconds, 2),
+            "hosts_active": {name: host["active"] for name, host in self._hosts.items() if host["active"]},
+            "max_connections": settings.crawl_max_connections,
+            "per_host_concurrency": settings.crawl_per_host_concurrency,
+        }
+
+
+# Singleton instance
+crawler_client = CrawlerClient()
+
+def _title_from_url(url: str) -> str:
+    parts = urlsplit(url)
+    name = unquote(parts.path.rstrip("/").rsplit("/", 1)[-1])
+    return name or parts.hostname or "No Title"
+
+def _limit_length(content: str, max_chars: Optional[int]) -> str:
+    max_chars = max_chars or settings.crawl_max_chars
+    if len(content) > max_chars:
+        content = content[:max_chars] + "\n\n[内容已截断...]"
+    return content
+
+def process_pdf_content(data: bytes, url: str = "", max_chars: Optional[int] = None) -> str:
+    """Text of a PDF document, page by page. Needs the optional pypdf package; CPU-bound."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return "Error processing content: PDF support needs the pypdf package (pip install pypdf)"
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+        reader = PdfReader(io.BytesIO(data))
+        metadata_title = reader.metadata.title if reader.metadata else None
+        title = (metadata_title or "").strip() or _title_from_url(url)
+        limit = max_chars or settings.crawl_max_chars
+        pages = []
+        length = 0
+        for page in reader.pages:
+            text = (page.extract_text() or "").strip()
+            if text:
+                pages.append(text)
+                length += len(text)
+            if length > limit:
+                break
+        content = re.sub(r'\n{3,}', '\n\n', "\n\n".join(pages)).strip()
+        if not content:
+            return f"Title: {title}\n\nError: Could not extract content"
+        print(f"DEBUG: Extracted {len(content)} chars from {len(reader.pages)} PDF pages.")
+        return f"Title: {title}\n\n{_limit_length(content, max_chars)}"
+    except Exception as e:
+        print(f"Failed to process PDF: {e}")
+        return f"Error processing content: {str(e)}"
+
+def process_text_content(text: str, url: str = "", max_chars: Optional[int] = None) -> str:
+    """Plain text or Markdown as is; the title is its first line."""
+    content = re.sub(r'\n{3,}', '\n\n', text.replace("\r\n", "\n").replace("\r", "\n")).strip()
+    first_line = content.split("\n", 1)[0].lstrip("#").strip() if content else ""
+    title = first_line[:100] if first_line else _title_from_url(url)
+    if not content:
+        return f"Title: {title}\n\nError: Could not extract content"
+    return f"Title: {title}\n\n{_limit_length(content, max_chars)}"
+
+async def extract_page(page: "FetchedPage", url: str) -> str:
+    """Markdown of a fetched page by its content kind; HTML and PDF run on the extraction pool."""
+    if page.kind == "html":
+        return await process_html_content_async(page.text, url)
+    if page.kind == "pdf":
+        if page.truncated:
+            return f"Error processing content: PDF is larger than {settings.crawl_max_pdf_bytes // (1024 * 1024)} MB"
+        return await run_in_extraction_pool(process_pdf_content, page.body, url, settings.crawl_max_chars)
+    if page.kind == "text":
+        return process_text_content(page.text, url, settings.crawl_max_chars)
+    return f"Error processing content: unsupported content type {page.content_type or 'unknown'}"
+
+def normalize_url(url: str) -> str:
+    """Cache key of a URL: lower-case scheme and host, no default port or fragment, sorted query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class PageCache:
+    """
+    Fetched pages on disk, keyed by normalized URL: the response body, the
+    processed Markdown and the validators (ETag / Last-Modified). A page
+    younger than settings.http_cache_ttl_seconds is served without a
+    request; an older one is revalidated with a conditional GET, and a 304
+    reuses the stored Markdown. Entries are evicted least-recently-used
+    once the cache exceeds settings.http_cache_max_mb.
+    """
+    def __init__(self):
+        self._cache: Optional[DiskCache] = None
+        self.fresh_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _get_cache(self) -> Optional[DiskCache]:
+        if not settings.http_cache_enabled:
+            return None
+        if self._cache is None:
+            self._cache = DiskCache(settings.http_cache_path, settings.http_cache_max_mb * 1024 * 1024, name="PageCache")
+        return self._cache
+
+    def get(self, url: str) -> Optional[dict]:
+        cache = self._get_cache()
+        value = cache.get(normalize_url(url)) if cache is not None else None
+        return json.loads(zlib.decompress(value)) if value is not None else None
+
+    def put(self, url: str, entry: dict):
+        cache = self._get_cache()
+        if cache is not None:
+            cache.put(normalize_url(url), zlib.compress(json.dumps(entry).encode("utf-8")))
+
+    # SQLite I/O and (de)compression run on a worker thread, off the event loop
+    async def get_async(self, url: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get, url)
+
+    async def put_async(self, url: str, entry: dict):
+        await asyncio.to_thread(self.put, url, entry)
+
+    @staticmethod
+    def is_fresh(entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < settings.http_cache_ttl_seconds
+
+    @staticmethod
+    def validators(entry: dict) -> dict:
+        """Conditional request headers for a stored page."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def cacheable(response: httpx.Response) -> bool:
+        return "no-store" not in response.headers.get("Cache-Control", "").lower()
+
+    def clear(self):
+        cache = self._get_cache()
+        if cache is not None:
+            cache.clear()
+
+    def stats(self) -> dict:
+        cache = self._get_cache()
+        if cache is None:
+            return {"enabled": False}
+        return {
+            **cache.stats(),
+            "fresh_hits": self.fresh_hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "ttl_seconds": settings.http_cache_ttl_seconds,
         }
-        async with httpx.AsyncClient(verify=False, timeout=15.0, headers=headers) as client:
-            print(f"DEBUG: Fetching URL: {url}")
-            response = await client.get(url, follow_redirects=True)
-            print(f"DEBUG: URL Status: {response.status_code}")
-            response.raise_for_status()
-            
-            return process_html_content(response.text, url)
-            
+
+
+# Singleton instance
+page_cache = PageCache()
+
+class FetchError(Exception):
+    """A page could not be fetched or yielded no content (fetch_url_content with strict=True)."""
+
+
+def is_error_content(markdown: str) -> bool:
+    """True for the error text that fetching and extraction return in place of content."""
+    return (markdown.startswith(("Error fetching", "Error processing content"))
+            or markdown.endswith("\n\nError: Could not extract content"))
+
+
+async def fetch_url_content(url: str, strict: bool = False) -> str:
+    """
+    Fetches the URL and extracts main text content as clean Markdown.
+    Served from the page cache when fresh or confirmed unchanged by the server.
+    Errors are returned as text, or raised as FetchError when strict.
+    """
+    try:
+        cached = await page_cache.get_async(url)
+        if cached is not None and page_cache.is_fresh(cached):
+            page_cache.fresh_hits += 1
+            print(f"DEBUG: Page cache hit: {url}")
+            return cached["markdown"]
+
+        print(f"DEBUG: Fetching URL: {url}")
+        headers = page_cache.validators(cached) if cached is not None else {}
+        page = await crawler_client.fetch(url, headers=headers)
+        response = page.response
+        print(f"DEBUG: URL Status: {response.status_code} ({page.content_type or 'no type'}, {len(page.body)} bytes"
+              f"{', truncated' if page.truncated else ''})")
+        if response.status_code == 304 and cached is not None:
+            # Unchanged: keep the stored page for another TTL
+            page_cache.revalidated += 1
+            cached["fetched_at"] = time.time()
+            await page_cache.put_async(url, cached)
+            return cached["markdown"]
+        response.raise_for_status()
+        page_cache.misses += 1
+
+        markdown = await extract_page(page, url)
+        if page_cache.cacheable(response) and not is_error_content(markdown):
+            await page_cache.put_async(url, {
+                "url": str(response.url),
+                "kind": page.kind,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+                # PDF bytes are not kept; their text is in the Markdown
+                "body": page.text if page.kind != "pdf" else None,
+                "markdown": markdown,
+            })
     except Exception as e:
         print(f"Failed to fetch URL {url}: {e}")
+        if strict:
+            raise FetchError(f"Error fetching {url}: {str(e)}") from e
         return f"Error fetching {url}: {str(e)}"
 
+    if strict and is_error_content(markdown):
+        raise FetchError(markdown[:500])
+    return markdown
+
 def is_url(text: str) -> bool:
     return re.match(r'^https?://', text.strip()) is not None
@@ -0,0 +1,137 @@
+"""
+Disk Cache
+A persistent key/value cache in a single SQLite file with a size bound.
+Entries are evicted least-recently-used first once the stored bytes exceed
+the limit. Safe to share between threads; async code uses get_async /
+put_async, which run the SQLite calls on a worker thread.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# A hit refreshes the entry's access time only if it is older than this, so
+# frequent hits on the same key do not each write to the file
+ACCESS_RESOLUTION_SECONDS = 60.0
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, name: str = "DiskCache"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, accessed_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] > ACCESS_RESOLUTION_SECONDS:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self.get, key)
+
+    def put(self, key: str, value: bytes):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self.writes += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    async def put_async(self, key: str, value: bytes):
+        await asyncio.to_thread(self.put, key, value)
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit."""
+        target = int(self.max_bytes * 0.9)
+        self._conn.execute("BEGIN")
+        try:
+            cursor = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at")
+            victims = []
+            for key, size in cursor:
+                if self._total_bytes <= target:
+                    break
+                victims.append((key,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            raise
+        self.evictions += len(victims)
+        print(f"[{self.name}] Evicted {len(victims)} entries ({self._total_bytes / 1e6:.1f} MB kept)")
+
+    def delete(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("VACUUM")
+            self._total_bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'entries': len(self),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'writes': self.writes,
+            'evictions': self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,117 @@
+"""
+Micro-batching Embedding Scheduler
+Concurrent requests each need one query embedding. Instead of one encode()
+call per request, pending queries are collected for a short window (or until
+the batch is full), encoded with a single call and fanned back to the callers.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .settings import settings
+from .embedding_service import run_in_embedding_pool
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 window_ms: float = 5.0, max_batch_size: int = 32):
+        self.encode_fn = encode_fn
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: deque = deque()  # (text, future)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight = 0
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.last_batch_size = 0
+        self.largest_batch_size = 0
+        self.total_encode_ms = 0.0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Queue a text and wait for its embedding."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (e.g. after a reload): start clean
+            self._loop = loop
+            self._pending.clear()
+            self._timer = None
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000.0, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+            self._in_flight += len(batch)
+            self._loop.create_task(self._run(batch))
+
+    async def _run(self, batch: list):
+        # Identical queries in the same window are encoded once
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        start = time.perf_counter()
+        try:
+            vectors = await run_in_embedding_pool(self.encode_fn, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= len(batch)
+
+        self.batches += 1
+        self.items += len(batch)
+        self.last_batch_size = len(batch)
+        self.largest_batch_size = max(self.largest_batch_size, len(batch))
+        self.total_encode_ms += (time.perf_counter() - start) * 1000
+
+        by_text = {text: vectors[i] for i, text in enumerate(texts)}
+        for text, future in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def metrics(self) -> dict:
+        return {
+            'window_ms': self.window_ms,
+            'max_batch_size': self.max_batch_size,
+            'queue_depth': len(self._pending),
+            'in_flight': self._in_flight,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+            'last_batch_size': self.last_batch_size,
+            'largest_batch_size': self.largest_batch_size,
+            'avg_encode_ms': self.total_encode_ms / self.batches if self.batches else 0.0,
+        }
+
+
+_query_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_query_batcher() -> EmbeddingBatcher:
+    """Shared batcher for query embeddings (all stores use the same model)."""
+    global _query_batcher
+    if _query_batcher is None:
+        from .vector_store import encode_texts
+        _query_batcher = EmbeddingBatcher(
+            encode_texts,
+            window_ms=settings.embedding_batch_window_ms,
+            max_batch_size=settings.embedding_batch_max_size,
+        )
+    return _query_batcher
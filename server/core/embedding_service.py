@@ -0,0 +1,40 @@
+"""
+Embedding Service
+Runs SentenceTransformer inference and FAISS work on a dedicated thread pool,
+so async request handlers await it instead of blocking the event loop.
+
+A thread pool (not a process pool) is used because the model and the index
+live in this process, and torch/FAISS release the GIL while they compute.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .settings import settings
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_embedding_executor() -> ThreadPoolExecutor:
+    """Lazily create the shared embedding pool."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.embedding_workers),
+            thread_name_prefix="embedding",
+        )
+    return _executor
+
+
+async def run_in_embedding_pool(fn, *args, **kwargs):
+    """Await a blocking embedding/index call on the embedding pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_embedding_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_embedding_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,254 @@
+"""
+Append-only Embedding Store
+Keeps embeddings in memory-mapped float32 files instead of a compressed npz,
+so opening is instant, appends are O(1) and FAISS can read rows in place.
+
+Layout of a store directory (one generation of files at a time):
+    store.json              - {"dim": ..., "generation": ...}
+    vectors.<gen>.f32       - row-major float32 matrix, one row per write
+    ids.<gen>.i64           - node ID of every row
+    hashes.<gen>.sha1       - 20-byte content hash of every row
+    tombstones.<gen>.i64    - rows that were overwritten or deleted
+Compaction copies the live rows into generation+1 and then swaps store.json,
+so a crash at any point leaves one complete generation on disk.
+"""
+import os
+import json
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_BYTES = 20  # SHA-1 digest size
+
+
+class EmbeddingStore:
+    def __init__(self, directory, compact_ratio: float = 0.3, compact_min_rows: int = 256):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.header_path = self.directory / "store.json"
+        # Compact once this fraction of rows is dead (and there are enough rows to bother)
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+
+        self._lock = threading.RLock()
+        self._compact_thread: Optional[threading.Thread] = None
+        self._open()
+
+    # ---------- File handling ----------
+
+    def _path(self, name: str, generation: int = None) -> Path:
+        gen = self.generation if generation is None else generation
+        stem, ext = name.split(".")
+        return self.directory / f"{stem}.{gen}.{ext}"
+
+    def _open(self):
+        """Map the current generation and rebuild the in-memory ID lookup."""
+        with self._lock:
+            self.dim: Optional[int] = None
+            self.generation = 0
+            if self.header_path.exists():
+                with open(self.header_path, 'r', encoding='utf-8') as f:
+                    header = json.load(f)
+                self.dim = header.get('dim')
+                self.generation = header.get('generation', 0)
+
+            self._rows = 0
+            self._vectors = None
+            self._ids = None
+            self._hashes = None
+            self._row_of: Dict[int, int] = {}
+            self._dead: set = set()
+
+            if self.dim is None:
+                return
+
+            # A torn append may leave the files with different row counts; trim to the shortest.
+            vectors_path = self._path("vectors.f32")
+            ids_path = self._path("ids.i64")
+            hashes_path = self._path("hashes.sha1")
+            sizes = [
+                vectors_path.stat().st_size // (4 * self.dim) if vectors_path.exists() else 0,
+                ids_path.stat().st_size // 8 if ids_path.exists() else 0,
+                hashes_path.stat().st_size // HASH_BYTES if hashes_path.exists() else 0,
+            ]
+            self._rows = min(sizes)
+            for path, row_bytes in ((vectors_path, 4 * self.dim), (ids_path, 8), (hashes_path, HASH_BYTES)):
+                with open(path, 'ab') as f:
+                    f.truncate(self._rows * row_bytes)
+
+            tombstones_path = self._path("tombstones.i64")
+            if tombstones_path.exists():
+                self._dead = set(np.fromfile(str(tombstones_path), dtype='int64').tolist())
+
+            self._remap()
+            for row, nid in enumerate(self._ids[:self._rows].tolist()):
+                if row not in self._dead:
+                    self._row_of[nid] = row
+
+    def reload(self):
+        """Re-read the store from disk."""
+        self._open()
+
+    def _remap(self):
+        """(Re)create the memory maps after the files grew."""
+        if self._rows == 0:
+            self._vectors = np.zeros((0, self.dim), dtype='float32')
+            self._ids = np.zeros(0, dtype='int64')
+            self._hashes = np.zeros((0, HASH_BYTES), dtype='uint8')
+            return
+        self._vectors = np.memmap(str(self._path("vectors.f32")), dtype='float32', mode='r', shape=(self._rows, self.dim))
+        self._ids = np.memmap(str(self._path("ids.i64")), dtype='int64', mode='r', shape=(self._rows,))
+        self._hashes = np.memmap(str(self._path("hashes.sha1")), dtype='uint8', mode='r', shape=(self._rows, HASH_BYTES))
+
+    def _write_header(self, generation: int):
+        tmp_path = self.header_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'dim': self.dim, 'generation': generation}, f)
+        os.replace(tmp_path, self.header_path)
+
+    # ---------- Reads ----------
+    # Reads take the lock too: compact() replaces the row map and the maps on its own thread
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._row_of)
+
+    def __contains__(self, node_id: int) -> bool:
+        with self._lock:
+            return node_id in self._row_of
+
+    def version_token(self) -> str:
+        """Changes whenever rows are appended, deleted or compacted."""
+        with self._lock:
+            return f"{self.generation}:{self._rows}:{len(self._dead)}"
+
+    def ids(self) -> List[int]:
+        with self._lock:
+            return list(self._row_of.keys())
+
+    def get(self, node_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._row_of.get(node_id)
+            return None if row is None else np.array(self._vectors[row])
+
+    def get_hash(self, node_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._row_of.get(node_id)
+            return None if row is None else self._hashes[row].tobytes().hex()
+
+    def get_many(self, node_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Gather vectors for the given IDs (missing IDs are skipped). Returns (vectors, ids)."""
+        with self._lock:
+            pairs = [(nid, self._row_of[nid]) for nid in node_ids if nid in self._row_of]
+            if not pairs:
+                return np.zeros((0, self.dim or 0), dtype='float32'), np.zeros(0, dtype='int64')
+            rows = np.array([row for _, row in pairs], dtype='int64')
+            return np.asarray(self._vectors[rows]), np.array([nid for nid, _ in pairs], dtype='int64')
+
+    def live_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        All live (vectors, ids). When the store has no dead rows this returns
+        the memory-mapped buffers themselves, so callers such as FAISS read
+        the file pages directly instead of a Python-side copy.
+        """
+        with self._lock:
+            if self._rows == 0:
+                return np.zeros((0, self.dim or 0), dtype='float32'), np.zeros(0, dtype='int64')
+            if not self._dead and len(self._row_of) == self._rows:
+                return self._vectors, self._ids
+            rows = np.array(sorted(self._row_of.values()), dtype='int64')
+            return np.asarray(self._vectors[rows]), np.asarray(self._ids[rows])
+
+    # ---------- Writes ----------
+
+    def put_many(self, node_ids: List[int], vectors: np.ndarray, hashes: List[str]):
+        """Append rows; earlier rows for the same IDs become tombstones."""
+        if len(node_ids) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype='float32').reshape(len(node_ids), -1)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._write_header(self.generation)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+
+            superseded = [self._row_of[nid] for nid in node_ids if nid in self._row_of]
+            digests = b"".join(bytes.fromhex(h) for h in hashes)
+
+            with open(self._path("vectors.f32"), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self._path("hashes.sha1"), 'ab') as f:
+                f.write(digests)
+            # IDs last: a row only counts once all three files contain it
+            with open(self._path("ids.i64"), 'ab') as f:
+                f.write(np.array(node_ids, dtype='int64').tobytes())
+
+            first_row = self._rows
+            self._rows += len(node_ids)
+            for offset, nid in enumerate(node_ids):
+                self._row_of[nid] = first_row + offset
+            self._add_tombstones(superseded)
+            self._remap()
+
+        self.maybe_compact()
+
+    def delete_many(self, node_ids: Iterable[int]):
+        with self._lock:
+            rows = [self._row_of.pop(nid) for nid in node_ids if nid in self._row_of]
+            self._add_tombstones(rows)
+        self.maybe_compact()
+
+    def _add_tombstones(self, rows: List[int]):
+        # Rows superseded inside the same batch are never in _row_of, so dedupe against _dead
+        rows = [row for row in rows if row not in self._dead]
+        if not rows:
+            return
+        with open(self._path("tombstones.i64"), 'ab') as f:
+            f.write(np.array(rows, dtype='int64').tobytes())
+        self._dead.update(rows)
+
+    def clear(self):
+        with self._lock:
+            for path in self.directory.glob("*"):
+                if path.is_file():
+                    os.remove(path)
+            self._open()
+
+    # ---------- Compaction ----------
+
+    def needs_compaction(self) -> bool:
+        return self._rows >= self.compact_min_rows and len(self._dead) > self._rows * self.compact_ratio
+
+    def maybe_compact(self):
+        """Start a background compaction if enough rows are dead."""
+        if not self.needs_compaction():
+            return
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+        self._compact_thread = threading.Thread(target=self.compact, name="embedding-store-compact", daemon=True)
+        self._compact_thread.start()
+
+    def compact(self):
+        """Rewrite the live rows into a new generation and drop the old files."""
+        with self._lock:
+            if not self._dead:
+                return
+            old_generation = self.generation
+            new_generation = old_generation + 1
+            rows = np.array(sorted(self._row_of.values()), dtype='int64')
+            print(f"[EmbeddingStore] Compacting {self.directory}: {len(rows)} live / {self._rows} rows")
+
+            self._vectors[rows].tofile(str(self._path("vectors.f32", new_generation)))
+            self._hashes[rows].tofile(str(self._path("hashes.sha1", new_generation)))
+            self._ids[rows].tofile(str(self._path("ids.i64", new_generation)))
+            self._write_header(new_generation)
+
+            # Release the old maps before deleting their files (required on Windows)
+            self._vectors = self._ids = self._hashes = None
+            for name in ("vectors.f32", "ids.i64", "hashes.sha1", "tombstones.i64"):
+                path = self._path(name, old_generation)
+                if path.exists():
+                    os.remove(path)
+            self._open()
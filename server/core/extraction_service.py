@@ -0,0 +1,57 @@
+"""
+Extraction Service
+Runs HTML -> Markdown extraction (lxml, Readability, html2text) on a
+process pool, so converting a large page does not block the event loop
+and several pages convert in parallel on separate cores.
+
+A process pool (not a thread pool as in the embedding service) is used
+because this work is pure-Python parsing that holds the GIL. Workers are
+spawned rather than forked, so they do not inherit the server's threads
+or the loaded embedding model.
+"""
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from .settings import settings
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_extraction_executor() -> Optional[ProcessPoolExecutor]:
+    """Lazily create the shared extraction pool; None when html_extract_workers is 0."""
+    global _executor
+    if _executor is None and settings.html_extract_workers > 0:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.html_extract_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+async def run_in_extraction_pool(fn, *args, **kwargs):
+    """Await a CPU-bound extraction call (fn must be a picklable module-level function)."""
+    global _executor
+    call = functools.partial(fn, *args, **kwargs)
+    executor = get_extraction_executor()
+    if executor is None:
+        return await asyncio.to_thread(call)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+    except (BrokenProcessPool, RuntimeError) as e:
+        # A worker died (e.g. killed for memory) or could not be started: run
+        # this call here and start a fresh pool next time
+        print(f"[ExtractionService] Worker pool unavailable ({type(e).__name__}), running in a thread")
+        _executor = None
+        executor.shutdown(wait=False)
+        return await asyncio.to_thread(call)
+
+
+def shutdown_extraction_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,243 @@
+"""
+Index Engine for the Vector Store
+Wraps the FAISS index behind one interface so a store can use an exact flat
+index, an HNSW graph or a trained IVF-PQ index, chosen by collection size.
+
+All engines address vectors by node ID and use inner product on normalized
+embeddings (cosine similarity).
+"""
+import numpy as np
+from typing import Dict, Tuple
+
+INDEX_FLAT = "flat"
+INDEX_HNSW = "hnsw"
+INDEX_IVFPQ = "ivfpq"
+INDEX_MODES = ("auto", INDEX_FLAT, INDEX_HNSW, INDEX_IVFPQ)
+
+# 8-bit PQ codebooks have 256 centroids each; FAISS wants ~39 points per centroid
+IVFPQ_MIN_TRAIN = 256 * 39
+
+# HNSW stores vectors under labels: the node ID in the low bits and, above
+# them, how many times the node was re-added, so an updated vector gets a
+# fresh label and the old one can be tombstoned
+LABEL_BITS = 40
+LABEL_MASK = (1 << LABEL_BITS) - 1
+
+
+def _get_faiss():
+    import faiss
+    return faiss
+
+
+def choose_index_kind(num_vectors: int, mode: str = "auto",
+                      hnsw_threshold: int = 10000, ivfpq_threshold: int = 100000) -> str:
+    """
+    Resolve an index mode to a concrete engine kind for a collection size.
+    IVF-PQ falls back to flat until there are enough vectors to train it.
+    """
+    if mode == "auto":
+        if num_vectors >= max(ivfpq_threshold, IVFPQ_MIN_TRAIN):
+            return INDEX_IVFPQ
+        if num_vectors >= hnsw_threshold:
+            return INDEX_HNSW
+        return INDEX_FLAT
+    if mode == INDEX_IVFPQ and num_vectors < IVFPQ_MIN_TRAIN:
+        return INDEX_FLAT
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode: {mode}")
+    return mode
+
+
+def _ivf_nlist(num_vectors: int) -> int:
+    """Number of IVF cells: ~4*sqrt(N), bounded so every cell gets enough training points."""
+    nlist = int(4 * np.sqrt(num_vectors))
+    return max(16, min(nlist, num_vectors // 39, 65536))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest common sub-quantizer count that divides the dimension (>= 4 dims per code)."""
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if dimension % m == 0 and dimension // m >= 4:
+            return m
+    return 1
+
+
+class IndexEngine:
+    def __init__(self, kind: str, dimension: int, hnsw_m: int = 32,
+                 hnsw_ef_search: int = 64, ivf_nprobe: int = 16):
+        self.kind = kind
+        self.dimension = dimension
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_search = hnsw_ef_search
+        self.ivf_nprobe = ivf_nprobe
+        # HNSW cannot delete vectors; removed labels are filtered at query time until a rebuild
+        self.deleted: set = set()
+        # HNSW: current label of every node ID added since the last build
+        self._label_of: Dict[int, int] = {}
+        # Vector count the IVF centroids were trained on, to detect drift
+        self.trained_size = 0
+        self.index = None
+
+    # ---------- Construction ----------
+
+    def _create(self, num_vectors: int):
+        faiss = _get_faiss()
+        if self.kind == INDEX_FLAT:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+        elif self.kind == INDEX_HNSW:
+            self.index = faiss.index_factory(self.dimension, f"IDMap2,HNSW{self.hnsw_m},Flat", faiss.METRIC_INNER_PRODUCT)
+        elif self.kind == INDEX_IVFPQ:
+            nlist = _ivf_nlist(num_vectors)
+            m = _pq_subquantizers(self.dimension)
+            self.index = faiss.index_factory(self.dimension, f"IVF{nlist},PQ{m}", faiss.METRIC_INNER_PRODUCT)
+        else:
+            raise ValueError(f"Unknown index kind: {self.kind}")
+        self._apply_search_params()
+
+    def _apply_search_params(self):
+        faiss = _get_faiss()
+        if self.kind == INDEX_HNSW:
+            faiss.downcast_index(self.index.index).hnsw.efSearch = self.hnsw_ef_search
+        elif self.kind == INDEX_IVFPQ:
+            faiss.extract_index_ivf(self.index).nprobe = self.ivf_nprobe
+
+    def build(self, vectors: np.ndarray, ids: np.ndarray):
+        """Create the index from scratch, training it first if the kind requires it."""
+        self._create(len(ids))
+        self.deleted = set()
+        self._label_of = {int(nid): int(nid) for nid in ids} if self.kind == INDEX_HNSW else {}
+        if self.kind == INDEX_IVFPQ:
+            print(f"[IndexEngine] Training IVF-PQ on {len(ids)} vectors...")
+            self.index.train(vectors)
+            self.trained_size = len(ids)
+        self.index.add_with_ids(vectors, ids)
+
+    # ---------- Mutation ----------
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        if self.kind == INDEX_HNSW:
+            ids = np.array([self._new_label(int(nid)) for nid in ids], dtype='int64')
+        self.index.add_with_ids(vectors, ids)
+
+    def _new_label(self, nid: int) -> int:
+        """Next label for a node; the node's previous vector, if any, is tombstoned."""
+        old = self._label_of.get(nid)
+        if old is None:
+            label = nid
+        else:
+            self.deleted.add(old)
+            label = (((old >> LABEL_BITS) + 1) << LABEL_BITS) | nid
+        self._label_of[nid] = label
+        return label
+
+    def remove(self, ids: np.ndarray):
+        if self.kind == INDEX_HNSW:
+            self.deleted.update(self._label_of[int(nid)] for nid in ids if int(nid) in self._label_of)
+        else:
+            self.index.remove_ids(np.asarray(ids, dtype='int64'))
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live vectors."""
+        return self.index.ntotal - len(self.deleted)
+
+    def needs_rebuild(self) -> bool:
+        """True when tombstones or centroid drift have degraded the index enough to rebuild."""
+        if self.kind == INDEX_HNSW:
+            return len(self.deleted) > 0.2 * max(self.index.ntotal, 1)
+        if self.kind == INDEX_IVFPQ:
+            return self.ntotal > 4 * max(self.trained_size, 1)
+        return False
+
+    # ---------- Query ----------
+
+    def search(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (scores, ids) like faiss, with removed IDs already filtered out (-1 padded)."""
+        if not self.deleted:
+            scores, ids = self.index.search(queries, min(top_k, self.index.ntotal))
+            return scores, self._node_ids(ids)
+
+        fetch_k = min(top_k + len(self.deleted), self.index.ntotal)
+        scores, labels = self.index.search(queries, fetch_k)
+        out_scores = np.full((len(queries), top_k), -np.inf, dtype='float32')
+        out_ids = np.full((len(queries), top_k), -1, dtype='int64')
+        for row in range(len(queries)):
+            keep = [i for i, label in enumerate(labels[row].tolist()) if label >= 0 and label not in self.deleted]
+            keep = keep[:top_k]
+            out_scores[row, :len(keep)] = scores[row, keep]
+            out_ids[row, :len(keep)] = self._node_ids(labels[row, keep])
+        return out_scores, out_ids
+
+    def _node_ids(self, labels: np.ndarray) -> np.ndarray:
+        if self.kind != INDEX_HNSW:
+            return labels
+        return np.where(labels >= 0, labels & LABEL_MASK, labels)
+
+    # ---------- Persistence ----------
+
+    def state(self) -> dict:
+        return {
+            'kind': self.kind,
+            'dimension': self.dimension,
+            'deleted': sorted(self.deleted),
+            'trained_size': self.trained_size,
+        }
+
+    def save(self, index_path: str):
+        faiss = _get_faiss()
+        faiss.write_index(self.index, index_path)
+
+    @classmethod
+    def load(cls, index_path: str, state: dict, **params) -> "IndexEngine":
+        faiss = _get_faiss()
+        engine = cls(state['kind'], state['dimension'], **params)
+        engine.index = faiss.read_index(index_path)
+        engine.deleted = set(state.get('deleted', []))
+        engine.trained_size = state.get('trained_size', 0)
+        engine._apply_search_params()
+        if engine.kind == INDEX_HNSW:
+            # The newest label of each node is its current one
+            for label in sorted(faiss.vector_to_array(engine.index.id_map).tolist()):
+                engine._label_of[label & LABEL_MASK] = label
+        return engine
+
+
+def recall_at_k(engine: IndexEngine, vectors: np.ndarray, ids: np.ndarray,
+                k: int = 10, num_queries: int = 100, seed: int = 0) -> dict:
+    """
+    Measure engine recall@k against an exact flat index over the same vectors.
+    Queries are sampled from the stored vectors themselves.
+    """
+    import time
+    faiss = _get_faiss()
+    n = len(ids)
+    if n == 0:
+        return {'kind': engine.kind, 'k': k, 'queries': 0, 'recall': None}
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n, size=min(num_queries, n), replace=False)
+    queries = np.ascontiguousarray(vectors[np.sort(sample)], dtype='float32')
+    k = min(k, n)
+
+    exact = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+    exact.add_with_ids(vectors, ids)
+
+    start = time.perf_counter()
+    _, truth = exact.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    _, found = engine.search(queries, k)
+    engine_ms = (time.perf_counter() - start) * 1000
+
+    hits = sum(len(set(t[t >= 0].tolist()) & set(f[f >= 0].tolist())) for t, f in zip(truth, found))
+    total = sum(int((t >= 0).sum()) for t in truth)
+    return {
+        'kind': engine.kind,
+        'k': k,
+        'queries': len(queries),
+        'ntotal': engine.ntotal,
+        'recall': hits / total if total else None,
+        'flat_ms_per_query': flat_ms / len(queries),
+        'engine_ms_per_query': engine_ms / len(queries),
+    }
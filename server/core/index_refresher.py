@@ -0,0 +1,165 @@
+"""
+Index Refresher
+Write-behind indexing: every committed change to a tracked table (ORM
+writes as well as Core statements run through a Session) schedules a
+background sync of the indexes registered for that table. Changes are
+collected for settings.index_refresh_debounce_seconds after the first one
+and then applied together, so embeddings are computed in batches off the
+request path and queries find a warm, current index.
+
+Requests still call IndexSync.sync() before searching; once the refresher
+has caught up that is a no-op.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+
+from ..database.database import engine
+from ..database.models import KnowledgeNode, RawInput
+from .settings import settings
+
+_TRACKED_TABLES = {KnowledgeNode.__tablename__, RawInput.__tablename__}
+_INFO_KEY = "index_refresh_tables"
+
+
+class IndexRefresher:
+    def __init__(self, debounce_seconds: float = 1.0):
+        self.debounce_seconds = debounce_seconds
+        # table name -> {target name: callable returning the IndexSync to run}
+        self._targets: Dict[str, Dict[str, Callable[[], object]]] = {}
+        self._pending: Set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.errors = 0
+        self.last_run_ms = 0.0
+        self.last_error: Optional[str] = None
+
+    def register(self, table_name: str, name: str, get_index_sync: Callable[[], object]):
+        """Keep an IndexSync (returned lazily by get_index_sync) current for a table."""
+        self._targets.setdefault(table_name, {})[name] = get_index_sync
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        # Warm the indexes once at startup
+        self._pending.update(self._targets)
+        self._wakeup.set()
+        print(f"[IndexRefresher] Started (debounce {self.debounce_seconds}s)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._loop = None
+
+    def notify(self, tables: Set[str]):
+        """Schedule a sync for these tables; safe to call from any thread. No-op when not running."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._mark, set(tables))
+
+    def _mark(self, tables: Set[str]):
+        self._pending.update(tables)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Collect the changes that follow closely and apply them as one batch
+            await asyncio.sleep(self.debounce_seconds)
+            self._wakeup.clear()
+            tables, self._pending = self._pending, set()
+            try:
+                await self._refresh(tables)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[IndexRefresher] Refresh failed: {self.last_error}")
+
+    async def _refresh(self, tables: Set[str]):
+        start = time.perf_counter()
+        use_rag = settings.retrieval_mode == "rag"
+        with Session(engine) as session:
+            for table in sorted(tables):
+                for get_index_sync in self._targets.get(table, {}).values():
+                    index_sync = get_index_sync()
+                    try:
+                        await index_sync.sync(session, with_vectors=use_rag)
+                    except Exception as e:
+                        if not use_rag:
+                            raise
+                        # Same fallback as the chat endpoints: keep the keyword index current
+                        print(f"[IndexRefresher] Vector sync of {table} failed ({e}), syncing keyword index only")
+                        await index_sync.sync(session, with_vectors=False)
+        self.runs += 1
+        self.last_run_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "debounce_seconds": self.debounce_seconds,
+            "pending": sorted(self._pending),
+            "runs": self.runs,
+            "last_run_ms": self.last_run_ms,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+# Singleton instance
+index_refresher = IndexRefresher(debounce_seconds=settings.index_refresh_debounce_seconds)
+
+
+# ---------- Change capture ----------
+# Tables touched by a session are remembered until the transaction ends and
+# reported only on commit, so the sync never runs ahead of the data.
+
+def _remember(session, tables):
+    if tables:
+        session.info.setdefault(_INFO_KEY, set()).update(tables)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _collect_flushed(session, flush_context):
+    _remember(session, {
+        obj.__tablename__
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if getattr(obj, "__tablename__", None) in _TRACKED_TABLES
+    })
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _collect_statement(orm_execute_state):
+    # Core and bulk statements (e.g. NodeWriter's executemany) bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and table.name in _TRACKED_TABLES:
+            _remember(orm_execute_state.session, {table.name})
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _report_committed(session):
+    tables = session.info.pop(_INFO_KEY, None)
+    if tables:
+        index_refresher.notify(tables)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_INFO_KEY, None)
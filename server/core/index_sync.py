@@ -0,0 +1,224 @@
+"""
+Index Sync
+Keeps a VectorStore (and its keyword index) in step with one table without
+loading the table per request. Each sync reads only rows changed since a
+high-water mark on updated_at/id plus new entries in the deletion log.
+
+The first sync after startup reconciles against the whole table, paged, to
+pick up anything written while the server was down.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlmodel import Session, select, or_, func
+
+from ..database.models import DeletionLog, KnowledgeNode
+from .passages import MAX_PASSAGES_PER_ITEM, passage_id, split_passages
+from .vector_store import vector_store
+
+# Rows whose updated_at falls within this lag of the mark are checked again,
+# so a write that committed slightly out of order is never skipped. Only
+# (id, updated_at) is read for them; rows already applied at that version
+# are skipped, so a sync with no changes loads and indexes nothing.
+SYNC_LAG = timedelta(seconds=5)
+SCAN_PAGE_SIZE = 500
+
+
+@dataclass
+class _Cursor:
+    initialized: bool = False
+    high_water: Optional[datetime] = None
+    max_id: int = 0
+    last_deletion_id: int = 0
+    # id -> updated_at of the rows applied within the lag window
+    applied: Dict[int, datetime] = field(default_factory=dict)
+
+
+class IndexSync:
+    def __init__(self, store, model, to_doc: Callable[[object], dict]):
+        """
+        store: VectorStore to keep updated
+        model: table model with id and updated_at columns (KnowledgeNode / RawInput)
+        to_doc: converts a row to a {'id', 'label', 'content'} dict
+        """
+        self.store = store
+        self.model = model
+        self.to_doc = to_doc
+        self.table_name = model.__tablename__
+        # The keyword-only (basic mode) and vector (RAG mode) views advance separately
+        self._cursors = {False: _Cursor(), True: _Cursor()}
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def reset(self):
+        """Forget sync state, e.g. after the store was cleared."""
+        self._cursors = {False: _Cursor(), True: _Cursor()}
+
+    # ---------- Row <-> indexed document mapping ----------
+    # The default is one indexed document per row, keyed by the row id.
+    # Subclasses that index several documents per row override both hooks.
+
+    def docs_for_row(self, row) -> List[dict]:
+        return [self.to_doc(row)]
+
+    def indexed_ids_for_row(self, row_id: int) -> List[int]:
+        """IDs currently in the index that belong to a row."""
+        return [row_id]
+
+    def _advance(self, cursor: _Cursor, rows: list):
+        for row in rows:
+            if row.updated_at is not None and (cursor.high_water is None or row.updated_at > cursor.high_water):
+                cursor.high_water = row.updated_at
+            cursor.max_id = max(cursor.max_id, row.id)
+        if cursor.high_water is None:
+            return
+        window = cursor.high_water - SYNC_LAG
+        for row in rows:
+            if row.updated_at is not None and row.updated_at >= window:
+                cursor.applied[row.id] = row.updated_at
+        cursor.applied = {row_id: at for row_id, at in cursor.applied.items() if at >= window}
+
+    async def _apply(self, docs: List[dict], deleted_ids: List[int], with_vectors: bool):
+        store = self.store
+        if with_vectors:
+            if deleted_ids:
+                await store.remove_nodes_async(deleted_ids)
+            if docs:
+                await store.upsert_nodes_async(docs)
+        else:
+            for row_id in deleted_ids:
+                store.text_index.remove(row_id)
+            for doc in docs:
+                store.text_index.upsert(doc['id'], doc['label'], doc['content'])
+
+    async def _full_scan(self, session: Session, cursor: _Cursor, with_vectors: bool):
+        """Page through the table by id, applying each page, then drop IDs that no longer exist."""
+        seen = set()
+        last_id = 0
+        while True:
+            rows = session.exec(
+                select(self.model).where(self.model.id > last_id).order_by(self.model.id).limit(SCAN_PAGE_SIZE)
+            ).all()
+            if not rows:
+                break
+            docs = [doc for row in rows for doc in self.docs_for_row(row)]
+            await self._apply(docs, [], with_vectors)
+            seen.update(doc['id'] for doc in docs)
+            self._advance(cursor, rows)
+            last_id = rows[-1].id
+
+        indexed = self.store.embeddings.ids() if with_vectors else list(self.store.text_index.doc_ids())
+        missing = [nid for nid in indexed if nid not in seen]
+        await self._apply([], missing, with_vectors)
+        print(f"[IndexSync] Initial scan of {self.table_name}: {len(seen)} documents, {len(missing)} stale entries dropped")
+
+    def _changed_rows(self, session: Session, cursor: _Cursor) -> list:
+        condition = self.model.id > cursor.max_id
+        if cursor.high_water is not None:
+            condition = or_(condition, self.model.updated_at >= cursor.high_water - SYNC_LAG)
+        versions = session.exec(select(self.model.id, self.model.updated_at).where(condition)).all()
+        changed = [row_id for row_id, updated_at in versions
+                   if row_id > cursor.max_id or cursor.applied.get(row_id) != updated_at]
+        if not changed:
+            return []
+        return session.exec(select(self.model).where(self.model.id.in_(changed))).all()
+
+    def _new_deletions(self, session: Session, cursor: _Cursor) -> List[DeletionLog]:
+        return session.exec(
+            select(DeletionLog)
+            .where(DeletionLog.table_name == self.table_name, DeletionLog.id > cursor.last_deletion_id)
+            .order_by(DeletionLog.id)
+        ).all()
+
+    def _sync_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def sync(self, session: Session, with_vectors: bool = True):
+        """
+        Apply pending changes. with_vectors=False only updates the keyword index
+        (basic retrieval mode, no embedding model). The cursor only advances
+        after the store accepted the changes. Concurrent calls (a request and
+        the background refresher) run one after the other.
+        """
+        async with self._sync_lock():
+            await self._sync(session, with_vectors)
+
+    async def _sync(self, session: Session, with_vectors: bool):
+        cursor = self._cursors[with_vectors]
+
+        if not cursor.initialized:
+            pending = _Cursor(initialized=True)
+            pending.last_deletion_id = session.exec(select(func.max(DeletionLog.id))).one() or 0
+            await self._full_scan(session, pending, with_vectors)
+            self._cursors[with_vectors] = pending
+            return
+
+        rows = self._changed_rows(session, cursor)
+        deletions = self._new_deletions(session, cursor)
+        if not rows and not deletions:
+            return
+
+        docs = [doc for row in rows for doc in self.docs_for_row(row)]
+        new_ids = {doc['id'] for doc in docs}
+        # Changed rows may have shrunk; deleted rows lose everything. A row that
+        # exists now wins over an older deletion of the same id.
+        stale_rows = {row.id for row in rows} | {entry.row_id for entry in deletions}
+        deleted_ids = [
+            doc_id
+            for row_id in stale_rows
+            for doc_id in self.indexed_ids_for_row(row_id)
+            if doc_id not in new_ids
+        ]
+        await self._apply(docs, deleted_ids, with_vectors)
+
+        self._advance(cursor, rows)
+        if deletions:
+            cursor.last_deletion_id = deletions[-1].id
+        print(f"[IndexSync] {self.table_name}: {len(docs)} changed, {len(deleted_ids)} deleted")
+
+
+def node_to_doc(node) -> dict:
+    return {"id": node.id, "label": node.label, "content": node.content}
+
+
+def raw_input_to_doc(item) -> dict:
+    return {"id": item.id, "label": item.title or "无标题", "content": item.fetched_content or item.original_input}
+
+
+class PassageIndexSync(IndexSync):
+    """IndexSync that indexes each row as its overlapping passages."""
+
+    def __init__(self, store, model, to_doc, size: int = 400, overlap: int = 80):
+        super().__init__(store, model, to_doc)
+        self.size = size
+        self.overlap = overlap
+
+    def docs_for_row(self, row) -> List[dict]:
+        doc = self.to_doc(row)
+        text = doc['content'] or ""
+        return [
+            {"id": passage_id(row.id, n), "label": doc['label'], "content": text[start:end]}
+            for n, (start, end) in enumerate(split_passages(text, self.size, self.overlap))
+        ]
+
+    def indexed_ids_for_row(self, row_id: int) -> List[int]:
+        # Passage numbers are contiguous from 0, so walk until the first gap.
+        # The keyword and vector views may lag each other, so check both.
+        ids = []
+        store = self.store
+        while len(ids) < MAX_PASSAGES_PER_ITEM:
+            pid = passage_id(row_id, len(ids))
+            if pid not in store.text_index and pid not in store.embeddings:
+                break
+            ids.append(pid)
+        return ids
+
+
+# Singleton for the knowledge-node store
+node_index_sync = IndexSync(vector_store, KnowledgeNode, node_to_doc)
@@ -0,0 +1,197 @@
+"""
+Bulk Ingest
+Imports a list of URLs / text items as a pipeline: a bounded pool of workers
+fetches, summarizes and extracts (fetches limited per host, LLM calls by the
+global cap in ai_processor), while one writer saves finished items in
+batched transactions. Per-item outcomes are yielded as they are committed,
+followed by an aggregate throughput report.
+"""
+import asyncio
+import time
+from typing import AsyncGenerator, List
+
+from sqlmodel import Session
+
+from ..database.database import engine
+from .ai_processor import track_usage
+from .ingest_pipeline import prepare_ingest, save_ingest
+from .settings import settings
+
+_DONE = object()
+
+
+class BatchIngest:
+    def __init__(self, items: List[str], concurrency: int = 8, commit_size: int = 20, use_cache: bool = True):
+        self.items = items
+        self.use_cache = use_cache
+        self.concurrency = max(1, concurrency)
+        self.commit_size = max(1, commit_size)
+
+        self._work: asyncio.Queue = asyncio.Queue()
+        self._prepared: asyncio.Queue = asyncio.Queue()
+        self._events: asyncio.Queue = asyncio.Queue()
+
+        self.succeeded = 0
+        self.failed = 0
+        self.transactions = 0
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    # ---------- Stages ----------
+
+    async def _prepare_worker(self):
+        while True:
+            try:
+                index = self._work.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            text = self.items[index]
+            start = time.perf_counter()
+            with track_usage() as usage:
+                try:
+                    with Session(engine) as session:
+                        prepared = await prepare_ingest(session, text, use_cache=self.use_cache)
+                except Exception as e:
+                    self._add_usage(usage)
+                    await self._fail(index, text, e, start)
+                    continue
+            self._add_usage(usage)
+            await self._prepared.put((index, prepared, usage, start))
+
+    async def _writer(self):
+        finished = False
+        while not finished:
+            batch = []
+            entry = await self._prepared.get()
+            if entry is _DONE:
+                return
+            batch.append(entry)
+            # Take whatever else is already waiting, up to the transaction size
+            while len(batch) < self.commit_size and not self._prepared.empty():
+                entry = self._prepared.get_nowait()
+                if entry is _DONE:
+                    finished = True
+                    break
+                batch.append(entry)
+            await self._write(batch)
+
+    async def _write(self, batch: list):
+        with Session(engine) as session:
+            try:
+                results = [save_ingest(session, prepared, commit=False) for _, prepared, _, _ in batch]
+                session.commit()
+                self.transactions += 1
+            except Exception as e:
+                # One bad item should not sink the rest: retry them one per transaction
+                session.rollback()
+                print(f"[BatchIngest] Batch write of {len(batch)} failed ({e}), retrying per item")
+                for entry in batch:
+                    await self._write_one(session, entry)
+                return
+        for (index, _, usage, start), result in zip(batch, results):
+            await self._succeed(index, result, usage, start)
+
+    async def _write_one(self, session: Session, entry):
+        index, prepared, usage, start = entry
+        try:
+            result = save_ingest(session, prepared)
+            self.transactions += 1
+        except Exception as e:
+            session.rollback()
+            await self._fail(index, prepared.text, e, start)
+            return
+        await self._succeed(index, result, usage, start)
+
+    # ---------- Events ----------
+
+    def _add_usage(self, usage: dict):
+        for key, value in usage.items():
+            self.usage[key] += value
+
+    async def _succeed(self, index: int, result: dict, usage: dict, start: float):
+        self.succeeded += 1
+        await self._events.put({
+            "type": "item",
+            "index": index,
+            "input": self.items[index][:200],
+            "status": "ok",
+            "raw_input_id": result["raw_input_id"],
+            "title": result["title"],
+            "nodes_created": result["nodes_created"],
+            "edges_created": result["edges_created"],
+            "tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+    async def _fail(self, index: int, text: str, error: Exception, start: float):
+        self.failed += 1
+        print(f"[BatchIngest] Item {index} failed: {error}")
+        await self._events.put({
+            "type": "item",
+            "index": index,
+            "input": text[:200],
+            "status": "error",
+            "error": f"{type(error).__name__}: {error}",
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+    def report(self, elapsed: float) -> dict:
+        minutes = elapsed / 60 if elapsed > 0 else 0
+        tokens = self.usage["prompt_tokens"] + self.usage["completion_tokens"]
+        done = self.succeeded + self.failed
+        return {
+            "type": "report",
+            "items": len(self.items),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 2),
+            "items_per_min": round(done / minutes, 2) if minutes else 0.0,
+            "llm_calls": self.usage["calls"],
+            "prompt_tokens": self.usage["prompt_tokens"],
+            "completion_tokens": self.usage["completion_tokens"],
+            "tokens_per_min": round(tokens / minutes, 1) if minutes else 0.0,
+            "db_transactions": self.transactions,
+            "concurrency": self.concurrency,
+            "llm_max_concurrency": settings.llm_max_concurrency,
+            "crawl_per_host_concurrency": settings.crawl_per_host_concurrency,
+        }
+
+    # ---------- Driver ----------
+
+    async def run(self) -> AsyncGenerator[dict, None]:
+        """Yield one event per item as it is committed (or fails), then the report."""
+        start = time.perf_counter()
+        for index in range(len(self.items)):
+            self._work.put_nowait(index)
+
+        workers = [asyncio.create_task(self._prepare_worker()) for _ in range(min(self.concurrency, len(self.items)))]
+        writer = asyncio.create_task(self._writer())
+
+        async def close_writer():
+            await asyncio.gather(*workers)
+            await self._prepared.put(_DONE)
+            await writer
+        closer = asyncio.create_task(close_writer())
+
+        try:
+            for _ in range(len(self.items)):
+                get_event = asyncio.create_task(self._events.get())
+                done, _ = await asyncio.wait({get_event, closer}, return_when=asyncio.FIRST_COMPLETED)
+                if get_event not in done:
+                    # Pipeline ended early; surface its error after draining what was produced
+                    get_event.cancel()
+                    closer.result()
+                    while not self._events.empty():
+                        yield self._events.get_nowait()
+                    break
+                yield get_event.result()
+            await closer
+        finally:
+            # Client went away or something failed: stop the remaining work
+            for task in [*workers, writer, closer]:
+                task.cancel()
+            await asyncio.gather(*workers, writer, closer, return_exceptions=True)
+
+        report = self.report(time.perf_counter() - start)
+        print(f"[BatchIngest] {report['succeeded']}/{report['items']} items in {report['elapsed_s']}s "
+              f"({report['items_per_min']} items/min, {report['tokens_per_min']} tokens/min)")
+        yield report
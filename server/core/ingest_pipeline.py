@@ -0,0 +1,526 @@
+"""
+Ingest Pipeline
+Turns one input (text, or a URL with optional captured HTML) into a RawInput
+row plus knowledge nodes and edges. Used by the background ingest queue.
+
+The slow, failure-prone steps (crawl, summarize, extract) run as a small
+stage graph, so independent LLM calls overlap. Nodes and edges are written
+in bulk by NodeWriter (one label lookup, batched inserts, one commit);
+writes are idempotent, so a job that fails and is retried does not
+duplicate them. prepare_ingest / save_ingest compute everything first and
+let the caller batch several inputs into one transaction.
+"""
+import re
+import json
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from ..database.models import KnowledgeNode, KnowledgeEdge, RawInput
+from .ai_processor import ai_processor
+from .crawler import FetchError, is_url, is_error_content, fetch_url_content, process_html_content_async
+from .label_index import label_index, normalize_label
+from .node_revisions import add_contributions, record_revisions
+from .settings import settings
+from .task_graph import Stage, run_graph
+
+# progress(stage, fraction) is awaited at each stage boundary
+ProgressCallback = Callable[[str, float], Awaitable[None]]
+
+# Node-count progress during extraction is reported at most this often
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+
+async def _noop_progress(stage: str, fraction: float):
+    pass
+
+
+@dataclass
+class PreparedIngest:
+    """Everything needed to write one input, computed before touching the database."""
+    text: str
+    input_type: str
+    title: Optional[str]
+    fetched_content: Optional[str]
+    nodes_data: list
+    edges_data: list
+    timings: dict
+    started: float
+    # Set when extraction broke off; the objects completed before the break are kept
+    incomplete: Optional[str] = None
+    # Normalized label -> existing node id (None: new), resolved ahead on the embedding pool
+    label_matches: Dict[str, Optional[int]] = field(default_factory=dict)
+
+
+def _ingest_stages(session: Session, text: str, html_content: Optional[str],
+                   is_manual_selection: bool, use_cache: bool,
+                   consume: Callable[[AsyncGenerator], Awaitable], strict: bool = False) -> List[Stage]:
+    """
+    Build the stage graph. For URLs, summarize and extract both depend only
+    on the fetched page, so the two LLM calls run concurrently.
+    consume(stream) handles the extraction events and returns the stage result.
+    strict: fetch, summarize and extraction errors raise instead of being
+    stored as content or placeholder nodes.
+    """
+    async def fetch():
+        print(f"Detected URL: {text}")
+        if html_content:
+            # Use provided HTML content
+            print(f"Using provided HTML content (Manual Selection: {is_manual_selection})")
+            content = await process_html_content_async(
+                html_content,
+                text,
+                extract_main_content=not is_manual_selection
+            )
+            if strict and is_error_content(content):
+                raise FetchError(content[:500])
+            return content
+        # Fetch content from URL
+        return await fetch_url_content(text, strict=strict)
+
+    async def existing_labels():
+        # Get the most recently modified nodes to function as "short-term memory" or "active context"
+        statement = select(KnowledgeNode.label).order_by(KnowledgeNode.last_reviewed_at.desc()).limit(50)
+        return list(session.exec(statement).all())
+
+    async def summarize(raw_fetched):
+        # Use AI to summarize/clean the content for Knowledge Base
+        return await ai_processor.summarize_content(raw_fetched, text, use_cache=use_cache, raise_errors=strict)
+
+    async def extract(labels, raw_fetched=None):
+        input_text = f"URL: {text}\n\n{raw_fetched}" if raw_fetched is not None else text
+        return await consume(ai_processor.stream_knowledge(input_text, existing_labels=labels, use_cache=use_cache,
+                                                           raise_errors=strict))
+
+    stages = [Stage("labels", existing_labels)]
+    if is_url(text):
+        stages += [
+            Stage("fetch", fetch),
+            Stage("summarize", summarize, deps=["fetch"]),
+            Stage("extract", extract, deps=["labels", "fetch"]),
+        ]
+    else:
+        stages.append(Stage("extract", extract, deps=["labels"]))
+    return stages
+
+
+def _page_fields(text: str, results: dict):
+    """(input_type, title, fetched_content) from the graph results."""
+    if "fetch" not in results:
+        return "text", None, None
+    # Extract title from fetched content
+    title_match = re.search(r"Title: (.+?)\n", results["fetch"])
+    title = title_match.group(1) if title_match else text[:50]
+    return "url", title, results["summarize"]
+
+
+async def prepare_ingest(session: Session, text: str, html_content: Optional[str] = None,
+                         is_manual_selection: bool = False,
+                         progress: Optional[ProgressCallback] = None,
+                         use_cache: bool = True) -> PreparedIngest:
+    """
+    Fetch, summarize and extract (read-only on the database).
+    use_cache=False bypasses the LLM response cache.
+    """
+    progress = progress or _noop_progress
+    started = time.perf_counter()
+
+    async def collect(stream):
+        nodes, edges, incomplete = [], [], None
+        async for kind, item in stream:
+            if kind == "node":
+                nodes.append(item)
+            elif kind == "edge":
+                edges.append(item)
+            elif kind == "incomplete":
+                incomplete = item["error"]
+        return nodes, edges, incomplete
+
+    stages = _ingest_stages(session, text, html_content, is_manual_selection, use_cache, collect)
+
+    async def on_stage_done(name: str, finished: int, total: int):
+        await progress(f"{name} done", round(0.05 + 0.8 * finished / total, 2))
+
+    await progress("fetching" if is_url(text) else "extracting", 0.05)
+    graph = await run_graph(stages, on_stage_done=on_stage_done)
+
+    input_type, title, fetched_content = _page_fields(text, graph.results)
+    nodes_data, edges_data, incomplete = graph.results["extract"]
+    label_matches = await resolve_labels_async(session, _labels_of(nodes_data, edges_data))
+
+    return PreparedIngest(
+        text=text,
+        input_type=input_type,
+        title=title,
+        fetched_content=fetched_content,
+        nodes_data=nodes_data,
+        edges_data=edges_data,
+        timings=dict(graph.timings_ms),
+        started=started,
+        incomplete=incomplete,
+        label_matches=label_matches,
+    )
+
+
+def _labels_of(nodes: List[dict], edges: List[dict]) -> List[str]:
+    labels = [node["label"] for node in nodes]
+    labels += [label for edge in edges for label in (edge.get("source_label"), edge.get("target_label")) if label]
+    return labels
+
+
+async def resolve_labels_async(session: Session, labels: List[str]) -> Dict[str, Optional[int]]:
+    """Existing node id per normalized label, with near matching on the embedding pool."""
+    distinct = list({normalize_label(label): label for label in labels}.values())
+    resolved = await label_index.resolve_many_async(session, distinct)
+    return {normalize_label(label): node_id for label, node_id in zip(distinct, resolved)}
+
+
+class NodeWriter:
+    """
+    Buffers extracted nodes and edges for one input and writes them in bulk.
+    Each flush resolves the labels through the label index, loads the
+    matched nodes with one IN query, inserts the new nodes with one
+    executemany and updates the existing ones in place: new content for an
+    existing node is recorded as a revision and the node's current text is
+    recomposed (see node_revisions). Edges are written once both ends
+    exist, skipping duplicates within the input and edges already in the
+    database. flush() never commits.
+
+    Async callers await resolve_pending() before flush() / finish(), so
+    label near matching runs on the embedding pool; labels not resolved
+    ahead are near-matched inline.
+    """
+    def __init__(self, session: Session, source_info: str,
+                 label_matches: Optional[Dict[str, Optional[int]]] = None):
+        self.session = session
+        self.source_info = source_info
+        self.node_ids: Dict[str, int] = {}  # normalized label -> db id
+        self.label_matches: Dict[str, Optional[int]] = dict(label_matches or {})  # resolved ahead
+        self.labels: Dict[str, str] = {}  # normalized label -> stored label
+        self.pending_nodes: List[dict] = []
+        self.pending_edges: List[dict] = []
+        self.seen_edges: set = set()
+        self.nodes_written = 0
+        self.edges_written = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self.pending_nodes) + len(self.pending_edges)
+
+    def add_node(self, node_data: dict):
+        self.pending_nodes.append(node_data)
+
+    def add_edge(self, edge: dict):
+        self.pending_edges.append(edge)
+
+    async def resolve_pending(self):
+        """Resolve the labels of the buffered nodes and edges ahead of flush()."""
+        labels = [
+            label for label in _labels_of(self.pending_nodes, self.pending_edges)
+            if normalize_label(label) not in self.node_ids and normalize_label(label) not in self.label_matches
+        ]
+        if labels:
+            self.label_matches.update(await resolve_labels_async(self.session, labels))
+
+    def _resolve(self, labels: List[str]) -> List[Optional[int]]:
+        """Exact matches from the label index, then the near matches resolved ahead (or inline)."""
+        resolved = label_index.resolve_many(self.session, labels, near_match=False)
+        inline = []
+        for i, label in enumerate(labels):
+            if resolved[i] is None:
+                key = normalize_label(label)
+                if key in self.label_matches:
+                    resolved[i] = self.label_matches[key]
+                else:
+                    inline.append(i)
+        if inline and settings.label_near_match:
+            for i, node_id in zip(inline, label_index.near_matches([labels[i] for i in inline])):
+                resolved[i] = node_id
+        return resolved
+
+    def flush(self):
+        """Write buffered nodes, then the buffered edges whose ends are known."""
+        if self.pending_nodes:
+            self._write_nodes(self.pending_nodes)
+            self.pending_nodes = []
+        if self.pending_edges:
+            self._write_edges()
+        self.session.flush()
+
+    def finish(self) -> int:
+        """Flush and drop edges whose ends never arrived; returns how many were dropped."""
+        self.flush()
+        if self.pending_edges:
+            # Edges may point at existing nodes that the extraction did not repeat
+            unknown = sorted({
+                label
+                for edge in self.pending_edges
+                for label in (edge.get("source_label"), edge.get("target_label"))
+                if label and normalize_label(label) not in self.node_ids
+            })
+            for label, node_id in zip(unknown, self._resolve(unknown)):
+                if node_id is not None:
+                    self.node_ids[normalize_label(label)] = node_id
+            self._write_edges()
+            self.session.flush()
+        dropped = len(self.pending_edges)
+        self.pending_edges = []
+        return dropped
+
+    def _write_nodes(self, batch: List[dict]):
+        # Same label twice in one batch: first spelling wins, distinct contents are joined
+        merged: Dict[str, dict] = {}
+        for node_data in batch:
+            key = normalize_label(node_data["label"])
+            content = (node_data.get("content") or "").strip()
+            if key not in merged:
+                merged[key] = dict(node_data, label=self.labels.get(key, node_data["label"]), content=content)
+            elif content and content not in merged[key]["content"]:
+                merged[key]["content"] = f"{merged[key]['content']}\n\n{content}" if merged[key]["content"] else content
+
+        # Resolve the new labels in memory, then load every matched node with one query
+        unresolved = [key for key in merged if key not in self.node_ids]
+        resolved = self._resolve([merged[key]["label"] for key in unresolved])
+        for key, node_id in zip(unresolved, resolved):
+            if node_id is not None:
+                self.node_ids[key] = node_id
+        wanted = {self.node_ids[key] for key in merged if key in self.node_ids}
+        rows = {
+            node.id: node
+            for node in self.session.exec(select(KnowledgeNode).where(KnowledgeNode.id.in_(wanted))).all()
+        } if wanted else {}
+        for key in merged:
+            node_id = self.node_ids.get(key)
+            if node_id is not None and node_id not in rows:
+                # Index entry for a row that no longer exists (e.g. a rolled back insert)
+                label_index.forget(node_id)
+                del self.node_ids[key]
+
+        now = datetime.utcnow()
+        new_nodes = []
+        contributions = []
+        for key, node_data in merged.items():
+            node = rows.get(self.node_ids.get(key))
+            new_content = node_data["content"]
+            if node is not None:
+                # New content becomes a revision (add_contributions skips stored ones)
+                if new_content:
+                    contributions.append((node, new_content))
+
+                node.type = node_data.get("type", node.type)
+
+                # Update source info (append if new)
+                source_info = self.source_info
+                if source_info and source_info != "User Input":
+                    current_source = node.source or ""
+                    if source_info not in current_source:
+                        node.source = f"{current_source}; {source_info}" if current_source else source_info
+
+                node.last_reviewed_at = now
+                self.session.add(node)
+            else:
+                new_nodes.append({
+                    "label": node_data["label"],
+                    "type": node_data.get("type", "Concept"),
+                    "content": new_content,
+                    "source": self.source_info,
+                    "created_at": now,
+                    "updated_at": now,  # Core insert: the ORM _touch hook does not run
+                })
+            self.labels[key] = node_data["label"] if node is None else node.label
+
+        add_contributions(self.session, contributions, kind="update", source=self.source_info)
+
+        if new_nodes:
+            # One executemany; ORM inserts on SQLite go row by row to fetch each id
+            self.session.flush()
+            self.session.execute(KnowledgeNode.__table__.insert(), new_nodes)
+            labels = [row["label"] for row in new_nodes]
+            created = {}
+            for node_id, label in self.session.exec(
+                select(KnowledgeNode.id, KnowledgeNode.label)
+                .where(KnowledgeNode.label.in_(labels))
+                .order_by(KnowledgeNode.id)
+            ).all():
+                # Ordered by id, so a label stored twice maps to the row just inserted
+                self.node_ids[normalize_label(label)] = node_id
+                created[label] = node_id
+                label_index.register(node_id, label)
+            record_revisions(self.session, [
+                {"node_id": created[row["label"]], "kind": "create", "content": row["content"],
+                 "source": self.source_info, "created_at": now}
+                for row in new_nodes
+            ])
+        self.nodes_written += len(batch)
+
+    def _write_edges(self):
+        waiting = []
+        ready = {}
+        for edge in self.pending_edges:
+            source_id = self.node_ids.get(normalize_label(edge.get("source_label")))
+            target_id = self.node_ids.get(normalize_label(edge.get("target_label")))
+            if not source_id or not target_id:
+                waiting.append(edge)
+                continue
+            triple = (source_id, target_id, edge.get("relation_type") or "")
+            if triple not in self.seen_edges:
+                self.seen_edges.add(triple)
+                ready[triple] = True
+        self.pending_edges = waiting
+        if not ready:
+            return
+
+        # Retried jobs and repeated inputs must not duplicate edges
+        sources = {source_id for source_id, _, _ in ready}
+        targets = {target_id for _, target_id, _ in ready}
+        stored = set(self.session.exec(
+            select(KnowledgeEdge.source_id, KnowledgeEdge.target_id, KnowledgeEdge.relation_type)
+            .where(KnowledgeEdge.source_id.in_(sources), KnowledgeEdge.target_id.in_(targets))
+        ).all())
+        new_edges = [
+            {"source_id": source_id, "target_id": target_id, "relation_type": relation_type, "weight": 1.0}
+            for source_id, target_id, relation_type in ready
+            if (source_id, target_id, relation_type) not in stored
+        ]
+        if new_edges:
+            self.session.execute(KnowledgeEdge.__table__.insert(), new_edges)
+        self.edges_written += len(new_edges)
+
+
+def _source_info(input_type: str, text: str) -> str:
+    # Determine the source string
+    return text if input_type == "url" else "User Input"
+
+
+def save_ingest(session: Session, prepared: PreparedIngest, commit: bool = True) -> dict:
+    """
+    Write a prepared input: RawInput, new/updated nodes and edges.
+    With commit=False the caller commits, so several inputs can share one transaction.
+    """
+    save_started = time.perf_counter()
+    writer = NodeWriter(session, _source_info(prepared.input_type, prepared.text), prepared.label_matches)
+    for node_data in prepared.nodes_data:
+        writer.add_node(node_data)
+    for edge in prepared.edges_data:
+        writer.add_edge(edge)
+    result = _write_raw_input(
+        session, writer, prepared.input_type, prepared.text, prepared.title, prepared.fetched_content,
+        prepared.timings, prepared.started, save_started, prepared.incomplete,
+    )
+    if commit:
+        session.commit()
+    return result
+
+
+def _write_raw_input(session: Session, writer: NodeWriter, input_type: str, text: str, title: Optional[str],
+                     fetched_content: Optional[str], timings: dict, started: float, save_started: float,
+                     incomplete: Optional[str]) -> dict:
+    """
+    Write the writer's remaining nodes and edges and the RawInput row (with
+    summarized content and stage timings); returns the ingest result.
+    Flushes, the caller commits.
+    """
+    dropped = writer.finish()
+    if dropped:
+        print(f"[Ingest] Dropped {dropped} edges with unknown endpoints")
+    raw_input = RawInput(
+        input_type=input_type,
+        original_input=text,
+        fetched_content=fetched_content,
+        title=title
+    )
+    # Per-stage wall-clock times; summarize and extract overlap, so their sum can exceed the total
+    timings = dict(timings)
+    timings["save"] = round((time.perf_counter() - save_started) * 1000, 1)
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    raw_input.stage_timings = json.dumps(timings)
+    session.add(raw_input)
+    session.flush()
+    return _result(raw_input, writer.nodes_written, writer.edges_written, timings, incomplete)
+
+
+def _result(raw_input: RawInput, nodes: int, edges: int, timings: dict, incomplete: Optional[str]) -> dict:
+    return {
+        "message": "Ingested" if incomplete is None else "Ingested (extraction incomplete)",
+        "raw_input_id": raw_input.id,
+        "title": raw_input.title,
+        "nodes_created": nodes,
+        "edges_created": edges,
+        "stage_timings": timings,
+        "incomplete": incomplete,
+    }
+
+
+async def run_ingest(session: Session, text: str, html_content: Optional[str] = None,
+                     is_manual_selection: bool = False,
+                     progress: Optional[ProgressCallback] = None,
+                     use_cache: bool = True) -> dict:
+    """
+    Ingest one input, writing nodes and edges as the extraction stream
+    completes them: buffered objects are written and committed every
+    settings.ingest_write_interval_seconds, or sooner once
+    settings.ingest_write_batch_size are buffered, and the rest with the
+    RawInput row at the end. Each write is committed right after it is
+    flushed, so a progress callback that commits the same session (the
+    queue's does) never ends a write halfway. If the stream breaks off,
+    what arrived is kept and the result is flagged incomplete; a failed
+    fetch, summary or extraction that produced nothing raises, so the queue
+    retries the job.
+    """
+    progress = progress or _noop_progress
+    started = time.perf_counter()
+    writer = NodeWriter(session, _source_info("url" if is_url(text) else "text", text))
+    batch_size = max(1, settings.ingest_write_batch_size)
+    interval = settings.ingest_write_interval_seconds
+    last_fraction = 0.05
+
+    async def report(stage: str, fraction: float):
+        nonlocal last_fraction
+        last_fraction = max(last_fraction, fraction)
+        await progress(stage, last_fraction)
+
+    async def write(stream):
+        incomplete = None
+        received = 0
+        last_report = last_write = time.perf_counter()
+        async for kind, item in stream:
+            if kind == "node":
+                writer.add_node(item)
+                received += 1
+                if time.perf_counter() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                    last_report = time.perf_counter()
+                    await report(f"extracting ({received} nodes)", last_fraction)
+            elif kind == "edge":
+                writer.add_edge(item)
+            elif kind == "incomplete":
+                incomplete = item["error"]
+            if writer.pending and (writer.pending >= batch_size or time.perf_counter() - last_write >= interval):
+                await writer.resolve_pending()
+                # No await between flush and commit (see above)
+                writer.flush()
+                session.commit()
+                last_write = time.perf_counter()
+        return incomplete
+
+    # Errors raise so the queue retries the job instead of storing error text
+    stages = _ingest_stages(session, text, html_content, is_manual_selection, use_cache, write, strict=True)
+
+    async def on_stage_done(name: str, finished: int, total: int):
+        await report(f"{name} done", round(0.05 + 0.8 * finished / total, 2))
+
+    await report("fetching" if is_url(text) else "extracting", 0.05)
+    graph = await run_graph(stages, on_stage_done=on_stage_done)
+
+    await report("saving", 0.85)
+    save_started = time.perf_counter()
+    await writer.resolve_pending()
+    input_type, title, fetched_content = _page_fields(text, graph.results)
+    result = _write_raw_input(
+        session, writer, input_type, text, title, fetched_content,
+        graph.timings_ms, started, save_started, graph.results["extract"],
+    )
+    session.commit()
+    return result
@@ -0,0 +1,243 @@
+"""
+Ingest Job Queue
+Ingest requests are persisted as IngestJob rows and processed by a small
+pool of asyncio workers, so the HTTP request returns as soon as the job is
+queued. Failed jobs are retried with exponential backoff; jobs that were
+running when the server stopped are picked up again on the next start.
+
+Status changes are written to the job row and announced to waiting status
+streams through an in-process condition.
+"""
+import asyncio
+import json
+import random
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, select, func
+
+from ..database.database import engine
+from ..database.models import IngestJob
+from .ingest_pipeline import run_ingest
+from .settings import settings
+
+# Workers re-check for due retries at least this often while idle
+IDLE_POLL_SECONDS = 5.0
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+
+def job_to_dict(job: IngestJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "next_attempt_at": job.next_attempt_at.isoformat() if job.status == "queued" else None,
+    }
+
+
+class IngestQueue:
+    def __init__(self, workers: int = 2, max_attempts: int = 3, backoff_seconds: float = 5.0):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Condition] = None
+
+    # ---------- Lifecycle ----------
+
+    def start(self):
+        """Recover interrupted jobs and spawn the workers (call from the app lifespan)."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._changed = asyncio.Condition()
+
+        with Session(engine) as session:
+            now = datetime.utcnow()
+            exhausted = session.exec(
+                update(IngestJob)
+                .where(IngestJob.status == "running", IngestJob.attempts >= IngestJob.max_attempts)
+                .values(status="failed", error="Interrupted on the last attempt", finished_at=now)
+            )
+            requeued = session.exec(
+                update(IngestJob)
+                .where(IngestJob.status == "running")
+                .values(status="queued", stage=None, next_attempt_at=now)
+            )
+            session.commit()
+            if requeued.rowcount or exhausted.rowcount:
+                print(f"[IngestQueue] Re-queued {requeued.rowcount} interrupted jobs, {exhausted.rowcount} failed")
+
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"[IngestQueue] Started {self.workers} workers")
+
+    async def stop(self):
+        """Cancel the workers. A job cut off mid-run is re-queued on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    # ---------- Producer side ----------
+
+    def submit(self, session: Session, payload: dict) -> IngestJob:
+        job = IngestJob(payload=json.dumps(payload, ensure_ascii=False), max_attempts=self.max_attempts)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Wait until any job changes state; False on timeout (or when the queue is not running)."""
+        if self._changed is None:
+            await asyncio.sleep(timeout)
+            return False
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    def stats(self) -> dict:
+        with Session(engine) as session:
+            rows = session.exec(select(IngestJob.status, func.count()).group_by(IngestJob.status)).all()
+        return {"workers": len(self._tasks), "jobs": {status: count for status, count in rows}}
+
+    # ---------- Worker side ----------
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _claim_next(self) -> Optional[int]:
+        """Atomically move the oldest due job from queued to running; returns its id."""
+        with Session(engine) as session:
+            while True:
+                job_id = session.exec(
+                    select(IngestJob.id)
+                    .where(IngestJob.status == "queued", IngestJob.next_attempt_at <= datetime.utcnow())
+                    .order_by(IngestJob.next_attempt_at, IngestJob.id)
+                    .limit(1)
+                ).first()
+                if job_id is None:
+                    return None
+                result = session.exec(
+                    update(IngestJob)
+                    .where(IngestJob.id == job_id, IngestJob.status == "queued")
+                    .values(status="running", stage="starting", progress=0.0,
+                            attempts=IngestJob.attempts + 1, started_at=datetime.utcnow())
+                )
+                session.commit()
+                if result.rowcount:
+                    return job_id
+                # Another worker claimed it first; try the next one
+
+    def _next_due_in(self) -> float:
+        with Session(engine) as session:
+            due = session.exec(select(func.min(IngestJob.next_attempt_at)).where(IngestJob.status == "queued")).one()
+        if due is None:
+            return IDLE_POLL_SECONDS
+        return min(max((due - datetime.utcnow()).total_seconds(), 0.0), IDLE_POLL_SECONDS)
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                # Clear before looking, so a submit that lands in between still wakes us
+                self._wakeup.clear()
+                job_id = self._claim_next()
+                if job_id is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self._next_due_in())
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._notify()
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Never let a bookkeeping error kill the worker
+                print(f"[IngestQueue] Worker {index} error: {e}")
+                await asyncio.sleep(1.0)
+
+    async def _run_job(self, job_id: int):
+        with Session(engine) as session:
+            job = session.get(IngestJob, job_id)
+            payload = json.loads(job.payload)
+
+            async def report(stage: str, fraction: float):
+                # Commits the ingest session too; run_ingest only calls this
+                # between writes, so no half-written batch is committed here
+                job.stage = stage
+                job.progress = fraction
+                session.add(job)
+                session.commit()
+                await self._notify()
+
+            print(f"[IngestQueue] Job {job_id} attempt {job.attempts}/{job.max_attempts}")
+            try:
+                result = await run_ingest(
+                    session,
+                    payload["text"],
+                    html_content=payload.get("html_content"),
+                    is_manual_selection=payload.get("is_manual_selection", False),
+                    progress=report,
+                    use_cache=payload.get("use_cache", True),
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                session.rollback()
+                job = session.get(IngestJob, job_id)
+                job.error = f"{type(e).__name__}: {e}"
+                if job.attempts < job.max_attempts:
+                    delay = self.backoff_seconds * (2 ** (job.attempts - 1)) * random.uniform(0.8, 1.2)
+                    job.status = "queued"
+                    job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    print(f"[IngestQueue] Job {job_id} failed ({job.error}), retrying in {delay:.1f}s")
+                else:
+                    job.status = "failed"
+                    job.finished_at = datetime.utcnow()
+                    print(f"[IngestQueue] Job {job_id} failed permanently: {job.error}")
+                session.add(job)
+                session.commit()
+                await self._notify()
+                return
+
+            job.status = "succeeded"
+            job.stage = "done"
+            job.progress = 1.0
+            job.error = None
+            job.result = json.dumps(result, ensure_ascii=False)
+            job.finished_at = datetime.utcnow()
+            session.add(job)
+            session.commit()
+            await self._notify()
+            print(f"[IngestQueue] Job {job_id} done: {result.get('nodes_created', 0)} nodes")
+
+
+# Singleton instance
+ingest_queue = IngestQueue(
+    workers=settings.ingest_workers,
+    max_attempts=settings.ingest_max_attempts,
+    backoff_seconds=settings.ingest_retry_backoff_seconds,
+)
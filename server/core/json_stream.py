@@ -0,0 +1,93 @@
+"""
+Streaming JSON
+Incremental scanner for a JSON object whose values are arrays of objects,
+such as the extraction output {"nodes": [{...}, ...], "edges": [{...}]}.
+Text is fed as it streams in and each array element is decoded as soon as
+its closing brace arrives, so a response that is cut short or has a
+malformed tail still yields every element completed before the break.
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class JSONItemStream:
+    def __init__(self):
+        self._buf = ""          # text from the earliest position still needed
+        self._pos = 0           # scan position in _buf
+        self._stack: List[str] = []  # open containers, '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._key_start = -1    # start of a string literal directly inside the top-level object
+        self._last_key: Optional[str] = None
+        self._array_key: Optional[str] = None
+        self._item_start = -1   # start of the array element object being read
+
+        self.items = 0          # elements decoded
+        self.skipped = 0        # complete elements that were not valid JSON
+        self.complete = False   # top-level object closed
+
+    def feed(self, text: str) -> List[Tuple[Optional[str], Any]]:
+        """Consume the next piece of text; returns (array_key, element) for each element completed by it."""
+        out = []
+        if self.complete or not text:
+            return out
+        buf = self._buf + text
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if not self._stack:
+                # Skip anything before the top-level object (e.g. a ```json fence)
+                if ch == '{':
+                    self._stack.append(ch)
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_start >= 0:
+                        self._last_key = self._decode_key(buf[self._key_start:i + 1])
+                        self._key_start = -1
+            elif ch == '"':
+                self._in_string = True
+                if len(self._stack) == 1:
+                    self._key_start = i
+            elif ch == '{' or ch == '[':
+                if ch == '[' and len(self._stack) == 1:
+                    self._array_key = self._last_key
+                elif ch == '{' and self._stack == ['{', '[']:
+                    self._item_start = i
+                self._stack.append(ch)
+            elif ch == '}' or ch == ']':
+                self._stack.pop()
+                if not self._stack:
+                    self.complete = True
+                    i += 1
+                    break
+                if ch == '}' and self._item_start >= 0 and self._stack == ['{', '[']:
+                    raw = buf[self._item_start:i + 1]
+                    self._item_start = -1
+                    try:
+                        out.append((self._array_key, json.loads(raw)))
+                        self.items += 1
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+            i += 1
+
+        # Keep only the part that may still be needed (an unfinished element or key)
+        keep = min(x for x in (self._item_start, self._key_start, i) if x >= 0)
+        self._buf = buf[keep:]
+        self._pos = i - keep
+        if self._item_start >= 0:
+            self._item_start -= keep
+        if self._key_start >= 0:
+            self._key_start -= keep
+        return out
+
+    @staticmethod
+    def _decode_key(literal: str) -> Optional[str]:
+        try:
+            return json.loads(literal)
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,252 @@
+"""
+Label Index
+Answers "which existing node is this label?" from memory instead of an
+exact-match query per label. Labels are compared in normalized form
+(Unicode NFKC, case folded, spaces, dashes, quotes and brackets removed),
+so "Python", "python " and "Ｐｙｔｈｏｎ" resolve to the same node.
+
+Optionally, a label without a normalized match is compared against
+embeddings of all node labels and resolved to the most similar one above
+settings.label_near_match_threshold ("Python语言" -> "Python"). Async
+callers use resolve_many_async, which embeds on the embedding pool.
+
+The index is built from the table on first use and then kept current from
+the same change tracking as IndexSync (updated_at high-water mark plus the
+deletion log). Writers also register the nodes they create, so those
+resolve within the same transaction.
+"""
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+from sqlmodel import Session, select, or_, func
+
+from ..database.models import DeletionLog, KnowledgeNode
+from .settings import settings
+
+# Re-read window behind the updated_at mark, as in IndexSync (not imported
+# from there: that module loads the vector store, and ai_processor imports this one)
+SYNC_LAG = timedelta(seconds=5)
+
+# Unicode categories dropped by normalize_label: separators, dash / connector
+# punctuation, quotes, brackets, control and format characters. Other
+# punctuation and symbols are kept, so "C++", "C#" and "C" stay distinct.
+_DROPPED_CATEGORIES = {"Zs", "Zl", "Zp", "Pc", "Pd", "Pi", "Pf", "Ps", "Pe", "Cc", "Cf"}
+
+
+def normalize_label(label) -> str:
+    """Matching key of a label; falls back to the case-folded text if nothing would be left."""
+    text = unicodedata.normalize("NFKC", str(label or "")).casefold()
+    key = "".join(ch for ch in text if unicodedata.category(ch) not in _DROPPED_CATEGORIES)
+    return key or " ".join(text.split())
+
+
+class LabelIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Serializes label embedding; held without _lock so lookups are not blocked meanwhile
+        self._refresh_lock = threading.Lock()
+        self._ids: Dict[str, Set[int]] = {}   # normalized label -> node ids (the oldest is canonical)
+        self._keys: Dict[int, str] = {}       # node id -> normalized label
+        self._display: Dict[int, str] = {}    # node id -> label as stored
+
+        # Change tracking cursor, see IndexSync
+        self._initialized = False
+        self._high_water: Optional[datetime] = None
+        self._max_id = 0
+        self._last_deletion_id = 0
+
+        # Near matching: one embedding per distinct label, stacked on demand
+        self._label_vectors: Dict[str, np.ndarray] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._matrix_dirty = True
+
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.lookup_seconds = 0.0
+
+    def reset(self):
+        """Forget everything; the next sync rebuilds from the table."""
+        with self._lock:
+            self.__init__()
+
+    # ---------- Maintenance ----------
+
+    def register(self, node_id: int, label: str):
+        """Add or update one node (called by writers for the rows they create or rename)."""
+        with self._lock:
+            key = normalize_label(label)
+            old_key = self._keys.get(node_id)
+            if old_key == key and self._display.get(node_id) == label:
+                return
+            if old_key is not None and old_key != key:
+                self._discard(node_id, old_key)
+            self._ids.setdefault(key, set()).add(node_id)
+            self._keys[node_id] = key
+            self._display[node_id] = label
+            self._max_id = max(self._max_id, node_id)
+            self._matrix_dirty = True
+
+    def forget(self, node_id: int):
+        with self._lock:
+            key = self._keys.pop(node_id, None)
+            self._display.pop(node_id, None)
+            if key is not None:
+                self._discard(node_id, key)
+                self._matrix_dirty = True
+
+    def _discard(self, node_id: int, key: str):
+        ids = self._ids.get(key)
+        if ids is not None:
+            ids.discard(node_id)
+            if not ids:
+                del self._ids[key]
+
+    def sync(self, session: Session):
+        """Apply node inserts, renames and deletions since the last sync (full load the first time)."""
+        with self._lock:
+            if not self._initialized:
+                self._load(session)
+                return
+            condition = KnowledgeNode.id > self._max_id
+            if self._high_water is not None:
+                condition = or_(condition, KnowledgeNode.updated_at >= self._high_water - SYNC_LAG)
+            rows = session.exec(
+                select(KnowledgeNode.id, KnowledgeNode.label, KnowledgeNode.updated_at).where(condition)
+            ).all()
+            deletions = session.exec(
+                select(DeletionLog.id, DeletionLog.row_id)
+                .where(DeletionLog.table_name == KnowledgeNode.__tablename__, DeletionLog.id > self._last_deletion_id)
+                .order_by(DeletionLog.id)
+            ).all()
+            for deletion_id, row_id in deletions:
+                self.forget(row_id)
+                self._last_deletion_id = deletion_id
+            for node_id, label, updated_at in rows:
+                self.register(node_id, label)
+                if updated_at is not None and (self._high_water is None or updated_at > self._high_water):
+                    self._high_water = updated_at
+
+    def _load(self, session: Session):
+        start = time.perf_counter()
+        self._last_deletion_id = session.exec(select(func.max(DeletionLog.id))).one() or 0
+        rows = session.exec(select(KnowledgeNode.id, KnowledgeNode.label, KnowledgeNode.updated_at)).all()
+        for node_id, label, updated_at in rows:
+            self.register(node_id, label)
+            if updated_at is not None and (self._high_water is None or updated_at > self._high_water):
+                self._high_water = updated_at
+        self._initialized = True
+        print(f"[LabelIndex] Loaded {len(rows)} labels ({len(self._ids)} distinct) "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # ---------- Resolution ----------
+
+    def lookup(self, label: str) -> Optional[int]:
+        """Node id for a label by normalized match, from memory only."""
+        start = time.perf_counter()
+        with self._lock:
+            ids = self._ids.get(normalize_label(label))
+            node_id = min(ids) if ids else None
+            self.lookups += 1
+            if node_id is not None:
+                self.exact_hits += 1
+            self.lookup_seconds += time.perf_counter() - start
+        return node_id
+
+    def resolve(self, session: Session, label: str) -> Optional[int]:
+        return self.resolve_many(session, [label])[0]
+
+    def resolve_many(self, session: Session, labels: List[str],
+                     near_match: Optional[bool] = None) -> List[Optional[int]]:
+        """
+        Existing node id per label (None for new labels), after syncing with
+        the table. Near matching (settings.label_near_match unless given)
+        runs for the misses only, in the calling thread.
+        """
+        self.sync(session)
+        resolved = [self.lookup(label) for label in labels]
+        if settings.label_near_match if near_match is None else near_match:
+            misses = [i for i, node_id in enumerate(resolved) if node_id is None]
+            if misses:
+                for i, node_id in zip(misses, self.near_matches([labels[i] for i in misses])):
+                    resolved[i] = node_id
+        return resolved
+
+    async def resolve_many_async(self, session: Session, labels: List[str]) -> List[Optional[int]]:
+        """resolve_many for async callers: the label embeddings are computed on the embedding pool."""
+        from .embedding_service import run_in_embedding_pool
+
+        resolved = self.resolve_many(session, labels, near_match=False)
+        if settings.label_near_match:
+            misses = [i for i, node_id in enumerate(resolved) if node_id is None]
+            if misses:
+                near = await run_in_embedding_pool(self.near_matches, [labels[i] for i in misses])
+                for i, node_id in zip(misses, near):
+                    resolved[i] = node_id
+        return resolved
+
+    async def resolve_async(self, session: Session, label: str) -> Optional[int]:
+        return (await self.resolve_many_async(session, [label]))[0]
+
+    def near_matches(self, labels: List[str]) -> List[Optional[int]]:
+        """Most similar existing label per input, if its cosine similarity reaches the threshold."""
+        from .vector_store import encode_texts
+
+        self._refresh_matrix(encode_texts)
+        with self._lock:
+            matrix, matrix_ids = self._matrix, self._matrix_ids
+        if matrix is None or not labels:
+            return [None] * len(labels)
+        scores = encode_texts(labels) @ matrix.T
+        best = scores.argmax(axis=1)
+        out = []
+        for row, col in enumerate(best):
+            if scores[row, col] >= settings.label_near_match_threshold:
+                out.append(matrix_ids[col])
+            else:
+                out.append(None)
+        with self._lock:
+            self.near_hits += sum(node_id is not None for node_id in out)
+        return out
+
+    def _refresh_matrix(self, encode_texts):
+        with self._refresh_lock:
+            with self._lock:
+                if not self._matrix_dirty:
+                    return
+                # Canonical node per normalized label, embedded by its stored spelling
+                canonical = {key: min(ids) for key, ids in self._ids.items()}
+                texts = {node_id: self._display[node_id] for node_id in canonical.values()}
+                missing = sorted({text for text in texts.values() if text not in self._label_vectors})
+                self._matrix_dirty = False
+            # Labels registered while this runs mark the matrix dirty again
+            vectors = encode_texts(missing) if missing else []
+            with self._lock:
+                for text, vector in zip(missing, vectors):
+                    self._label_vectors[text] = vector
+                in_use = set(texts.values())
+                for text in [t for t in self._label_vectors if t not in in_use]:
+                    del self._label_vectors[text]
+                self._matrix_ids = list(texts)
+                self._matrix = np.stack([self._label_vectors[texts[i]] for i in self._matrix_ids]) if texts else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'labels': len(self._keys),
+                'distinct': len(self._ids),
+                'lookups': self.lookups,
+                'exact_hits': self.exact_hits,
+                'near_hits': self.near_hits,
+                'avg_lookup_us': round(self.lookup_seconds / self.lookups * 1e6, 2) if self.lookups else 0.0,
+                'near_match': settings.label_near_match,
+            }
+
+
+# Singleton instance
+label_index = LabelIndex()
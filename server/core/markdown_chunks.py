@@ -0,0 +1,48 @@
+"""
+Markdown Chunking
+Splits long Markdown into chunks for map-reduce LLM processing. Sections
+start at headings and consecutive sections are packed together up to the
+size limit; a section that alone is too long is split at sentence or
+whitespace boundaries.
+"""
+import re
+from typing import List
+
+from .passages import split_passages
+
+_HEADING_RE = re.compile(r"^#{1,6}\s", re.MULTILINE)
+
+
+def split_sections(text: str) -> List[str]:
+    """Split before every Markdown heading line; text before the first heading is its own section."""
+    starts = [m.start() for m in _HEADING_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    bounds = starts + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]] for i in range(len(starts)) if text[bounds[i]:bounds[i + 1]].strip()]
+
+
+def split_markdown(text: str, max_chars: int) -> List[str]:
+    """Chunks of at most max_chars, cut at headings where possible, in document order."""
+    if not text or not text.strip():
+        return []
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces: List[str] = []
+    for section in split_sections(text):
+        if len(section) <= max_chars:
+            pieces.append(section)
+        else:
+            pieces.extend(section[start:end] for start, end in split_passages(section, max_chars, overlap=0))
+
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
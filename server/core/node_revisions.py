@@ -0,0 +1,215 @@
+"""
+Node Revisions
+Every contribution to a node's content (its creation, a manual edit, an
+extraction update, a browser clip) is stored as a NodeRevision row with its
+source and time. KnowledgeNode.content holds the compact current text: the
+latest creation or edit followed by the newest contributions that fit in
+settings.node_content_max_chars. Retrieval, embeddings and prompts read
+that bounded text, however often a concept is re-clipped; the full history
+stays available per node.
+
+Manual edits are stored as written: the edited text becomes the new base
+and the node's content.
+"""
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..database.database import engine
+from ..database.models import KnowledgeNode, NodeRevision
+from .settings import settings
+
+# Revisions that replace the node text; the others are added to it
+BASE_KINDS = ("create", "edit")
+# Newest contributions read per node when composing; older ones would not fit anyway
+RECENT_REVISIONS = 20
+SEPARATOR = "\n\n"
+
+# Marker lines of the former in-row history ("--- [Updated 2024-01-31] ---")
+_INLINE_MARKER = re.compile(r"\n*--- \[(Updated|摘录) (\d{4}-\d{2}-\d{2})\] ---\n")
+_MARKER_KINDS = {"Updated": "update", "摘录": "clip"}
+
+
+def _cut(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 1)].rstrip() + "…"
+
+
+def compose_content(base: str, contributions: List[str], max_chars: int) -> str:
+    """
+    Base text plus the newest contributions (given oldest first) within
+    max_chars. The newest contribution always gets in, with up to half of
+    the budget; the base is cut to make room for it, and older
+    contributions fill what is left.
+    """
+    base = (base or "").strip()
+    recent = [text.strip() for text in contributions if text and text.strip()]
+    if not recent:
+        return _cut(base, max_chars)
+    newest = _cut(recent[-1], max_chars // 2)
+    if base:
+        base = _cut(base, max_chars - len(newest) - len(SEPARATOR))
+    budget = max_chars - len(newest) - (len(base) + len(SEPARATOR) if base else 0)
+    kept = [newest]
+    for text in reversed(recent[:-1]):
+        cost = len(text) + len(SEPARATOR)
+        if cost > budget:
+            break
+        kept.append(text)
+        budget -= cost
+    return SEPARATOR.join(([base] if base else []) + kept[::-1])
+
+
+def record_revisions(session: Session, rows: List[dict]):
+    """Insert revisions with one executemany (rows: node_id, kind, content, optional source / created_at)."""
+    if not rows:
+        return
+    now = datetime.utcnow()
+    # Pending ORM changes (e.g. a node inserted in this transaction) go first
+    session.flush()
+    session.execute(NodeRevision.__table__.insert(), [{"source": None, "created_at": now, **row} for row in rows])
+
+
+def compose_many(session: Session, node_ids: Iterable[int]) -> Dict[int, str]:
+    """Current content per node, composed from its latest base and newest contributions."""
+    ids = sorted(set(node_ids))
+    if not ids:
+        return {}
+    heads = dict(session.execute(
+        select(NodeRevision.node_id, func.max(NodeRevision.id))
+        .where(NodeRevision.node_id.in_(ids), NodeRevision.kind.in_(BASE_KINDS))
+        .group_by(NodeRevision.node_id)
+    ).all())
+    base_text = dict(session.execute(
+        select(NodeRevision.id, NodeRevision.content).where(NodeRevision.id.in_(list(heads.values())))
+    ).all()) if heads else {}
+
+    ranked = select(
+        NodeRevision.node_id,
+        NodeRevision.id,
+        NodeRevision.content,
+        func.row_number().over(partition_by=NodeRevision.node_id, order_by=NodeRevision.id.desc()).label("rank"),
+    ).where(NodeRevision.node_id.in_(ids), NodeRevision.kind.not_in(BASE_KINDS)).subquery()
+    contributions: Dict[int, List[str]] = {}
+    for node_id, revision_id, content in session.execute(
+        select(ranked.c.node_id, ranked.c.id, ranked.c.content)
+        .where(ranked.c.rank <= RECENT_REVISIONS)
+        .order_by(ranked.c.node_id, ranked.c.id)
+    ).all():
+        # Contributions older than the latest edit were folded into it
+        if revision_id > heads.get(node_id, 0):
+            contributions.setdefault(node_id, []).append(content)
+
+    max_chars = settings.node_content_max_chars
+    return {
+        node_id: compose_content(base_text.get(heads.get(node_id), ""), contributions.get(node_id, []), max_chars)
+        for node_id in ids
+    }
+
+
+def add_contributions(session: Session, items: List[Tuple[KnowledgeNode, str]], kind: str, source: Optional[str]) -> int:
+    """
+    Record new content for existing nodes and recompose their current text.
+    Content already stored as a revision of the node is skipped, so a
+    repeated input or a retried job adds nothing. Does not commit; returns
+    the number of revisions added.
+    """
+    items = [(node, content.strip()) for node, content in items if content and content.strip()]
+    if not items:
+        return 0
+    nodes = {node.id: node for node, _ in items}
+    with_history = set(session.execute(
+        select(NodeRevision.node_id).where(NodeRevision.node_id.in_(list(nodes))).distinct()
+    ).scalars().all())
+    stored = set(session.execute(
+        select(NodeRevision.node_id, NodeRevision.content)
+        .where(NodeRevision.node_id.in_(list(nodes)), NodeRevision.content.in_({content for _, content in items}))
+    ).all())
+
+    fresh = []
+    for node, content in items:
+        if (node.id, content) in stored:
+            continue
+        if node.id not in with_history and content in (node.content or ""):
+            # Node from before revisions were kept: its text already has it
+            continue
+        stored.add((node.id, content))
+        fresh.append((node, content))
+    if not fresh:
+        return 0
+
+    now = datetime.utcnow()
+    touched = {node.id: node for node, _ in fresh}
+    rows = [
+        # Node from before revisions were kept: its current text becomes the base
+        {"node_id": node.id, "kind": "create", "content": node.content or "", "source": node.source,
+         "created_at": node.created_at or now}
+        for node in touched.values() if node.id not in with_history
+    ]
+    rows += [
+        {"node_id": node.id, "kind": kind, "content": content, "source": source, "created_at": now}
+        for node, content in fresh
+    ]
+    record_revisions(session, rows)
+    composed = compose_many(session, touched)
+    for node in touched.values():
+        node.content = composed[node.id]
+        session.add(node)
+    return len(fresh)
+
+
+def migrate_inline_revisions(batch_size: int = 200) -> int:
+    """
+    Move the "--- [Updated ...] ---" / "--- [摘录 ...] ---" blocks that older
+    versions appended to node content into revisions and recompose those
+    nodes. Nodes that already have revisions are left alone, so this is
+    safe to run at every startup. Returns the number of nodes migrated.
+    """
+    migrated = 0
+    last_id = 0
+    with Session(engine) as session:
+        while True:
+            nodes = session.exec(
+                select(KnowledgeNode)
+                .where(KnowledgeNode.id > last_id, KnowledgeNode.content.contains("--- ["))
+                .order_by(KnowledgeNode.id)
+                .limit(batch_size)
+            ).all()
+            if not nodes:
+                break
+            last_id = nodes[-1].id
+            with_history = set(session.execute(
+                select(NodeRevision.node_id).where(NodeRevision.node_id.in_([n.id for n in nodes])).distinct()
+            ).scalars().all())
+
+            rows = []
+            touched = []
+            for node in nodes:
+                parts = _INLINE_MARKER.split(node.content)
+                if node.id in with_history or len(parts) == 1:
+                    continue
+                rows.append({"node_id": node.id, "kind": "create", "content": parts[0].strip(),
+                             "source": node.source, "created_at": node.created_at})
+                for i in range(1, len(parts), 3):
+                    marker, day, text = parts[i:i + 3]
+                    rows.append({"node_id": node.id, "kind": _MARKER_KINDS[marker], "content": text.strip(),
+                                 "created_at": datetime.strptime(day, "%Y-%m-%d")})
+                touched.append(node)
+            if not touched:
+                continue
+
+            record_revisions(session, rows)
+            composed = compose_many(session, [node.id for node in touched])
+            for node in touched:
+                node.content = composed[node.id]
+                session.add(node)
+            session.commit()
+            migrated += len(touched)
+
+    if migrated:
+        print(f"[NodeRevisions] Moved inline history of {migrated} nodes into revisions")
+    return migrated
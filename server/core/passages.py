@@ -0,0 +1,96 @@
+"""
+Passage Index for Long Documents
+Library items can be tens of thousands of characters, far beyond what the
+embedding model reads (512 tokens). Each item is split into overlapping
+passages that are indexed as separate documents; search ranks passages and
+groups them back by item so only the matching spans reach the prompt.
+
+A passage ID packs (item_id, passage number) into one int64 for FAISS. The
+chunker is deterministic, so a passage's character span is recovered by
+re-splitting the item text instead of storing offsets separately.
+"""
+from typing import Dict, List, Tuple
+
+PASSAGE_ID_BITS = 20
+MAX_PASSAGES_PER_ITEM = 1 << PASSAGE_ID_BITS
+
+# Preferred break points, strongest first
+_BREAKS = ("\n\n", "\n", "。", "！", "？", ". ", "! ", "? ", "；", "; ", "，", ", ", " ")
+
+
+def passage_id(item_id: int, number: int) -> int:
+    return (item_id << PASSAGE_ID_BITS) | number
+
+
+def split_passage_id(pid: int) -> Tuple[int, int]:
+    """Returns (item_id, passage number)."""
+    return pid >> PASSAGE_ID_BITS, pid & (MAX_PASSAGES_PER_ITEM - 1)
+
+
+def split_passages(text: str, size: int = 400, overlap: int = 80) -> List[Tuple[int, int]]:
+    """
+    Split text into overlapping (start, end) character spans of at most `size`.
+    A span ends at the strongest break point in its last quarter and the next
+    one starts at a break point inside the overlap, so passages rarely cut a
+    sentence in half.
+    """
+    if not text:
+        return []
+    size = max(size, 1)
+    overlap = min(max(overlap, 0), size // 2)
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            floor = start + size * 3 // 4
+            for sep in _BREAKS:
+                cut = text.rfind(sep, floor, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        spans.append((start, end))
+        if end >= len(text) or len(spans) >= MAX_PASSAGES_PER_ITEM:
+            break
+        # The next passage starts at a break point inside the overlap when there is one
+        next_start = max(end - overlap, start + 1)
+        for sep in _BREAKS:
+            cut = text.find(sep, next_start, end)
+            if cut != -1 and cut + len(sep) < end:
+                next_start = cut + len(sep)
+                break
+        start = next_start
+    return spans
+
+
+def group_passage_hits(results: List[Tuple[int, float]], max_items: int = 10,
+                       max_passages: int = 3) -> List[Tuple[int, float, List[int]]]:
+    """
+    Group ranked (passage_id, score) hits by item.
+    Items are ordered by their best passage; returns (item_id, best score, passage numbers).
+    """
+    groups: Dict[int, Tuple[float, List[int]]] = {}
+    for pid, score in results:
+        item_id, number = split_passage_id(pid)
+        if item_id not in groups:
+            if len(groups) >= max_items:
+                continue
+            groups[item_id] = (score, [])
+        numbers = groups[item_id][1]
+        if len(numbers) < max_passages:
+            numbers.append(number)
+    return [(item_id, score, numbers) for item_id, (score, numbers) in groups.items()]
+
+
+def excerpt(text: str, numbers: List[int], size: int = 400, overlap: int = 80, gap: str = "\n……\n") -> str:
+    """Text of the given passages in document order, with overlapping spans merged."""
+    spans = split_passages(text, size, overlap)
+    chosen = sorted(spans[n] for n in set(numbers) if n < len(spans))
+    merged: List[List[int]] = []
+    for start, end in chosen:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return gap.join(text[start:end].strip() for start, end in merged)
+
@@ -10,6 +10,91 @@ class Settings(BaseSettings):
     # Retrieval mode: "basic" (keyword) or "rag" (vector)
     retrieval_mode: Literal["basic", "rag"] = "rag"
     
+    # Vector index engine per store: "auto" (by size), "flat", "hnsw" or "ivfpq"
+    node_index_mode: Literal["auto", "flat", "hnsw", "ivfpq"] = "auto"
+    library_index_mode: Literal["auto", "flat", "hnsw", "ivfpq"] = "auto"
+    index_hnsw_threshold: int = 10000  # auto mode: HNSW from this many vectors
+    index_ivfpq_threshold: int = 100000  # auto mode: IVF-PQ from this many vectors
+    index_hnsw_m: int = 32
+    index_hnsw_ef_search: int = 64
+    index_ivf_nprobe: int = 16
+    # Threads that run embedding inference and index updates off the event loop
+    embedding_workers: int = 1
+    # Concurrent query embeddings are coalesced for up to this window / batch size
+    embedding_batch_window_ms: float = 5.0
+    embedding_batch_max_size: int = 32
+    # LRU caches inside each vector store
+    query_embedding_cache_size: int = 1024
+    search_result_cache_size: int = 512
+    # Reciprocal-rank fusion constant for hybrid (vector + BM25) retrieval
+    rrf_k: int = 60
+    # Library items are indexed as overlapping passages of this many characters
+    library_passage_chars: int = 400
+    library_passage_overlap: int = 80
+    # Token budget for the retrieved context in chat / library answers
+    context_token_budget: int = 4000
+    # Background ingest queue: concurrent jobs, attempts per job and first retry delay (doubles per attempt)
+    ingest_workers: int = 2
+    ingest_max_attempts: int = 3
+    ingest_retry_backoff_seconds: float = 5.0
+    # Node / library changes are indexed in the background this long after the first change
+    index_refresh_debounce_seconds: float = 1.0
+    # Concurrent background LLM calls (summarize / extract) across all ingest paths
+    llm_max_concurrency: int = 4
+    # Concurrent fetches per host while crawling
+    crawl_per_host_concurrency: int = 2
+    # Pause between request starts to the same host
+    crawl_politeness_delay_seconds: float = 0.25
+    # Shared crawler connection pool; HTTP/2 needs the h2 package (httpx[http2])
+    crawl_max_connections: int = 20
+    crawl_max_keepalive_connections: int = 10
+    crawl_keepalive_expiry_seconds: float = 30.0
+    crawl_http2: bool = False
+    crawl_timeout_seconds: float = 15.0
+    # Set to False only for sites with broken certificates
+    crawl_verify_ssl: bool = True
+    # On-disk cache of fetched pages: served without a request for the TTL,
+    # then revalidated with ETag / If-Modified-Since
+    http_cache_enabled: bool = True
+    http_cache_path: str = ".http_cache/pages.sqlite3"
+    http_cache_max_mb: int = 128
+    http_cache_ttl_seconds: int = 3600
+    # Bulk import: items in flight, items per DB transaction, items per request
+    ingest_batch_concurrency: int = 8
+    ingest_batch_commit_size: int = 20
+    ingest_batch_max_items: int = 1000
+    # Streamed extraction output is written and committed at least this often,
+    # or sooner once this many nodes/edges are buffered
+    ingest_write_interval_seconds: float = 1.0
+    ingest_write_batch_size: int = 50
+    # Labels with no normalized match are matched to the most similar existing
+    # label by embedding when the cosine similarity reaches the threshold
+    label_near_match: bool = False
+    label_near_match_threshold: float = 0.9
+    # Node content is the latest base text plus the newest contributions up to
+    # this many characters; every contribution is kept in the NodeRevision table
+    node_content_max_chars: int = 2000
+    # Long documents are split on Markdown headings / size into chunks for
+    # extraction and cleaning, processed this many at a time per document
+    extract_chunk_chars: int = 8000
+    summarize_chunk_chars: int = 12000
+    extract_chunk_concurrency: int = 4
+    # Optional cost cap: chunks extracted per document (0: all of them); the
+    # rest is not dropped silently but reported as incomplete in the result
+    extract_max_chunks: int = 0
+    # Crawled pages are cut at this many characters of Markdown
+    crawl_max_chars: int = 200000
+    # Bytes downloaded per HTML / text page (the rest is not read) and per
+    # PDF (larger ones are skipped); PDF text needs the optional pypdf package
+    crawl_max_bytes: int = 2 * 1024 * 1024
+    crawl_max_pdf_bytes: int = 20 * 1024 * 1024
+    # Processes converting HTML to Markdown (0: a thread in the server process)
+    html_extract_workers: int = 2
+    # On-disk cache of summarize / extract responses
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = ".llm_cache/responses.sqlite3"
+    llm_cache_max_mb: int = 256
+    
     OPENAI_TIMEOUT: int = 60
     OPENAI_MAX_RETRIES: int = 0
     
@@ -0,0 +1,165 @@
+"""
+Site Extractors
+Registry of site-specific extractors keyed by domain and URL path pattern.
+For a page from a registered site the article title and body are taken
+with a few precompiled CSS selectors on the already parsed lxml tree, and
+Readability is skipped entirely. Pages from other sites, and pages whose
+layout no longer matches the selectors, go through the generic pipeline
+in crawler.process_html_content.
+
+Selectors list the alternatives for a site's layouts in order; the first
+one that matches wins.
+"""
+import copy
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import lxml.html
+from lxml.cssselect import CSSSelector
+
+# A body with less text than this is treated as a layout mismatch
+MIN_TEXT_CHARS = 50
+# Always dropped from an extracted body
+ALWAYS_REMOVED = ("script", "style", "noscript", "iframe", "button")
+
+
+@dataclass
+class SiteExtractor:
+    name: str
+    domains: Tuple[str, ...]  # a domain also matches its subdomains
+    content: Tuple[str, ...]  # body selectors, first match wins
+    title: Tuple[str, ...] = ()  # title selectors; the page <title> otherwise
+    path: Optional[str] = None  # regex the URL path must match (search)
+    remove: Tuple[str, ...] = ()  # noise inside the body
+    max_items: int = 1  # >1 joins that many matches of the body selector (e.g. answers)
+
+    _content: List[CSSSelector] = field(default_factory=list, init=False, repr=False)
+    _title: List[CSSSelector] = field(default_factory=list, init=False, repr=False)
+    _remove: Optional[CSSSelector] = field(default=None, init=False, repr=False)
+    _path: Optional[re.Pattern] = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self._content = [CSSSelector(selector) for selector in self.content]
+        self._title = [CSSSelector(selector) for selector in self.title]
+        self._remove = CSSSelector(", ".join(ALWAYS_REMOVED + self.remove))
+        self._path = re.compile(self.path) if self.path else None
+
+    def matches(self, host: str, path: str) -> bool:
+        if not any(host == domain or host.endswith("." + domain) for domain in self.domains):
+            return False
+        return self._path is None or self._path.search(path) is not None
+
+    def extract(self, doc) -> Optional[Tuple[Optional[str], str]]:
+        """(title, body HTML) from a parsed page, or None if the selectors find no article."""
+        nodes = []
+        for selector in self._content:
+            nodes = selector(doc)[:self.max_items]
+            if nodes:
+                break
+        if not nodes:
+            return None
+        # Noise is dropped from copies: on a mismatch the generic path gets the page untouched
+        nodes = [copy.deepcopy(node) for node in nodes]
+        for node in nodes:
+            for element in self._remove(node):
+                element.drop_tree()
+        if sum(len(node.text_content().strip()) for node in nodes) < MIN_TEXT_CHARS:
+            return None
+
+        title = None
+        for selector in self._title:
+            found = selector(doc)
+            if found:
+                title = " ".join(found[0].text_content().split()) or None
+                if title:
+                    break
+        return title, "".join(lxml.html.tostring(node, encoding="unicode") for node in nodes)
+
+
+class SiteExtractorRegistry:
+    def __init__(self):
+        self._extractors: List[SiteExtractor] = []
+        self._by_name: Dict[str, SiteExtractor] = {}
+
+    def register(self, extractor: SiteExtractor):
+        """Add an extractor; one registered later for the same name replaces it."""
+        if extractor.name in self._by_name:
+            self._extractors.remove(self._by_name[extractor.name])
+        self._extractors.append(extractor)
+        self._by_name[extractor.name] = extractor
+
+    def find(self, url: str) -> Optional[SiteExtractor]:
+        if not url:
+            return None
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        for extractor in self._extractors:
+            if extractor.matches(host, parts.path or "/"):
+                return extractor
+        return None
+
+    def extract(self, doc, url: str) -> Optional[Tuple[str, Optional[str], str]]:
+        """(extractor name, title, body HTML) for a page from a registered site, else None."""
+        extractor = self.find(url)
+        if extractor is None:
+            return None
+        result = extractor.extract(doc)
+        return (extractor.name, *result) if result is not None else None
+
+    def names(self) -> List[str]:
+        return [extractor.name for extractor in self._extractors]
+
+
+# Singleton instance
+site_extractors = SiteExtractorRegistry()
+
+site_extractors.register(SiteExtractor(
+    name="zhihu_column",
+    domains=("zhuanlan.zhihu.com",),
+    path=r"^/p/\d+",
+    title=(".Post-Title", "h1"),
+    content=(".Post-RichTextContainer .RichText", ".Post-RichText", ".RichText"),
+))
+site_extractors.register(SiteExtractor(
+    name="zhihu_answer",
+    domains=("zhihu.com",),
+    path=r"^/question/\d+",
+    title=(".QuestionHeader-title", "h1"),
+    # An answer page shows that answer first; a question page lists several
+    content=(".AnswerItem .RichContent-inner", ".RichContent-inner", ".RichText"),
+    remove=(".ContentItem-actions", ".RichContent-actions"),
+    max_items=5,
+))
+site_extractors.register(SiteExtractor(
+    name="wechat",
+    domains=("mp.weixin.qq.com",),
+    path=r"^/s",
+    title=("#activity-name", ".rich_media_title"),
+    content=("#js_content", ".rich_media_content"),
+))
+site_extractors.register(SiteExtractor(
+    name="juejin",
+    domains=("juejin.cn",),
+    path=r"^/post/",
+    title=(".article-title", "h1"),
+    content=("#article-root .markdown-body", ".article-viewer", "#article-root"),
+))
+site_extractors.register(SiteExtractor(
+    name="csdn",
+    domains=("blog.csdn.net",),
+    path=r"/article/details/",
+    title=("#articleContentId", ".title-article"),
+    content=("#content_views", "#article_content"),
+    remove=(".hide-preCode-box", ".signin"),
+))
+site_extractors.register(SiteExtractor(
+    name="wikipedia",
+    domains=("wikipedia.org",),
+    path=r"^/wiki/",
+    title=("#firstHeading",),
+    content=("#mw-content-text .mw-parser-output",),
+    remove=(".mw-editsection", ".reference", ".reflist", ".navbox", ".metadata",
+            ".noprint", "#toc", ".toc", ".mw-references-wrap", ".hatnote"),
+))
@@ -0,0 +1,77 @@
+"""
+Task Graph
+Runs a small set of async stages, each as soon as the stages it depends on
+have finished, so independent stages overlap. If any stage fails, the
+stages still running are cancelled and the first error is raised.
+Wall-clock time of every finished stage is recorded.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+
+@dataclass
+class Stage:
+    name: str
+    # Called with the results of its dependencies, in order
+    fn: Callable[..., Awaitable[Any]]
+    deps: Sequence[str] = ()
+
+
+@dataclass
+class GraphResult:
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+async def run_graph(stages: List[Stage],
+                    on_stage_done: Optional[Callable[[str, int, int], Awaitable[None]]] = None) -> GraphResult:
+    """
+    Execute the stages respecting dependencies.
+    on_stage_done(name, finished_count, total) is awaited after each stage completes.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    out = GraphResult()
+    running: Dict[asyncio.Task, str] = {}
+    pending = list(stages)
+
+    async def timed(stage: Stage):
+        start = time.perf_counter()
+        try:
+            return await stage.fn(*[out.results[dep] for dep in stage.deps])
+        finally:
+            out.timings_ms[stage.name] = round((time.perf_counter() - start) * 1000, 1)
+
+    def launch_ready():
+        for stage in list(pending):
+            if all(dep in out.results for dep in stage.deps):
+                pending.remove(stage)
+                running[asyncio.create_task(timed(stage))] = stage.name
+
+    try:
+        launch_ready()
+        if pending and not running:
+            raise ValueError("Stage graph has a dependency cycle")
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                # Raises the stage's exception; the finally block cancels the rest
+                out.results[name] = task.result()
+                if on_stage_done is not None:
+                    await on_stage_done(name, len(out.results), len(stages))
+            launch_ready()
+            if pending and not running:
+                raise ValueError("Stage graph has a dependency cycle")
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    return out
@@ -0,0 +1,158 @@
+"""
+Keyword Index for Retrieval
+An incrementally maintained inverted index with BM25 scoring. CJK text has no
+spaces, so runs of CJK characters are indexed as overlapping character bigrams.
+Results can be fused with vector search through reciprocal-rank fusion.
+"""
+import re
+import math
+import heapq
+import hashlib
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# CJK ideographs, kana and hangul are tokenized as character n-grams
+_CJK_CLASS = "[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]"
+_TOKEN_RE = re.compile(_CJK_CLASS + r"+|[a-z0-9]+(?:[._+#-][a-z0-9]+)*")
+_CJK_RE = re.compile(_CJK_CLASS)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased words for Latin text; overlapping bigrams for CJK runs
+    (a lone CJK character is kept as a unigram).
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for match in _TOKEN_RE.finditer(text):
+        run = match.group(0)
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        elif len(run) > 1 or run.isdigit():
+            tokens.append(run)
+    return tokens
+
+
+def reciprocal_rank_fusion(*ranked_lists: List[Tuple[int, float]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse ranked (id, score) lists: score(d) = sum over lists of 1 / (k + rank).
+    Only ranks matter, so lists with incomparable scores can be combined.
+    """
+    fused: Dict[int, float] = {}
+    for ranked in ranked_lists:
+        for rank, (doc_id, _) in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75, label_boost: int = 3):
+        self.k1 = k1
+        self.b = b
+        # Label tokens are counted this many times, mirroring the old "label match = 3 points"
+        self.label_boost = label_boost
+
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {doc_id: term frequency}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._doc_hash: Dict[int, str] = {}
+        self._total_len = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._doc_len
+
+    def doc_ids(self) -> List[int]:
+        return list(self._doc_len.keys())
+
+    @staticmethod
+    def _hash(label: str, content: str) -> str:
+        return hashlib.sha1(f"{label}\x00{content}".encode('utf-8')).hexdigest()
+
+    # ---------- Maintenance ----------
+
+    def upsert(self, doc_id: int, label: str, content: str):
+        """Index or re-index one document; unchanged documents are skipped."""
+        doc_hash = self._hash(label or "", content or "")
+        with self._lock:
+            if self._doc_hash.get(doc_id) == doc_hash:
+                return
+            self._remove(doc_id)
+            terms = Counter(tokenize(label) * self.label_boost + tokenize(content))
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            length = sum(terms.values())
+            self._doc_terms[doc_id] = terms
+            self._doc_len[doc_id] = length
+            self._doc_hash[doc_id] = doc_hash
+            self._total_len += length
+
+    def remove(self, doc_id: int):
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id: int):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        self._doc_hash.pop(doc_id, None)
+
+    def sync(self, docs: Iterable[dict]):
+        """
+        Reconcile with the full document set: index new/changed docs, drop missing ones.
+        docs: dicts with 'id', 'label', 'content' keys
+        """
+        with self._lock:
+            seen = set()
+            for doc in docs:
+                seen.add(doc['id'])
+                self.upsert(doc['id'], doc.get('label') or "", doc.get('content') or "")
+            for doc_id in [d for d in self._doc_len if d not in seen]:
+                self._remove(doc_id)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._doc_hash.clear()
+            self._total_len = 0
+
+    # ---------- Query ----------
+
+    def search(self, query: str, top_k: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """BM25 top-k over documents containing at least one query term."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._doc_len)
+            if not terms or n == 0:
+                return []
+            avg_len = self._total_len / n
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(doc_id, score) for doc_id, score in top if score > min_score]
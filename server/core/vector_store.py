@@ -4,10 +4,24 @@ Uses sentence-transformers for embeddings and FAISS for similarity search.
 """
 import os
 import json
+import time
+import hashlib
+import functools
+import threading
+import unicodedata
 import numpy as np
 from typing import List, Tuple, Optional
 from pathlib import Path
 
+from .embedding_store import EmbeddingStore
+from .index_engine import IndexEngine, INDEX_FLAT, choose_index_kind, recall_at_k
+from .settings import settings
+from .embedding_service import run_in_embedding_pool
+from .lru_cache import LRUCache
+from .text_index import BM25Index, reciprocal_rank_fusion
+
+EMPTY_HASH = "0" * 40
+
 # Lazy imports to avoid startup delay
 _model = None
 _faiss = None
@@ -50,6 +64,12 @@ def get_embedding_model():
         print("[VectorStore] Model loaded successfully.")
     return _model
 
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Encode a batch of short texts (queries) without a progress bar."""
+    model = get_embedding_model()
+    embeddings = model.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    return np.asarray(embeddings, dtype='float32')
+
 def get_faiss():
     """Lazy load FAISS."""
     global _faiss
@@ -59,74 +79,142 @@ def get_faiss():
     return _faiss
 
 
+def _synchronized(method):
+    """Serialize access to the index and store across embedding pool threads."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class VectorStore:
-    def __init__(self, cache_dir: str = ".vector_cache"):
+    # Minimum seconds between writes of a persisted (HNSW / IVF-PQ) index
+    ANN_SAVE_INTERVAL = 30.0
+
+    def __init__(self, cache_dir: str = ".vector_cache", index_mode: str = "auto"):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
-        self.index_path = self.cache_dir / "faiss.index"
-        self.meta_path = self.cache_dir / "meta.json"
+        # "auto", "flat", "hnsw" or "ivfpq"
+        self.index_mode = index_mode
         
-        # New: Persistent embedding cache file
-        self.embeddings_path = self.cache_dir / "embeddings.npz"
+        # Persistent embedding cache: append-only memory-mapped store
+        self.embeddings = EmbeddingStore(self.cache_dir / "embeddings")
+        # Only indexes that are expensive to rebuild (trained or graph-based) are persisted
+        self.ann_index_path = self.cache_dir / "ann.index"
+        self.ann_meta_path = self.cache_dir / "ann.json"
+        self._last_ann_save = 0.0
         
-        self.index = None
-        self.node_ids: List[int] = []  # Maps index position to node ID
-        self.cached_embeddings: dict = {}  # id -> np.ndarray (Cache of ALL known embeddings)
+        self.index: Optional[IndexEngine] = None
+        self.node_ids: List[int] = []  # Node IDs currently present in the index
+        self._lock = threading.RLock()
+        
+        # Bumped on every index mutation; part of the result cache key
+        self.index_version = 0
+        # Level 1: normalized query text -> embedding. Level 2: (query, top_k, version) -> results
+        self._query_cache = LRUCache(settings.query_embedding_cache_size)
+        self._result_cache = LRUCache(settings.search_result_cache_size)
+        # Keyword side of hybrid retrieval; kept in memory and synced with the index
+        self.text_index = BM25Index()
         
         self._load_cache()
     
     def _load_cache(self):
-        """Load existing index, metadata, and embedding cache from disk."""
-        faiss = get_faiss()
+        """Open the embedding store and load or build the active index from it."""
+        self._migrate_legacy_files()
+        self.embeddings.reload()
+        print(f"[VectorStore] Loaded {len(self.embeddings)} cached embeddings")
         
-        # 1. Load FAISS Index and Meta (for current serving)
-        if self.index_path.exists() and self.meta_path.exists():
-            try:
-                self.index = faiss.read_index(str(self.index_path))
-                with open(self.meta_path, 'r', encoding='utf-8') as f:
-                    meta = json.load(f)
-                    self.node_ids = meta.get('node_ids', [])
-                print(f"[VectorStore] Loaded active index with {len(self.node_ids)} vectors")
-            except Exception as e:
-                print(f"[VectorStore] Failed to load index/meta: {e}")
-                self.index = None
-                self.node_ids = []
+        self.index = None
+        self.node_ids = []
+        if not len(self.embeddings):
+            return
+        if not self._load_ann_index():
+            self._rebuild_index()
 
-        # 2. Load Embedding Cache (Persistent storage)
-        if self.embeddings_path.exists():
-            try:
-                # Allow_pickle=True might be needed if object arrays, but numeric shouldn't need it
-                data = np.load(str(self.embeddings_path))
-                ids = data['ids']
-                vectors = data['vectors']
-                self.cached_embeddings = {int(nid): vec for nid, vec in zip(ids, vectors)}
-                print(f"[VectorStore] Loaded {len(self.cached_embeddings)} cached embeddings")
-            except Exception as e:
-                print(f"[VectorStore] Failed to load embedding cache: {e}")
-                self.cached_embeddings = {}
-
-    def _save_cache(self):
-        """Save active index and metadata to disk."""
-        if self.index is not None:
-            faiss = get_faiss()
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.meta_path, 'w', encoding='utf-8') as f:
-                json.dump({'node_ids': self.node_ids}, f)
-
-    def _save_embeddings(self):
-        """Save embedding cache to disk."""
-        if not self.cached_embeddings:
+    def _load_ann_index(self) -> bool:
+        """Load a persisted ANN index if it still matches the embedding store and the chosen kind."""
+        if not self.ann_index_path.exists() or not self.ann_meta_path.exists():
+            return False
+        try:
+            with open(self.ann_meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('store_version') != self.embeddings.version_token() or meta['kind'] != self._desired_kind():
+                print("[VectorStore] Persisted ANN index is out of date, rebuilding")
+                return False
+            self.index = IndexEngine.load(str(self.ann_index_path), meta, **self._engine_params())
+            self.node_ids = sorted(self.embeddings.ids())
+            print(f"[VectorStore] Loaded {self.index.kind} index with {self.index.ntotal} vectors")
+            return True
+        except Exception as e:
+            print(f"[VectorStore] Failed to load ANN index: {e}")
+            self.index = None
+            return False
+
+    def _persist_index(self, force: bool = False):
+        """Save HNSW / IVF-PQ indexes (throttled); flat indexes are rebuilt from the store instead."""
+        if self.index is None or self.index.kind == INDEX_FLAT:
+            for path in (self.ann_index_path, self.ann_meta_path):
+                if path.exists():
+                    os.remove(path)
+            return
+        if not force and time.monotonic() - self._last_ann_save < self.ANN_SAVE_INTERVAL:
             return
-        
-        ids = np.array(list(self.cached_embeddings.keys()), dtype=int)
-        # Ensure vectors are same shape, though they should be
-        vectors = np.array(list(self.cached_embeddings.values()), dtype='float32')
-        
         try:
-            np.savez_compressed(str(self.embeddings_path), ids=ids, vectors=vectors)
-            # print("[VectorStore] Embedding cache saved")
+            self.index.save(str(self.ann_index_path))
+            meta = self.index.state()
+            meta['store_version'] = self.embeddings.version_token()
+            with open(self.ann_meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            self._last_ann_save = time.monotonic()
         except Exception as e:
-            print(f"[VectorStore] Failed to save embedding cache: {e}")
+            print(f"[VectorStore] Failed to save ANN index: {e}")
+
+    def _desired_kind(self) -> str:
+        return choose_index_kind(
+            len(self.embeddings), self.index_mode,
+            hnsw_threshold=settings.index_hnsw_threshold,
+            ivfpq_threshold=settings.index_ivfpq_threshold,
+        )
+
+    def _engine_params(self) -> dict:
+        return {
+            'hnsw_m': settings.index_hnsw_m,
+            'hnsw_ef_search': settings.index_hnsw_ef_search,
+            'ivf_nprobe': settings.index_ivf_nprobe,
+        }
+
+    @_synchronized
+    def set_index_mode(self, index_mode: str):
+        """Switch the index engine mode and rebuild if the concrete kind changes."""
+        self.index_mode = index_mode
+        if self.index is not None and self.index.kind != self._desired_kind():
+            self._rebuild_index()
+
+    def _migrate_legacy_files(self):
+        """Import an embeddings.npz written by older versions and drop the old index files."""
+        legacy_embeddings = self.cache_dir / "embeddings.npz"
+        if legacy_embeddings.exists():
+            try:
+                data = np.load(str(legacy_embeddings))
+                ids = [int(nid) for nid in data['ids']]
+                # Caches written before content hashing have no hashes; an all-zero
+                # digest never matches, so those nodes are re-embedded once.
+                if 'hashes' in data.files:
+                    hashes = [str(h) or EMPTY_HASH for h in data['hashes']]
+                else:
+                    hashes = [EMPTY_HASH] * len(ids)
+                self.embeddings.put_many(ids, data['vectors'], hashes)
+                print(f"[VectorStore] Migrated {len(ids)} embeddings from embeddings.npz")
+            except Exception as e:
+                print(f"[VectorStore] Failed to migrate embedding cache: {e}")
+            os.remove(legacy_embeddings)
+
+        # The flat index is rebuilt from the store on load, so these are no longer written
+        for name in ("faiss.index", "meta.json"):
+            legacy_path = self.cache_dir / name
+            if legacy_path.exists():
+                os.remove(legacy_path)
 
     def embed_text(self, text: str) -> np.ndarray:
         """Generate embedding for a single text."""
@@ -140,80 +228,142 @@ class VectorStore:
         embeddings = model.encode(texts, normalize_embeddings=True, show_progress_bar=True)
         return embeddings.astype('float32')
     
+    @staticmethod
+    def _node_text(label: str, content: str) -> str:
+        """Text that is embedded for a node."""
+        return f"{label}: {content}"
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _bump_version(self):
+        """Invalidate cached search results after the index changed."""
+        self.index_version += 1
+        self._result_cache.clear()
+
+    def _rebuild_index(self):
+        """Reconstruct the whole index from the embedding store."""
+        self._bump_version()
+        vectors, ids = self.embeddings.live_matrix()
+        if len(ids) == 0:
+            print("[VectorStore] No valid vectors to index.")
+            self.index = None
+            self.node_ids = []
+            self._persist_index()
+            return
+
+        kind = self._desired_kind()
+        print(f"[VectorStore] Reconstructing {kind} index for {len(ids)} nodes...")
+        self.index = IndexEngine(kind, vectors.shape[1], **self._engine_params())
+        # vectors is the memory-mapped buffer itself when the store has no tombstones
+        self.index.build(vectors, ids)
+        self.node_ids = sorted(int(nid) for nid in ids)
+        self._persist_index(force=True)
+        print(f"[VectorStore] Index updated. Total vectors: {self.index.ntotal}")
+
+    def _apply_index_changes(self, upsert_ids: List[int], remove_ids: List[int]):
+        """
+        Apply a delta to the live index without reconstructing it.
+        upsert_ids: IDs whose stored embedding should be (re)inserted.
+        remove_ids: IDs to drop from the index.
+        """
+        self._bump_version()
+        indexed = set(self.node_ids)
+        stale = [nid for nid in set(upsert_ids) | set(remove_ids) if nid in indexed]
+        if stale:
+            self.index.remove(np.array(stale, dtype='int64'))
+            indexed.difference_update(stale)
+
+        vectors, fresh = self.embeddings.get_many(dict.fromkeys(upsert_ids))
+        if len(fresh):
+            self.index.add(vectors, fresh)
+            indexed.update(int(nid) for nid in fresh)
+
+        self.node_ids = sorted(indexed)
+        print(f"[VectorStore] Index delta applied (+{len(fresh)} / -{len(stale)}). Total vectors: {self.index.ntotal}")
+
+        # Growth may cross an auto-selection threshold, and HNSW tombstones or
+        # IVF centroid drift eventually call for a fresh build.
+        if self.index.kind != self._desired_kind() or self.index.needs_rebuild():
+            self._rebuild_index()
+        else:
+            self._persist_index()
+
+    @_synchronized
     def build_index(self, nodes: List[dict], force_rebuild: bool = False):
         """
-        Incrementally build/update FAISS index.
-        Only computes embeddings for new IDs.
+        Incrementally build/update FAISS index against the full node set.
+        Computes embeddings only for new nodes or nodes whose content hash changed,
+        then applies the added/changed/removed vectors to the live index.
         nodes: List of dicts with 'id', 'label', 'content' keys
         """
         if not nodes:
             print("[VectorStore] No nodes to index")
             return
         
-        # 1. Identify what needs embedding
-        nodes_to_embed = []
-        target_ids = []
+        self.text_index.sync(nodes)
         
+        # Embeddings of nodes that no longer exist become tombstones
+        target_ids = {node['id'] for node in nodes}
+        removed_ids = [nid for nid in self.embeddings.ids() if nid not in target_ids]
+        self._apply_documents(nodes, removed_ids, force_rebuild)
+
+    @_synchronized
+    def upsert_nodes(self, nodes: List[dict]):
+        """Add or update only the given nodes (no reconciliation against the full set)."""
+        for node in nodes:
+            self.text_index.upsert(node['id'], node['label'], node['content'])
+        self._apply_documents(nodes, [])
+
+    @_synchronized
+    def remove_nodes(self, node_ids: List[int]):
+        """Drop nodes from the keyword index, the embedding store and the live index."""
+        for nid in node_ids:
+            self.text_index.remove(nid)
+        self._apply_documents([], list(node_ids))
+
+    def _apply_documents(self, nodes: List[dict], removed_ids: List[int], force_rebuild: bool = False):
+        # 1. Identify what needs embedding
+        nodes_to_embed = {}
         for node in nodes:
             nid = node['id']
-            target_ids.append(nid)
-            
-            # Check if we need to compute embedding
-            # Current simplified logic: If ID exists in cache, assume content hasn't changed.
-            # (TODO: Add content hash check for editing support)
-            if nid not in self.cached_embeddings:
-                nodes_to_embed.append(node)
-        
-        target_ids.sort()
+            text = self._node_text(node['label'], node['content'])
+            content_hash = self._content_hash(text)
+            if self.embeddings.get_hash(nid) != content_hash:
+                nodes_to_embed[nid] = (text, content_hash)
         
-        # 2. Compute missing embeddings
+        # 2. Compute missing or stale embeddings and append them to the store
         if nodes_to_embed:
             print(f"[VectorStore] Computing embeddings for {len(nodes_to_embed)} new/modified nodes...")
-            texts = [f"{n['label']}: {n['content']}" for n in nodes_to_embed]
-            
-            new_embeddings = self.embed_batch(texts)
-            
-            for i, node in enumerate(nodes_to_embed):
-                self.cached_embeddings[node['id']] = new_embeddings[i]
-            
-            # Persist the updated cache immediately
-            self._save_embeddings()
-        else:
-            # print("[VectorStore] No new embeddings needed.")
-            pass
+            embed_ids = list(nodes_to_embed)
+            new_embeddings = self.embed_batch([nodes_to_embed[nid][0] for nid in embed_ids])
+            self.embeddings.put_many(embed_ids, new_embeddings, [nodes_to_embed[nid][1] for nid in embed_ids])
 
-        # 3. Check if Index needs update
-        # If the set of NIDs in current index matches target IDs, we are good.
-        if not force_rebuild and self.index is not None and self.node_ids == target_ids:
+        if removed_ids:
+            self.embeddings.delete_many(removed_ids)
+
+        # 3. Full reconstruction only when there is no usable index yet
+        if force_rebuild or self.index is None:
+            if len(self.embeddings) or self.index is not None:
+                self._rebuild_index()
             return
-        
-        # 4. Reconstruct FAISS Index
-        # Rebuilding IndexFlatIP is extremely fast (millisecs for <100k nodes)
-        # compared to embedding. This handles additions and deletions cleanly.
-        print(f"[VectorStore] Reconstructing FAISS index for {len(target_ids)} nodes...")
-        
-        valid_vectors = []
-        valid_ids = []
-        
-        for nid in target_ids:
-            if nid in self.cached_embeddings:
-                valid_vectors.append(self.cached_embeddings[nid])
-                valid_ids.append(nid)
-        
-        if not valid_vectors:
-            print("[VectorStore] No valid vectors to index.")
+
+        # 4. Otherwise apply only the delta
+        indexed = set(self.node_ids)
+        # IDs with a valid stored embedding that are simply missing from the index
+        upsert_ids = list(nodes_to_embed) + [
+            node['id'] for node in nodes
+            if node['id'] not in indexed and node['id'] not in nodes_to_embed and node['id'] in self.embeddings
+        ]
+        removed_ids = [nid for nid in removed_ids if nid in indexed]
+        if not upsert_ids and not removed_ids:
             return
+        self._apply_index_changes(upsert_ids, removed_ids)
 
-        vectors_array = np.stack(valid_vectors)
-        
-        faiss = get_faiss()
-        dimension = vectors_array.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)
-        self.index.add(vectors_array)
-        self.node_ids = valid_ids
-        
-        self._save_cache()
-        print(f"[VectorStore] Index updated. Total vectors: {self.index.ntotal}")
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", query).split())
 
     def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
         """
@@ -223,62 +373,154 @@ class VectorStore:
         if self.index is None or self.index.ntotal == 0:
             return []
         
+        key = self._normalize_query(query)
+        version = self.index_version
+        cached = self._result_cache.get((key, top_k, version))
+        if cached is not None:
+            return list(cached)
+        
         # Embed query
-        query_embedding = self.embed_text(query).reshape(1, -1)
+        query_embedding = self._query_cache.get(key)
+        if query_embedding is None:
+            query_embedding = self.embed_text(key)
+            self._query_cache.put(key, query_embedding)
+        
+        results = self.search_by_vector(query_embedding, top_k)
+        self._result_cache.put((key, top_k, version), results)
+        return list(results)
+
+    def keyword_search(self, query: str, top_k: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """BM25 search over the in-memory keyword index (no embedding model needed)."""
+        return self.text_index.search(query, top_k, min_score=min_score)
+
+    def hybrid_search(self, query: str, top_k: int = 10, min_vector_score: float = 0.0,
+                      min_keyword_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Vector and BM25 results fused by reciprocal rank.
+        Returns: List of (node_id, fused_score) tuples
+        """
+        candidates = top_k * 2
+        vector_results = [r for r in self.search(query, candidates) if r[1] > min_vector_score]
+        keyword_results = self.keyword_search(query, candidates, min_score=min_keyword_score)
+        return reciprocal_rank_fusion(vector_results, keyword_results, k=settings.rrf_k)[:top_k]
+
+    @_synchronized
+    def search_by_vector(self, query_embedding: np.ndarray, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Search with an already computed query embedding."""
+        if self.index is None or self.index.ntotal == 0:
+            return []
         
         # Search
-        scores, indices = self.index.search(query_embedding, min(top_k, self.index.ntotal))
+        scores, indices = self.index.search(query_embedding.reshape(1, -1), min(top_k, self.index.ntotal))
         
-        # Map indices to node IDs
+        # The index stores node IDs directly; -1 marks an empty slot
         results = []
-        for idx, score in zip(indices[0], scores[0]):
-            if idx < len(self.node_ids) and idx >= 0:
-                results.append((self.node_ids[idx], float(score)))
+        for nid, score in zip(indices[0], scores[0]):
+            if nid >= 0:
+                results.append((int(nid), float(score)))
         
         return results
     
     def add_node(self, node_id: int, label: str, content: str):
         """
-        Add a single node.
-        Updates cache and effectively rebuilds index via build_index logic 
-        (or shortcut if we trust self.index).
+        Add or update a single node.
+        Re-embeds only if the content hash changed and applies it to the live index.
         """
-        # For consistency, we reuse build_index logic indirectly or 
-        # manually update. Simplest is just caching it and adding to current index.
+        self.upsert_nodes([{"id": node_id, "label": label, "content": content}])
+    
+    # ---------- Async variants (run on the embedding thread pool) ----------
+
+    async def embed_text_async(self, text: str) -> np.ndarray:
+        # Coalesced with other concurrent queries into one encode() call
+        from .embedding_batcher import get_query_batcher
+        return await get_query_batcher().embed(text)
+
+    async def embed_batch_async(self, texts: List[str]) -> np.ndarray:
+        return await run_in_embedding_pool(self.embed_batch, texts)
+
+    async def search_async(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        if self.index is None or self.index.ntotal == 0:
+            return []
         
-        text = f"{label}: {content}"
-        embedding = self.embed_text(text) # 1D array
+        key = self._normalize_query(query)
+        version = self.index_version
+        cached = self._result_cache.get((key, top_k, version))
+        if cached is not None:
+            return list(cached)
         
-        # Update cache
-        self.cached_embeddings[node_id] = embedding
-        self._save_embeddings()
+        query_embedding = self._query_cache.get(key)
+        if query_embedding is None:
+            query_embedding = await self.embed_text_async(key)
+            self._query_cache.put(key, query_embedding)
         
-        # Update active Index
+        results = await run_in_embedding_pool(self.search_by_vector, query_embedding, top_k)
+        self._result_cache.put((key, top_k, version), results)
+        return list(results)
+
+    async def hybrid_search_async(self, query: str, top_k: int = 10, min_vector_score: float = 0.0,
+                                  min_keyword_score: float = 0.0) -> List[Tuple[int, float]]:
+        candidates = top_k * 2
+        vector_results = [r for r in await self.search_async(query, candidates) if r[1] > min_vector_score]
+        keyword_results = self.keyword_search(query, candidates, min_score=min_keyword_score)
+        return reciprocal_rank_fusion(vector_results, keyword_results, k=settings.rrf_k)[:top_k]
+
+    async def build_index_async(self, nodes: List[dict], force_rebuild: bool = False):
+        return await run_in_embedding_pool(self.build_index, nodes, force_rebuild)
+
+    async def add_node_async(self, node_id: int, label: str, content: str):
+        return await run_in_embedding_pool(self.add_node, node_id, label, content)
+
+    async def upsert_nodes_async(self, nodes: List[dict]):
+        return await run_in_embedding_pool(self.upsert_nodes, nodes)
+
+    async def remove_nodes_async(self, node_ids: List[int]):
+        return await run_in_embedding_pool(self.remove_nodes, node_ids)
+
+    async def recall_report_async(self, k: int = 10, num_queries: int = 100) -> dict:
+        return await run_in_embedding_pool(self.recall_report, k, num_queries)
+
+    @_synchronized
+    def flush(self):
+        """Write a pending ANN index to disk (called on shutdown)."""
+        self._persist_index(force=True)
+
+    def index_stats(self) -> dict:
+        """Describe the active index engine."""
+        return {
+            'mode': self.index_mode,
+            'kind': self.index.kind if self.index is not None else None,
+            'ntotal': self.index.ntotal if self.index is not None else 0,
+            'stored_embeddings': len(self.embeddings),
+            'index_version': self.index_version,
+        }
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the query embedding and search result caches."""
+        return {
+            'query_embeddings': self._query_cache.stats(),
+            'search_results': self._result_cache.stats(),
+        }
+
+    @_synchronized
+    def recall_report(self, k: int = 10, num_queries: int = 100) -> dict:
+        """Recall@k of the active index measured against an exact flat index."""
         if self.index is None:
-             # First time
-             faiss = get_faiss()
-             self.index = faiss.IndexFlatIP(embedding.shape[0])
-        
-        # Add to FAISS
-        self.index.add(embedding.reshape(1, -1))
-        self.node_ids.append(node_id)
-        self._save_cache()
+            return {'kind': None, 'k': k, 'queries': 0, 'recall': None}
+        vectors, ids = self.embeddings.live_matrix()
+        return recall_at_k(self.index, vectors, ids, k=k, num_queries=num_queries)
     
+    @_synchronized
     def clear(self):
         """Clear the index and the cache."""
         self.index = None
         self.node_ids = []
-        self.cached_embeddings = {}
-        
-        if self.index_path.exists():
-            os.remove(self.index_path)
-        if self.meta_path.exists():
-            os.remove(self.meta_path)
-        if self.embeddings_path.exists():
-            os.remove(self.embeddings_path)
+        self.embeddings.clear()
+        self.text_index.clear()
+        self._bump_version()
+        self._persist_index()
             
         print("[VectorStore] Index and cache cleared")
 
 
 # Singleton instance
-vector_store = VectorStore()
+vector_store = VectorStore(index_mode=settings.node_index_mode)
@@ -1,5 +1,6 @@
 from typing import Optional, List
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import event
 from datetime import datetime
 
 class KnowledgeNodeBase(SQLModel):
@@ -14,6 +15,7 @@ class KnowledgeNode(KnowledgeNodeBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     source: Optional[str] = Field(default=None) # URL or "User Input"
     last_reviewed_at: Optional[datetime] = Field(default=None)
+    updated_at: Optional[datetime] = Field(default=None, index=True) # Set on every insert/update, drives index sync
     
     # Relationships
     outgoing_edges: List["KnowledgeEdge"] = Relationship(back_populates="source_node", sa_relationship_kwargs={"primaryjoin": "KnowledgeNode.id==KnowledgeEdge.source_id"})
@@ -31,6 +33,15 @@ class KnowledgeEdge(KnowledgeEdgeBase, table=True):
     source_node: KnowledgeNode = Relationship(back_populates="outgoing_edges", sa_relationship_kwargs={"foreign_keys": "KnowledgeEdge.source_id"})
     target_node: KnowledgeNode = Relationship(back_populates="incoming_edges", sa_relationship_kwargs={"foreign_keys": "KnowledgeEdge.target_id"})
 
+class NodeRevision(SQLModel, table=True):
+    """One contribution to a node's content: its creation, a manual edit, an extraction update or a clip."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    node_id: int = Field(foreign_key="knowledgenode.id", index=True)
+    kind: str = Field(default="update")  # create / edit / update / clip
+    content: str
+    source: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class RawInput(SQLModel, table=True):
     """Stores original user inputs for the Knowledge Base."""
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -39,9 +50,57 @@ class RawInput(SQLModel, table=True):
     fetched_content: Optional[str] = None  # For URLs, the crawled content
     title: Optional[str] = None  # For URLs, the page title
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: Optional[datetime] = Field(default=None, index=True)  # Set on every insert/update, drives index sync
+    stage_timings: Optional[str] = None  # JSON: wall-clock ms per ingest stage (fetch, summarize, extract, save, total)
 
 class SystemConfig(SQLModel, table=True):
     """Stores system configuration (key-value pairs)"""
     key: str = Field(primary_key=True)
     value: str
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class IngestJob(SQLModel, table=True):
+    """A queued ingest request, processed by the background worker pool."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="queued", index=True)  # queued / running / succeeded / failed
+    stage: Optional[str] = None  # fetching / summarizing / extracting / saving
+    progress: float = Field(default=0.0)  # 0..1
+    payload: str  # JSON-encoded IngestRequest
+    result: Optional[str] = None  # JSON-encoded result on success
+    error: Optional[str] = None  # Last error message
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class DeletionLog(SQLModel, table=True):
+    """Records deleted rows so retrieval indexes can drop them without rescanning tables."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    table_name: str = Field(index=True)
+    row_id: int
+    deleted_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ---------- Change tracking ----------
+# Every ORM write path goes through these hooks, so retrieval can sync from
+# a high-water mark on updated_at plus the deletion log. Core bulk inserts
+# (NodeWriter in ingest_pipeline) set updated_at themselves.
+
+def _touch(mapper, connection, target):
+    target.updated_at = datetime.utcnow()
+
+def _log_deletion(mapper, connection, target):
+    connection.execute(
+        DeletionLog.__table__.insert().values(
+            table_name=mapper.local_table.name,
+            row_id=target.id,
+            deleted_at=datetime.utcnow(),
+        )
+    )
+
+for _tracked in (KnowledgeNode, RawInput):
+    event.listen(_tracked, "before_insert", _touch)
+    event.listen(_tracked, "before_update", _touch)
+    event.listen(_tracked, "after_delete", _log_deletion)
@@ -32,8 +32,45 @@ async def lifespan(app: FastAPI):
             print(f"Loaded {len(db_config)} settings from database.")
     except Exception as e:
         print(f"Warning: Could not load settings from DB on startup: {e}")
+
+    # Node content appended in-row by older versions -> NodeRevision rows
+    from .core.node_revisions import migrate_inline_revisions
+    migrate_inline_revisions()
+
+    # Pooled HTTP client shared by all URL fetches
+    from .core.crawler import crawler_client
+    crawler_client.start()
+
+    # Background ingest workers
+    from .core.ingest_queue import ingest_queue
+    ingest_queue.start()
+
+    # Write-behind indexing of node and library changes
+    from .core.index_refresher import index_refresher
+    from .core.index_sync import node_index_sync
+    from .api.library import get_library_index_sync
+    index_refresher.register("knowledgenode", "nodes", lambda: node_index_sync)
+    index_refresher.register("rawinput", "library", get_library_index_sync)
+    index_refresher.start()
         
     yield
+    
+    await ingest_queue.stop()
+    await index_refresher.stop()
+    await crawler_client.aclose()
+    
+    # Persist ANN indexes whose last delta was not written yet
+    from .core.vector_store import vector_store
+    from .api.library import get_library_vector_store
+    vector_store.flush()
+    library_store = get_library_vector_store(create=False)
+    if library_store is not None:
+        library_store.flush()
+    
+    from .core.embedding_service import shutdown_embedding_executor
+    shutdown_embedding_executor()
+    from .core.extraction_service import shutdown_extraction_executor
+    shutdown_extraction_executor()
 
 app = FastAPI(title="InfoSky API", version="0.1.0", lifespan=lifespan)
 
@@ -0,0 +1,150 @@
+import sys
+import os
+import re
+import time
+import asyncio
+import contextlib
+import glob
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from bs4 import BeautifulSoup
+from readability import Document as ReadabilityDocument
+
+from server.core.crawler import get_html2text_converter, process_html_content, process_html_content_async
+from server.core.extraction_service import shutdown_extraction_executor
+from server.core.settings import settings
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+ROUNDS = 5  # passes over the corpus per variant
+WORKERS = min(4, os.cpu_count() or 1)
+MAX_LENGTH_DRIFT = 0.02  # allowed relative difference in extracted length per page
+
+
+def baseline_process(html_content: str, url: str = "") -> str:
+    """The extraction this pipeline used before: Readability parses twice, BeautifulSoup re-parses its output."""
+    readability_doc = ReadabilityDocument(html_content)
+    readability_html = readability_doc.summary()
+    title = readability_doc.title() or "No Title"
+    main_content = BeautifulSoup(readability_html, "html.parser")
+    converter = get_html2text_converter()
+    if url:
+        converter.baseurl = url
+    markdown_content = re.sub(r'\n{3,}', '\n\n', converter.handle(str(main_content))).strip()
+    return f"Title: {title}\n\n{markdown_content}"
+
+
+def load_pages():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the extraction's progress prints, including those of the pool workers (they share fd 1)."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+def report(name: str, latencies: list, wall: float):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<12} pages/sec={len(latencies) / wall:7.1f}  "
+          f"p50={latencies[len(latencies) // 2] * 1000:7.1f} ms  p95={p95 * 1000:7.1f} ms")
+    return len(latencies) / wall
+
+
+def run_serial(process, pages):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for filename, html in pages:
+            t = time.perf_counter()
+            process(html, f"https://example.com/{filename}")
+            latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - start
+
+
+async def run_pool(pages):
+    # Spawn the workers and load the extraction modules in them outside the timing
+    await asyncio.gather(*[process_html_content_async(pages[0][1]) for _ in range(WORKERS)])
+
+    latencies = []
+    # Ticks of a 10 ms timer show whether the event loop stayed responsive
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def one(filename, html):
+        t = time.perf_counter()
+        await process_html_content_async(html, f"https://example.com/{filename}")
+        latencies.append(time.perf_counter() - t)
+
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*[one(filename, html) for _ in range(ROUNDS) for filename, html in pages])
+    wall = time.perf_counter() - start
+    done.set()
+    await tick_task
+    return latencies, wall, ticks
+
+
+def main():
+    pages = load_pages()
+    print(f"--- HTML extraction: {len(pages)} fixture pages x {ROUNDS} rounds "
+          f"({sum(len(html) for _, html in pages) / 1024:.0f} KB per round) ---")
+
+    # Same output as before, page by page
+    drifted = []
+    for filename, html in pages:
+        with quiet():
+            old = baseline_process(html)
+            new = process_html_content(html)
+        ratio = len(new) / len(old) if old else 0
+        print(f"  {filename:<22} legacy {len(old):6d} chars, single-pass {len(new):6d} chars ({ratio:.2f})")
+        if abs(ratio - 1) > MAX_LENGTH_DRIFT:
+            drifted.append(filename)
+
+    with quiet():
+        baseline = run_serial(baseline_process, pages)
+        single = run_serial(process_html_content, pages)
+        settings.html_extract_workers = WORKERS
+        try:
+            *pooled, ticks = asyncio.run(run_pool(pages))
+        finally:
+            shutdown_extraction_executor()
+
+    baseline_rate = report("legacy", *baseline)
+    single_rate = report("single-pass", *single)
+    pool_rate = report(f"pool x{WORKERS}", *pooled)
+    print(f"{'':<12} event loop ticks during pool run: {ticks} of ~{int(pooled[1] / 0.01)}")
+    print(f"Single-pass speedup: {single_rate / baseline_rate:.2f}x, "
+          f"with {WORKERS} workers on {os.cpu_count()} CPUs: {pool_rate / baseline_rate:.2f}x")
+    # Timings vary from machine to machine, so only the output decides the result
+    if not drifted:
+        print("PASS: Single-pass extraction matches the legacy pipeline's output.")
+    else:
+        print(f"FAIL: Extracted length differs by more than {MAX_LENGTH_DRIFT:.0%} on: {', '.join(drifted)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import sys
+import os
+import time
+import random
+import tempfile
+from datetime import datetime
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from server.database.models import KnowledgeNode, KnowledgeEdge
+from server.core.ingest_pipeline import PreparedIngest, save_ingest
+from server.core.label_index import label_index
+
+INGESTS = 20
+NODES_PER_INGEST = 30
+EDGES_PER_INGEST = 40
+EXISTING_SHARE = 0.5  # share of extracted labels that are already in the database
+
+
+def make_extraction(run: int, rng: random.Random):
+    """Synthetic extraction result: some labels reused from earlier runs, some edges repeated."""
+    nodes = []
+    for i in range(NODES_PER_INGEST):
+        if run and rng.random() < EXISTING_SHARE:
+            label = f"Concept {rng.randrange(run * NODES_PER_INGEST)}"
+        else:
+            label = f"Concept {run * NODES_PER_INGEST + i}"
+        nodes.append({"label": label, "type": "Concept", "content": f"Run {run}: description of {label}."})
+    labels = [n["label"] for n in nodes]
+    edges = [
+        {"source_label": rng.choice(labels), "target_label": rng.choice(labels), "relation_type": "related"}
+        for _ in range(EDGES_PER_INGEST)
+    ]
+    return nodes, edges
+
+
+def baseline_save(session: Session, text: str, nodes_data: list, edges_data: list):
+    """The per-row persistence this pipeline used before: a lookup, commit and refresh per node."""
+    node_map = {}
+    source_info = "User Input"
+    for node_data in nodes_data:
+        statement = select(KnowledgeNode).where(KnowledgeNode.label == node_data["label"])
+        existing_node = session.exec(statement).first()
+        if existing_node:
+            node_map[node_data["label"]] = existing_node.id
+            new_content = node_data.get("content", "").strip()
+            if new_content and new_content not in existing_node.content:
+                timestamp = datetime.utcnow().strftime("%Y-%m-%d")
+                existing_node.content = f"{existing_node.content}\n\n--- [Updated {timestamp}] ---\n{new_content}"
+            existing_node.type = node_data.get("type", existing_node.type)
+            existing_node.last_reviewed_at = datetime.utcnow()
+            session.add(existing_node)
+            session.commit()
+            session.refresh(existing_node)
+        else:
+            new_node = KnowledgeNode(
+                label=node_data["label"],
+                type=node_data.get("type", "Concept"),
+                content=node_data.get("content", ""),
+                source=source_info
+            )
+            session.add(new_node)
+            session.commit()
+            session.refresh(new_node)
+            node_map[node_data["label"]] = new_node.id
+    for edge in edges_data:
+        source_id = node_map.get(edge["source_label"])
+        target_id = node_map.get(edge["target_label"])
+        if source_id and target_id:
+            session.add(KnowledgeEdge(source_id=source_id, target_id=target_id, relation_type=edge["relation_type"]))
+    session.commit()
+
+
+def bulk_save(session: Session, text: str, nodes_data: list, edges_data: list):
+    prepared = PreparedIngest(
+        text=text, input_type="text", title=None, fetched_content=None,
+        nodes_data=nodes_data, edges_data=edges_data, timings={}, started=time.perf_counter(),
+    )
+    save_ingest(session, prepared)
+
+
+def run(name: str, save):
+    workdir = tempfile.mkdtemp(prefix="bench_ingest_")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    label_index.reset()  # Each run has its own database
+
+    counters = {"commits": 0, "statements": 0}
+    event.listen(engine, "commit", lambda conn: counters.__setitem__("commits", counters["commits"] + 1))
+    event.listen(engine, "before_cursor_execute",
+                 lambda *args: counters.__setitem__("statements", counters["statements"] + 1))
+
+    rng = random.Random(42)
+    times = []
+    for i in range(INGESTS):
+        nodes, edges = make_extraction(i, rng)
+        with Session(engine) as session:
+            start = time.perf_counter()
+            save(session, f"input {i}", nodes, edges)
+            times.append(time.perf_counter() - start)
+
+    with Session(engine) as session:
+        node_count = len(session.exec(select(KnowledgeNode.id)).all())
+        edge_count = len(session.exec(select(KnowledgeEdge.id)).all())
+    engine.dispose()
+
+    times.sort()
+    print(f"{name:<10} commits/ingest={counters['commits'] / INGESTS:6.1f}  "
+          f"statements/ingest={counters['statements'] / INGESTS:6.1f}  "
+          f"mean={sum(times) / len(times) * 1000:7.1f} ms  p50={times[len(times) // 2] * 1000:7.1f} ms  "
+          f"nodes={node_count} edges={edge_count}")
+    return counters, times
+
+
+def main():
+    print(f"--- Ingest persistence: {INGESTS} ingests x {NODES_PER_INGEST} nodes / {EDGES_PER_INGEST} edges ---")
+    before, before_times = run("per-row", baseline_save)
+    after, after_times = run("bulk", bulk_save)
+    speedup = sum(before_times) / sum(after_times) if sum(after_times) else float("inf")
+    print(f"Speedup: {speedup:.1f}x, commits {before['commits']} -> {after['commits']}")
+    if after["commits"] == INGESTS:
+        print("PASS: One commit per ingest.")
+    else:
+        print(f"FAIL: {after['commits']} commits for {INGESTS} ingests")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,10 +28,10 @@ def test_incremental_indexing():
     # Reload from disk to verify persistence
     print("\n[Step 2] Reloading VectorStore to check persistence...")
     vector_store._load_cache()
-    if len(vector_store.cached_embeddings) == 2:
+    if len(vector_store.embeddings) == 2:
         print("PASS: Cache persisted correctly.")
     else:
-        print(f"FAIL: Cache size is {len(vector_store.cached_embeddings)}, expected 2")
+        print(f"FAIL: Cache size is {len(vector_store.embeddings)}, expected 2")
 
     nodes_batch_2 = nodes_batch_1 + [
         mock_node(3, "Rust", "A systems programming language.")
@@ -41,10 +41,10 @@ def test_incremental_indexing():
     # We can't easily capture stdout here without redirecting, but the logs will show in the output tool.
     vector_store.build_index(nodes_batch_2)
     
-    if len(vector_store.cached_embeddings) == 3:
+    if len(vector_store.embeddings) == 3:
         print("PASS: Cache updated correctly.")
     else:
-        print(f"FAIL: Cache size is {len(vector_store.cached_embeddings)}, expected 3")
+        print(f"FAIL: Cache size is {len(vector_store.embeddings)}, expected 3")
 
     # Search check
     print("\n[Step 4] Search Test")
@@ -55,5 +55,25 @@ def test_incremental_indexing():
     else:
         print("FAIL: Search did not return expected node.")
 
+    nodes_batch_3 = [
+        mock_node(1, "Python", "A snake found in tropical forests."),
+        mock_node(3, "Rust", "A systems programming language."),
+    ]
+
+    print("\n[Step 5] Editing node 1 and removing node 2 (Should re-embed ONLY node 1)")
+    old_hash = vector_store.embeddings.get_hash(1)
+    vector_store.build_index(nodes_batch_3)
+
+    if vector_store.embeddings.get_hash(1) != old_hash and sorted(vector_store.node_ids) == [1, 3]:
+        print("PASS: Edited node re-embedded and removed node dropped from index.")
+    else:
+        print(f"FAIL: Index IDs are {vector_store.node_ids}, expected [1, 3]")
+
+    results = vector_store.search("tropical snake")
+    if results and results[0][0] == 1:
+        print("PASS: Search reflects edited content.")
+    else:
+        print("FAIL: Search did not reflect edited content.")
+
 if __name__ == "__main__":
     test_incremental_indexing()
@@ -0,0 +1,115 @@
+import sys
+import os
+import time
+import contextlib
+
+import lxml.html
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from server.core.crawler import process_html_content
+from server.core.site_extractors import site_extractors
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "sites")
+RUNS = 20  # timed runs per path and page
+
+# (fixture, URL it was saved from, expected extractor, expected title, text that must / must not be extracted)
+CASES = [
+    ("zhihu_column.html", "https://zhuanlan.zhihu.com/p/123456789", "zhihu_column",
+     "缓存设计的五个原则", ["第1部分：要点", "第5部分：要点"], ["86 条评论", "推荐阅读", "发布于"]),
+    ("zhihu_question.html", "https://www.zhihu.com/question/20000001/answer/30000001", "zhihu_answer",
+     "如何设计一个高效的缓存系统？", ["写回策略"], ["赞同", "答主6"]),
+    ("wechat_article.html", "https://mp.weixin.qq.com/s/AbCdEf123", "wechat",
+     "一文读懂写回缓存", ["连接池"], ["微信扫一扫关注该公众号"]),
+    ("juejin_post.html", "https://juejin.cn/post/7300000000000000000", "juejin",
+     "从零实现一个 LRU 缓存", ["## 1\\. 小节", "cache.put(key, value)"], ["示例开发者"]),
+    ("csdn_blog.html", "https://blog.csdn.net/example/article/details/135000000", "csdn",
+     "数据库缓存穿透与雪崩的解决方案", ["1、步骤", "SELECT * FROM cache"], ["展开", "阅读量"]),
+    ("wikipedia_article.html", "https://en.wikipedia.org/wiki/Knowledge_graph", "wikipedia",
+     "Knowledge graph", ["Section 1", "Knowledge graphs describe"], ["Example Press", "[edit]", "For other uses"]),
+]
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def timed(html, url, site_specific):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        process_html_content(html, url, site_specific=site_specific)
+        times.append(time.perf_counter() - start)
+    return median(times)
+
+
+def quiet(devnull, fn, *args, **kwargs):
+    """Call fn with the extraction's progress prints silenced."""
+    with contextlib.redirect_stdout(devnull):
+        return fn(*args, **kwargs)
+
+
+def main():
+    with open(os.devnull, "w") as devnull:
+        failures = run_checks(devnull)
+    print("All site extractor checks passed." if not failures else f"{failures} site extractor checks failed.")
+    if failures:
+        sys.exit(1)
+
+
+def run_checks(devnull) -> int:
+    print(f"--- Site extractors: {len(CASES)} fixture pages, registered: {', '.join(site_extractors.names())} ---")
+    failures = 0
+    for filename, url, name, title, wanted, unwanted in CASES:
+        with open(os.path.join(FIXTURES, filename), encoding="utf-8") as f:
+            html = f.read()
+
+        extractor = site_extractors.find(url)
+        markdown = quiet(devnull, process_html_content, html, url)
+        problems = []
+        if extractor is None or extractor.name != name:
+            problems.append(f"matched {extractor.name if extractor else None}, expected {name}")
+        if not markdown.startswith(f"Title: {title}\n"):
+            problems.append(f"title line {markdown.splitlines()[0]!r}")
+        problems += [f"missing {text!r}" for text in wanted if text not in markdown]
+        problems += [f"noise {text!r}" for text in unwanted if text in markdown]
+
+        generic_ms = quiet(devnull, timed, html, url, site_specific=False) * 1000
+        fast_ms = quiet(devnull, timed, html, url, site_specific=True) * 1000
+        timing = f"generic {generic_ms:6.2f} ms, site {fast_ms:6.2f} ms ({generic_ms / fast_ms:4.1f}x)"
+        if problems:
+            failures += 1
+            print(f"FAIL: {filename:<24} {timing}: {'; '.join(problems)}")
+        else:
+            print(f"PASS: {filename:<24} {timing}")
+
+    # Unregistered sites and pages that do not match a site's layout use the generic path
+    if site_extractors.find("https://example.com/blog/post") is not None:
+        failures += 1
+        print("FAIL: example.com matched a site extractor")
+    fallback = quiet(devnull, process_html_content,
+                     "<html><head><title>Moved</title></head><body><article><p>" + "Plain article text. " * 20
+                     + "</p></article></body></html>", "https://zhuanlan.zhihu.com/p/1")
+    if "Plain article text." in fallback:
+        print("PASS: Layout mismatch falls back to Readability.")
+    else:
+        failures += 1
+        print(f"FAIL: Fallback output {fallback[:80]!r}")
+
+    # A matched body too short to be the article leaves the page unmodified for Readability
+    page = ("<html><head><title>Short</title></head><body><div class=\"RichText\"><p>Hi</p><script>x()</script>"
+            "<button>Share</button></div><article><p>" + "Full article text. " * 20 + "</p></article></body></html>")
+    doc = lxml.html.fromstring(page)
+    before = lxml.html.tostring(doc)
+    if site_extractors.extract(doc, "https://zhuanlan.zhihu.com/p/2") is None and lxml.html.tostring(doc) == before:
+        print("PASS: Short match leaves the page unmodified.")
+    else:
+        failures += 1
+        print("FAIL: Short match modified the page or was accepted")
+    return failures
+
+
+if __name__ == "__main__":
+    main()